@@ -5,23 +5,232 @@ Railway部署版 PDF轉Excel Web應用
 使用完整的Python PDF抽取器邏輯
 """
 
-from flask import Flask, request, jsonify, send_file, render_template_string
+import time
+
+_IMPORT_STARTED = time.perf_counter()  # 量測本模組的匯入耗時（/ready 回報）
+
+from flask import (Blueprint, Flask, Request, Response, current_app, request, jsonify, send_file,
+                   render_template_string, stream_with_context)
 from flask_cors import CORS
+import contextlib
+import functools
+import io
 import os
+import json
+import sqlite3
 import tempfile
+import zipfile
 from datetime import datetime
-from final.pdf_extractor import FinalPDFExtractor
+# pandas、pdfminer 等重量級模組由預熱或第一次轉換時才匯入，/health 可立即回應
+from final.cache import ConversionCache
+from final.cancellation import CANCELLED, CancelToken, ConversionCancelled, DisconnectWatcher
+from final.exporters import WRITERS, available_formats
+from final import metrics
+from final.jobs import JobManager, DONE, FAILED
+from final.pool import ConversionPool, PoolSaturated
+from final.material_index import MaterialIndex
+from final.store import OrderStore
+from final.uploads import ChecksumMismatch, OffsetMismatch, UploadError, UploadManager
+from final.records import as_dict
+from final.spool import (PdfSpool, SpoolHandle, cleanup_stale,
+                         default_directory as default_spool_directory)
+from final.logs import configure_logging
+from final.warmup import WarmUp
 import logging
 
-# 設定日誌
-logging.basicConfig(level=logging.INFO)
+# 設定日誌（LOG_FORMAT=json 時每行輸出一筆 JSON）
+configure_logging(os.environ.get('LOG_LEVEL', 'INFO'), json_format=os.environ.get('LOG_FORMAT') == 'json')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)
 
-# 設定上傳檔案大小限制 (50MB for Railway)
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
+class SpooledRequest(Request):
+    """上傳檔案在 UPLOAD_SPOOL_THRESHOLD 以下留在記憶體，超過才寫入暫存檔
+    
+    啟用轉換程序池時改用 PdfSpool：超過門檻或要交給子程序時才寫入 SPOOL_DIR
+    的共享暫存檔，子程序以 mmap 讀取同一份內容，不再複製或序列化。兩者都
+    在請求結束關閉時即刪除，不會留下暫存檔。
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        threshold = current_app.config['UPLOAD_SPOOL_THRESHOLD']
+        if current_app.config['CONVERT_WORKERS'] > 0:
+            return PdfSpool(current_app.config['SPOOL_DIR'], name=filename, max_size=threshold)
+        return tempfile.SpooledTemporaryFile(max_size=threshold)
+
+
+bp = Blueprint('converter', __name__)
+
+
+def create_app(config=None):
+    """建立 Flask 應用（設定由環境變數讀取，config 可覆寫）
+    
+    只匯入輕量模組；抽取器相關的重量級模組依 WARMUP 設定預熱。
+    """
+    app = Flask(__name__)
+    app.request_class = SpooledRequest
+    CORS(app)
+    
+    # 設定上傳檔案大小限制 (50MB for Railway)
+    app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
+    
+    # 上傳檔案超過此大小才暫存到磁碟（交給轉換子程序的上傳另寫入 SPOOL_DIR）
+    app.config['UPLOAD_SPOOL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 16 * 1024 * 1024))
+    
+    # 交給轉換子程序的共享暫存檔目錄（預設 /dev/shm，不存在時為系統暫存目錄）
+    app.config['SPOOL_DIR'] = default_spool_directory()
+    
+    # 轉換結果快取（以上傳內容雜湊為鍵，多個 worker 共用同一目錄）
+    # CONVERSION_CACHE_MAX_BYTES=0 時停用
+    app.config['CONVERSION_CACHE_DIR'] = os.environ.get(
+        'CONVERSION_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdf-to-excel-cache'))
+    app.config['CONVERSION_CACHE_MAX_BYTES'] = int(os.environ.get('CONVERSION_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    app.config['CONVERSION_CACHE_TTL'] = int(os.environ.get('CONVERSION_CACHE_TTL', 7 * 24 * 3600))
+    
+    # 非同步轉換工作（狀態存於磁碟，多個 worker 共用同一目錄）；
+    # 啟用轉換程序池時工作在程序池中轉換，JOB_WORKERS 只用於停用程序池時
+    app.config['JOB_DIR'] = os.environ.get('JOB_DIR', os.path.join(tempfile.gettempdir(), 'pdf-to-excel-jobs'))
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_TTL'] = int(os.environ.get('JOB_TTL', 3600))
+    
+    # 分段上傳（超過 MAX_CONTENT_LENGTH 的PDF分段寫入磁碟，可中斷續傳）
+    app.config['UPLOAD_DIR'] = os.environ.get('UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'pdf-to-excel-uploads'))
+    app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+    app.config['UPLOAD_TTL'] = int(os.environ.get('UPLOAD_TTL', 24 * 3600))
+    
+    # 訂單資料庫（SQLite）路徑：轉換的訂單依工單單號寫入，可由 /api/orders 查詢；空字串停用
+    app.config['ORDER_STORE_PATH'] = os.environ.get('ORDER_STORE_PATH', '')
+    
+    # 頁面快取保存的頁數（同一報表重新產出時只重新抽取有變動的頁面），0 停用
+    app.config['PAGE_CACHE_PAGES'] = int(os.environ.get('PAGE_CACHE_PAGES', 2000))
+    
+    # 各階段耗時指標（/metrics 與 Server-Timing 標頭），0 停用
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+    
+    # 每 N 筆訂單記錄一筆抽樣事件，0 只記錄每份文件的摘要
+    app.config['ORDER_LOG_SAMPLE'] = int(os.environ.get('ORDER_LOG_SAMPLE', 0))
+    
+    # 共用轉換程序池：同步轉換的解析與輸出在子程序中執行（預設為CPU核心數，0 在請求執行緒中轉換），
+    # 另有 CONVERT_QUEUE_SIZE 個等待名額，都滿時回傳 429
+    app.config['CONVERT_WORKERS'] = int(os.environ.get('CONVERT_WORKERS', os.cpu_count() or 1))
+    app.config['CONVERT_QUEUE_SIZE'] = int(os.environ.get('CONVERT_QUEUE_SIZE', 8))
+    
+    # 每次轉換的時間上限（秒），超過時在下一頁或下一個工單區塊停止解析；0 不限
+    app.config['CONVERSION_TIMEOUT'] = float(os.environ.get('CONVERSION_TIMEOUT', 300))
+    
+    # 用戶端連線被重設時停止解析；CANCEL_ON_CLIENT_EOF=1 時讀取端的 EOF 也視為斷線
+    # （只關閉寫入端、仍在等待回應的用戶端也會被取消，預設關閉）
+    app.config['CANCEL_ON_CLIENT_EOF'] = os.environ.get('CANCEL_ON_CLIENT_EOF', '0') != '0'
+    
+    # 停用轉換程序池時批次轉換的子程序數（預設為CPU核心數）；啟用時改用共用程序池
+    app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+    
+    # 啟動預熱：background（背景執行緒，預設）、sync（建立應用時同步執行，
+    # 搭配 gunicorn --preload 在主程序完成後再 fork worker）、off（第一次轉換時才載入）
+    app.config['WARMUP'] = os.environ.get('WARMUP', 'background')
+    
+    if config:
+        app.config.update(config)
+    
+    metrics.set_enabled(app.config['METRICS_ENABLED'])
+    app.register_blueprint(bp)
+    
+    warm_up = None
+    if app.config['WARMUP'] != 'off':
+        warm_up = WarmUp()
+        if app.config['WARMUP'] == 'sync':
+            warm_up.run()
+        else:
+            warm_up.start()
+    app.extensions['warm_up'] = warm_up
+    return app
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Accept 標頭可協商的格式（xlsx 排第一，Accept: */* 或未指定時仍輸出Excel）
+OUTPUT_MEDIA_TYPES = {
+    XLSX_MIMETYPE: 'xlsx',
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/vnd.apache.parquet': 'parquet',
+    'application/x-parquet': 'parquet',
+}
+
+_conversion_cache = None
+
+
+def get_conversion_cache():
+    """取得轉換快取（停用時回傳 None）"""
+    global _conversion_cache
+    if current_app.config['CONVERSION_CACHE_MAX_BYTES'] <= 0:
+        return None
+    if _conversion_cache is None:
+        _conversion_cache = ConversionCache(
+            current_app.config['CONVERSION_CACHE_DIR'],
+            max_bytes=current_app.config['CONVERSION_CACHE_MAX_BYTES'],
+            ttl=current_app.config['CONVERSION_CACHE_TTL'] or None
+        )
+    return _conversion_cache
+
+_page_cache = None
+
+def get_page_cache():
+    """取得程序內共用的頁面快取（停用時回傳 None）"""
+    global _page_cache
+    if current_app.config['PAGE_CACHE_PAGES'] <= 0:
+        return None
+    if _page_cache is None:
+        from final.page_cache import PageCache
+        _page_cache = PageCache(max_pages=current_app.config['PAGE_CACHE_PAGES'])
+    return _page_cache
+
+_conversion_pool = None
+
+def get_conversion_pool():
+    """取得共用轉換程序池（停用時回傳 None；子程序在第一次轉換時才建立）"""
+    global _conversion_pool
+    if current_app.config['CONVERT_WORKERS'] <= 0:
+        return None
+    if _conversion_pool is None:
+        # 清除之前的程序異常結束時留下的共享暫存檔
+        cleanup_stale(current_app.config['SPOOL_DIR'])
+        _conversion_pool = ConversionPool(
+            current_app.config['CONVERT_WORKERS'],
+            current_app.config['CONVERT_QUEUE_SIZE'],
+            page_cache_pages=current_app.config['PAGE_CACHE_PAGES'],
+            order_log_sample=current_app.config['ORDER_LOG_SAMPLE']
+        )
+    return _conversion_pool
+
+_order_store = None
+
+# 串流轉換每累積幾筆訂單寫入一次訂單資料庫
+STORE_BATCH_SIZE = 500
+# /api/orders 單次回傳的筆數上限
+ORDER_QUERY_MAX_LIMIT = 1000
+
+def get_order_store():
+    """取得訂單資料庫（未設定 ORDER_STORE_PATH 時回傳 None）"""
+    global _order_store
+    if not current_app.config['ORDER_STORE_PATH']:
+        return None
+    if _order_store is None:
+        _order_store = OrderStore(current_app.config['ORDER_STORE_PATH'])
+    return _order_store
+
+def _store_orders(orders, source, sha256=None):
+    """將訂單寫入訂單資料庫（未啟用時略過；寫入失敗只記錄警告，不影響轉換結果）"""
+    store = get_order_store()
+    if store is None or not orders:
+        return
+    try:
+        with metrics.timings().stage('store'):
+            written = store.upsert_orders(orders, source=source, sha256=sha256)
+        logger.info(f"訂單資料庫: {source} 寫入 {written} / {len(orders)} 筆")
+    except sqlite3.Error as e:
+        logger.warning(f"寫入訂單資料庫失敗: {str(e)}")
 
 # HTML模板
 HTML_TEMPLATE = """
@@ -345,33 +554,30 @@ HTML_TEMPLATE = """
         }
 
         function convertToExcel(file) {
-            showStatus('正在上傳並處理PDF檔案...', 'processing');
-            updateProgress(10);
+            showStatus('正在上傳PDF檔案...', 'processing');
+            updateProgress(0);
 
             const formData = new FormData();
             formData.append('pdf_file', file);
 
-            let progressValue = 10;
-            const progressInterval = setInterval(() => {
-                progressValue += Math.random() * 15;
-                if (progressValue < 85) {
-                    updateProgress(progressValue);
-                }
-            }, 800);
-
-            fetch('/api/convert-pdf', {
+            fetch('/api/jobs', {
                 method: 'POST',
                 body: formData
             })
             .then(response => {
-                clearInterval(progressInterval);
-                updateProgress(100);
-                
                 if (!response.ok) {
                     return response.json().then(err => {
                         throw new Error(err.error || '轉換失敗');
                     });
                 }
+                return response.json();
+            })
+            .then(job => waitForJob(job))
+            .then(job => fetch(job.download_url))
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('下載失敗');
+                }
                 return response.blob();
             })
             .then(blob => {
@@ -388,13 +594,37 @@ HTML_TEMPLATE = """
                 progress.style.display = 'none';
             })
             .catch(error => {
-                clearInterval(progressInterval);
                 console.error('Error:', error);
                 showStatus(`❌ ${error.message}`, 'error');
                 progress.style.display = 'none';
             });
         }
 
+        // 透過 Server-Sent Events 接收實際的頁數進度
+        function waitForJob(job) {
+            return new Promise((resolve, reject) => {
+                const events = new EventSource(job.events_url);
+                events.onmessage = (e) => {
+                    const status = JSON.parse(e.data);
+                    if (status.pages_total) {
+                        updateProgress(status.pages_done / status.pages_total * 100);
+                        showStatus(`正在解析PDF... 第 ${status.pages_done} / ${status.pages_total} 頁`, 'processing');
+                    }
+                    if (status.status === 'done') {
+                        events.close();
+                        resolve(job);
+                    } else if (status.status === 'failed') {
+                        events.close();
+                        reject(new Error(status.error || '轉換失敗'));
+                    }
+                };
+                events.onerror = () => {
+                    events.close();
+                    reject(new Error('無法取得轉換進度'));
+                };
+            });
+        }
+
         window.addEventListener('load', () => {
             showStatus('歡迎使用完整版PDF轉Excel工具！', 'success');
         });
@@ -403,86 +633,777 @@ HTML_TEMPLATE = """
 </html>
 """
 
-@app.route('/')
+@bp.route('/')
 def index():
     """提供HTML界面"""
     return render_template_string(HTML_TEMPLATE)
 
-@app.route('/api/convert-pdf', methods=['POST'])
+def convert_to_excel(source, output, cache_key=None, progress=None, name=None,
+                     cancel_token=None, partial=False, lease=None):
+    """將PDF轉換為Excel（優先使用快取），未抽取到訂單時回傳 False
+    
+    source 為PDF路徑或檔案物件，output 為Excel路徑或可寫入的檔案物件。
+    未命中快取時交給共用轉換程序池，程序池已滿時拋出 PoolSaturated（以預留的
+    lease 轉換時不再檢查）；progress 在子程序中呼叫，需可序列化（JobProgress）。
+    cancel_token 取消或到期時拋出 ConversionCancelled；partial=True 時改為輸出
+    已解析的部分（原因記錄在 cancel_token.partial），部分結果不寫入快取。
+    """
+    timings = metrics.timings()
+    cache = get_conversion_cache()
+    if cache is not None and cache_key is None:
+        with timings.stage('hash'):
+            cache_key = ConversionCache.key_for(source)
+    
+    with timings.stage('cache'):
+        workbook = cache.get_workbook(cache_key) if cache is not None else None
+    if workbook is not None:
+        logger.info(f"快取命中: {cache_key[:12]}")
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                f.write(workbook)
+        else:
+            output.write(workbook)
+        return True
+    
+    with timings.stage('cache'):
+        cached = cache.get_orders(cache_key) if cache is not None else None
+    pool = get_conversion_pool()
+    if cached is None and pool is not None:
+        return _convert_in_pool(pool, source, output, 'xlsx', cache, cache_key, name,
+                                cancel_token, partial, progress, lease)
+    
+    # 使用完整版PDF抽取器（已快取的解析結果可直接重建Excel）
+    extractor = _load_orders(source, cached, cache_key, progress, name, cancel_token, partial)
+    orders = extractor.orders
+    
+    if not orders:
+        return False
+    
+    logger.info(f"成功解析 {len(orders)} 筆訂單")
+    
+    # 使用完整版Excel輸出功能
+    with timings.stage('excel'):
+        if cache is not None and isinstance(output, str):
+            buffer = io.BytesIO()
+            extractor._save_to_excel(buffer)
+            workbook = buffer.getvalue()
+            with open(output, 'wb') as f:
+                f.write(workbook)
+        else:
+            extractor._save_to_excel(output)
+            workbook = output.getvalue() if cache is not None else None
+    
+    logger.info("Excel檔案生成完成")
+    
+    if cache is not None and not extractor.cancelled:
+        with timings.stage('cache'):
+            cache.put(cache_key, orders={
+                'processed_at': extractor.processed_at.isoformat(),
+                'orders': orders
+            }, workbook=workbook)
+    return True
+
+def convert_to_table(source, output, output_format, cache_key=None, progress=None, name=None,
+                     cancel_token=None, partial=False, lease=None):
+    """將PDF轉換為 CSV / JSON Lines / Parquet 長格式材料表（不產生Excel），
+    未抽取到訂單時回傳 False（程序池、取消與部分結果同 convert_to_excel）
+    """
+    timings = metrics.timings()
+    cache = get_conversion_cache()
+    if cache is not None and cache_key is None:
+        with timings.stage('hash'):
+            cache_key = ConversionCache.key_for(source)
+    
+    with timings.stage('cache'):
+        cached = cache.get_orders(cache_key) if cache is not None else None
+    pool = get_conversion_pool()
+    if cached is None and pool is not None:
+        return _convert_in_pool(pool, source, output, output_format, cache, cache_key, name,
+                                cancel_token, partial, progress, lease)
+    
+    extractor = _load_orders(source, cached, cache_key, progress, name, cancel_token, partial)
+    if not extractor.orders:
+        return False
+    
+    from final.exporters import write_orders
+    with timings.stage('serialize'):
+        rows = write_orders(extractor.orders, output, output_format)
+    logger.info(f"{output_format.upper()} 輸出完成: {len(extractor.orders)} 筆訂單 / {rows} 列")
+    
+    if cache is not None and cached is None and not extractor.cancelled:
+        with timings.stage('cache'):
+            cache.put(cache_key, orders={
+                'processed_at': extractor.processed_at.isoformat(),
+                'orders': extractor.orders
+            })
+    return True
+
+def _load_orders(source, cached, cache_key, progress, name, cancel_token=None, partial=False):
+    """取得已抽取訂單的抽取器（cached 為快取的解析結果，None 時重新抽取）"""
+    from final.pdf_extractor import FinalPDFExtractor
+    
+    # 安靜模式：每份文件只記錄一筆摘要事件（可抽樣記錄部分訂單）
+    extractor = FinalPDFExtractor(source, name=name, page_cache=get_page_cache(), quiet=True,
+                                  order_log_sample=current_app.config['ORDER_LOG_SAMPLE'],
+                                  cancel_token=cancel_token)
+    if cached is not None:
+        logger.info(f"快取命中解析結果: {cache_key[:12]}")
+        extractor.orders = cached['orders']
+        extractor.processed_at = datetime.fromisoformat(cached['processed_at'])
+    else:
+        logger.info("開始PDF解析")
+        extractor.extract_orders(progress=progress, partial=partial)
+        if extractor.cancelled:
+            cancel_token.partial = extractor.cancelled
+        # 部分結果的訂單仍寫入訂單資料庫，但不記錄來源雜湊（之後仍需完整匯入）
+        _store_orders(extractor.orders, extractor.name, None if extractor.cancelled else cache_key)
+    return extractor
+
+def _convert_in_pool(pool, source, output, output_format, cache, cache_key, name,
+                     cancel_token=None, partial=False, progress=None, lease=None):
+    """在共用轉換程序池中抽取並產生輸出，未抽取到訂單時回傳 False"""
+    timings = metrics.timings()
+    # 子程序只收到路徑或共享暫存檔的參照；其他上傳內容先寫入一次暫存檔
+    with contextlib.ExitStack() as stack:
+        if isinstance(source, PdfSpool):
+            source = source.handle()
+        elif not isinstance(source, str):
+            source = stack.enter_context(
+                PdfSpool.from_source(source, current_app.config['SPOOL_DIR'], name)).handle()
+        result = pool.convert(source, name, output_format, cancel_token, partial, progress, lease)
+    for stage, seconds in result.timings.items():
+        timings.add(stage, seconds)
+    metrics.record_document(result.pages, len(result.orders), result.materials)
+    logger.info(f"程序池轉換完成: {len(result.orders)} 筆訂單（{result.pages} 頁）")
+    if not result.orders:
+        return False
+    
+    if isinstance(output, str):
+        with open(output, 'wb') as f:
+            f.write(result.output)
+    else:
+        output.write(result.output)
+    
+    if result.cancelled:
+        cancel_token.partial = result.cancelled
+    _store_orders(result.orders, result.name, None if result.cancelled else cache_key)
+    if cache is not None and not result.cancelled:
+        with timings.stage('cache'):
+            cache.put(cache_key, orders={
+                'processed_at': result.processed_at.isoformat(),
+                'orders': result.orders
+            }, workbook=result.output if output_format == 'xlsx' else None)
+    return True
+
+_job_manager = None
+
+
+def get_job_manager():
+    """取得背景工作管理器"""
+    global _job_manager
+    if _job_manager is None:
+        # 使用程序池時提交即預留名額（已滿回傳 429），執行緒只等待子程序，數量與名額相同
+        pool = get_conversion_pool()
+        _job_manager = JobManager(
+            current_app.config['JOB_DIR'],
+            convert=functools.partial(_convert_job, current_app._get_current_object()),
+            max_workers=pool.capacity if pool is not None else current_app.config['JOB_WORKERS'],
+            ttl=current_app.config['JOB_TTL'],
+            pool=pool
+        )
+    return _job_manager
+
+def _convert_job(app, pdf_path, excel_path, progress, lease):
+    """背景工作的轉換（在工作執行緒中推入應用情境並記錄指標）"""
+    timings = metrics.start_conversion()
+    status = 'error'
+    try:
+        with app.app_context():
+            produced = convert_to_excel(
+                pdf_path, excel_path, progress=progress,
+                cancel_token=CancelToken.with_timeout(app.config['CONVERSION_TIMEOUT']), lease=lease)
+        status = 'ok' if produced else 'empty'
+        return produced
+    finally:
+        metrics.finish_conversion(
+            timings, status, bytes_in=os.path.getsize(pdf_path),
+            bytes_out=os.path.getsize(excel_path) if status == 'ok' else 0)
+
+def _pool_saturated(e):
+    """轉換佇列已滿的 429 回應（附 Retry-After），用戶端稍後重試"""
+    logger.warning(f"轉換佇列已滿，拒絕請求（{e.retry_after} 秒後重試）")
+    response = jsonify({
+        'error': '目前轉換請求過多，請稍後再試',
+        'retry_after': e.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def _with_server_timing(response, timings):
+    """附加 Server-Timing 標頭（指標停用時不附加）"""
+    response = current_app.make_response(response)
+    if timings:
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+@bp.route('/api/convert-pdf', methods=['POST'])
 def convert_pdf():
-    """處理PDF轉Excel的API端點"""
+    """處理PDF轉Excel的API端點
+    
+    format 參數（表單欄位或查詢字串）或 Accept 標頭可改為輸出 csv、jsonl、
+    parquet 長格式材料表，這些格式不產生Excel。
+    共用轉換程序池與等待佇列都已滿時回傳 429 與 Retry-After 標頭。
+    
+    用戶端斷線時停止解析；超過 CONVERSION_TIMEOUT 時回傳 504，若指定 partial=1
+    則改為回傳時限內已解析的訂單，並加上 X-Partial-Result 標頭。
+    """
+    timings = metrics.start_conversion()
+    status = 'error'
+    bytes_out = 0
     try:
         logger.info("收到PDF轉換請求")
         
-        if 'pdf_file' not in request.files:
-            return jsonify({'error': '未上傳檔案'}), 400
-        
-        file = request.files['pdf_file']
-        
-        if file.filename == '':
-            return jsonify({'error': '未選擇檔案'}), 400
+        # 讀取 request.files 時才解析上傳內容
+        with timings.stage('upload'):
+            file, error = _validate_upload()
+        if not error:
+            output_format, error = _negotiate_format()
+        if error:
+            status = 'invalid'
+            return _with_server_timing(error, timings)
         
-        if not file.filename.lower().endswith('.pdf'):
-            return jsonify({'error': '請上傳PDF檔案'}), 400
+        logger.info(f"處理檔案: {file.filename}（{output_format}）")
         
-        logger.info(f"處理檔案: {file.filename}")
-        
-        # 創建臨時檔案來保存上傳的PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_pdf:
-            file.save(temp_pdf.name)
-            temp_pdf_path = temp_pdf.name
+        if output_format == 'xlsx':
+            extension, mimetype = 'xlsx', XLSX_MIMETYPE
+        else:
+            writer = WRITERS[output_format]
+            extension, mimetype = writer.extension, writer.media_type
+        download_name = f"{file.filename.replace('.pdf', '')}_extracted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
         
+        # 上傳內容已由 SpooledRequest 暫存（小檔在記憶體、大檔才落地），直接交給抽取器；
+        # 結果寫入記憶體緩衝區後回傳，不經過暫存檔
+        output = io.BytesIO()
+        partial = request.values.get('partial', '').lower() in ('1', 'true', 'yes')
+        # 程序池的子程序需以標記檔得知取消，在請求執行緒中轉換則只需記憶體中的旗標
+        token = CancelToken.with_timeout(current_app.config['CONVERSION_TIMEOUT'],
+                                         shared=get_conversion_pool() is not None)
         try:
-            # 使用完整版PDF抽取器
-            logger.info("開始PDF解析")
-            extractor = FinalPDFExtractor(temp_pdf_path)
-            orders = extractor.extract_orders()
-            
-            if not orders:
-                return jsonify({'error': '未能從PDF中抽取到訂單資料，請檢查PDF格式'}), 400
-            
-            logger.info(f"成功解析 {len(orders)} 筆訂單")
-            
-            # 創建臨時Excel檔案
-            temp_dir = tempfile.mkdtemp()
-            excel_filename = f"{file.filename.replace('.pdf', '')}_extracted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            excel_path = os.path.join(temp_dir, excel_filename)
-            
-            # 使用完整版Excel輸出功能
-            extractor._save_to_excel(excel_path)
-            
-            logger.info("Excel檔案生成完成")
-            
-            return send_file(
-                excel_path,
-                as_attachment=True,
-                download_name=excel_filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            
+            with DisconnectWatcher(request.environ.get('gunicorn.socket'), token,
+                                   eof_cancels=current_app.config['CANCEL_ON_CLIENT_EOF']):
+                if output_format == 'xlsx':
+                    produced = convert_to_excel(file.stream, output, name=file.filename,
+                                                cancel_token=token, partial=partial)
+                else:
+                    produced = convert_to_table(file.stream, output, output_format, name=file.filename,
+                                                cancel_token=token, partial=partial)
         finally:
-            # 清理臨時PDF檔案
-            try:
-                os.unlink(temp_pdf_path)
-            except OSError:
-                pass
+            token.close()
+        if not produced:
+            status = 'empty'
+            return _with_server_timing(
+                (jsonify({'error': '未能從PDF中抽取到訂單資料，請檢查PDF格式'}), 400), timings)
+        
+        status = 'ok'
+        bytes_out = output.tell()
+        output.seek(0)
+        response = _with_server_timing(send_file(
+            output,
+            as_attachment=True,
+            download_name=download_name,
+            mimetype=mimetype
+        ), timings)
+        response.vary.add('Accept')
+        if token.partial:
+            status = 'partial'
+            response.headers['X-Partial-Result'] = token.partial
+        return response
+    
+    except ConversionCancelled as e:
+        if e.reason == CANCELLED:
+            # 用戶端已斷線，回應不會被接收（499 沿用 nginx 的 Client Closed Request）
+            status = 'cancelled'
+            logger.info(f"用戶端已斷線，停止轉換: {file.filename}")
+            return _with_server_timing((jsonify({'error': str(e)}), 499), timings)
+        status = 'timeout'
+        logger.warning(f"轉換超過時限 {current_app.config['CONVERSION_TIMEOUT']:g} 秒: {file.filename}")
+        return _with_server_timing((jsonify({
+            'error': f"{e}（{current_app.config['CONVERSION_TIMEOUT']:g} 秒），可加上 partial=1 取得時限內已解析的訂單"
+        }), 504), timings)
+    
+    except PoolSaturated as e:
+        # 轉換佇列已滿：回傳 429 讓用戶端稍後重試，不再接收更多工作
+        status = 'rejected'
+        return _with_server_timing(_pool_saturated(e), timings)
                 
     except Exception as e:
         logger.error(f"轉換過程中發生錯誤: {str(e)}")
+        return _with_server_timing((jsonify({'error': f'處理失敗: {str(e)}'}), 500), timings)
+    
+    finally:
+        metrics.finish_conversion(timings, status, bytes_in=request.content_length or 0,
+                                  bytes_out=bytes_out)
+
+@bp.route('/api/convert-pdf/stream', methods=['POST'])
+def convert_pdf_stream():
+    """串流轉換：以 chunked application/x-ndjson 逐筆回傳訂單
+    
+    每解析完一筆訂單立即送出 {"type": "order", "data": {...}}，最後送出
+    {"type": "summary", "data": 統計摘要}；中途失敗時送出 {"type": "error"}。
+    訂單不保留在記憶體中，統計只累加彙總值，每個請求的狀態與頁數無關。
+    不使用轉換結果快取（需要完整的訂單清單），仍共用頁面快取。
+    """
+    file, error = _validate_upload()
+    if error:
+        return error
+    
+    logger.info(f"串流轉換: {file.filename}")
+    # 檢視函式返回時 Flask 會關閉 request.files；上傳內容改由串流產生器持有並負責關閉
+    stream, file.stream = file.stream, io.BytesIO()
+    return Response(stream_with_context(_stream_orders(stream, file.filename)),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _stream_orders(stream, filename):
+    """產生 NDJSON 行：各筆訂單，最後為統計摘要
+    
+    超過 CONVERSION_TIMEOUT 時以 {"type": "error"} 結束（之前送出的訂單即為部分結果）；
+    用戶端斷線時伺服器關閉產生器，解析隨即停止。
+    """
+    from final.pdf_extractor import FinalPDFExtractor
+    
+    timings = metrics.start_conversion()
+    status = 'error'
+    bytes_out = 0
+    try:
+        token = CancelToken.with_timeout(current_app.config['CONVERSION_TIMEOUT'])
+        extractor = FinalPDFExtractor(stream, name=filename, page_cache=get_page_cache(),
+                                      quiet=True, order_log_sample=current_app.config['ORDER_LOG_SAMPLE'],
+                                      cancel_token=token)
+        index = MaterialIndex(track_orders=False)
+        pending = []
+        for order in extractor.iter_orders():
+            index.add_order(order)
+            line = _ndjson_line('order', order)
+            bytes_out += len(line)
+            yield line
+            
+            # 訂單資料庫分批寫入，記憶體中最多只保留一批訂單
+            if get_order_store() is not None:
+                pending.append(order)
+                if len(pending) >= STORE_BATCH_SIZE:
+                    _store_orders(pending, filename)
+                    pending = []
+        _store_orders(pending, filename)
+        
+        status = 'ok' if index.order_count else 'empty'
+        line = _ndjson_line('summary', index.statistics(extractor.processed_at))
+        bytes_out += len(line)
+        yield line
+    
+    except GeneratorExit:
+        status = 'cancelled'
+        raise
+    
+    except ConversionCancelled as e:
+        status = 'timeout'
+        logger.warning(f"串流轉換超過時限: {filename}（已送出 {index.order_count} 筆訂單）")
+        _store_orders(pending, filename)
+        yield _ndjson_line('error', f"{e}（已送出 {index.order_count} 筆訂單）")
+    
+    except Exception as e:
+        logger.error(f"串流轉換過程中發生錯誤: {str(e)}")
+        yield _ndjson_line('error', f'處理失敗: {str(e)}')
+    
+    finally:
+        stream.close()
+        metrics.finish_conversion(timings, status, bytes_in=request.content_length or 0,
+                                  bytes_out=bytes_out)
+
+def _ndjson_line(kind, data):
+    """單行 NDJSON 紀錄（UTF-8 位元組）"""
+    return (json.dumps({'type': kind, 'data': data}, ensure_ascii=False, default=as_dict) + '\n').encode('utf-8')
+
+def _negotiate_format():
+    """依 format 參數或 Accept 標頭決定輸出格式，回傳 (格式, 錯誤回應)"""
+    formats = ['xlsx'] + available_formats()
+    requested = request.values.get('format')
+    if requested:
+        output_format = requested.lower()
+        if output_format not in formats:
+            return None, (jsonify({'error': f'不支援的輸出格式: {requested}（可用: {", ".join(formats)}）'}), 400)
+        return output_format, None
+    
+    media_types = [media_type for media_type, output_format in OUTPUT_MEDIA_TYPES.items()
+                   if output_format in formats]
+    best = request.accept_mimetypes.best_match(media_types, default=XLSX_MIMETYPE)
+    return OUTPUT_MEDIA_TYPES[best], None
+
+def _validate_upload():
+    """檢查上傳的PDF檔案，回傳 (檔案, 錯誤回應)"""
+    if 'pdf_file' not in request.files:
+        return None, (jsonify({'error': '未上傳檔案'}), 400)
+    
+    file = request.files['pdf_file']
+    
+    if file.filename == '':
+        return None, (jsonify({'error': '未選擇檔案'}), 400)
+    
+    if not file.filename.lower().endswith('.pdf'):
+        return None, (jsonify({'error': '請上傳PDF檔案'}), 400)
+    
+    return file, None
+
+@bp.route('/api/convert-batch', methods=['POST'])
+def convert_batch_pdf():
+    """批次轉換多個PDF（或ZIP內的PDF），回傳合併的Excel"""
+    from final.batch import convert_batch, read_zip_pdfs, save_batch_workbook
+    
+    try:
+        files = [f for f in request.files.getlist('pdf_files') if f.filename]
+        if not files:
+            return jsonify({'error': '未上傳檔案'}), 400
+        
+        sources = []
+        for file in files:
+            filename = file.filename.lower()
+            if filename.endswith('.zip'):
+                try:
+                    sources.extend(read_zip_pdfs(file.stream, max_bytes=current_app.config['MAX_CONTENT_LENGTH']))
+                except (zipfile.BadZipFile, ValueError) as e:
+                    return jsonify({'error': f'無法讀取壓縮檔 {file.filename}: {str(e)}'}), 400
+            elif filename.endswith('.pdf'):
+                # 已在共享暫存檔中的上傳只傳參照給子程序
+                stream = file.stream
+                sources.append((file.filename, stream.handle() if isinstance(stream, PdfSpool) else stream.read()))
+            else:
+                return jsonify({'error': f'請上傳PDF或ZIP檔案: {file.filename}'}), 400
+        
+        if not sources:
+            return jsonify({'error': '壓縮檔中沒有PDF檔案'}), 400
+        
+        logger.info(f"收到批次轉換請求: {len(sources)} 個PDF")
+        results = convert_batch(sources, workers=current_app.config['BATCH_WORKERS'],
+                                pool=get_conversion_pool())
+        if get_order_store() is not None:
+            for (name, data), result in zip(sources, results):
+                _store_orders(result.orders, name, ConversionCache.key_for(data))
+        
+        workbook = io.BytesIO()
+        if not save_batch_workbook(workbook, results):
+            return jsonify({'error': '未能從PDF中抽取到訂單資料，請檢查PDF格式'}), 400
+        
+        workbook.seek(0)
+        return send_file(
+            workbook,
+            as_attachment=True,
+            download_name=f"batch_extracted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mimetype=XLSX_MIMETYPE
+        )
+    
+    except PoolSaturated as e:
+        return _pool_saturated(e)
+    
+    except Exception as e:
+        logger.error(f"批次轉換過程中發生錯誤: {str(e)}")
         return jsonify({'error': f'處理失敗: {str(e)}'}), 500
 
-@app.route('/health', methods=['GET'])
+@bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """提交非同步轉換工作，立即回傳工作編號"""
+    file, error = _validate_upload()
+    if error:
+        return error
+    
+    try:
+        job_id = get_job_manager().submit(file.stream, file.filename)
+    except PoolSaturated as e:
+        return _pool_saturated(e)
+    logger.info(f"已排入轉換工作 {job_id}: {file.filename}")
+    return _job_accepted(job_id)
+
+def _job_accepted(job_id):
+    """已排入工作的 202 回應（狀態、進度與下載網址）"""
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events',
+        'download_url': f'/api/jobs/{job_id}/download'
+    }), 202
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """查詢工作狀態與頁數進度"""
+    status = get_job_manager().status(job_id)
+    if status is None:
+        return jsonify({'error': '找不到此工作'}), 404
+    return jsonify(status)
+
+@bp.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以 Server-Sent Events 推送工作進度，完成或失敗後結束"""
+    manager = get_job_manager()
+    if manager.status(job_id) is None:
+        return jsonify({'error': '找不到此工作'}), 404
+    
+    def stream():
+        last = None
+        while True:
+            status = manager.status(job_id)
+            if status is None:
+                break
+            if status != last:
+                yield f"data: {json.dumps(status, ensure_ascii=False)}\n\n"
+                last = status
+            if status['status'] in (DONE, FAILED):
+                break
+            time.sleep(0.3)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    """下載已完成工作的Excel檔"""
+    manager = get_job_manager()
+    status = manager.status(job_id)
+    if status is None:
+        return jsonify({'error': '找不到此工作'}), 404
+    
+    result_path = manager.result_path(job_id)
+    if result_path is None:
+        return jsonify({'error': '工作尚未完成', 'status': status['status']}), 409
+    
+    filename = status['filename']
+    return send_file(
+        result_path,
+        as_attachment=True,
+        download_name=f"{filename.replace('.pdf', '')}_extracted.xlsx",
+        mimetype=XLSX_MIMETYPE
+    )
+
+_upload_manager = None
+
+
+def get_upload_manager():
+    """取得分段上傳管理器"""
+    global _upload_manager
+    if _upload_manager is None:
+        _upload_manager = UploadManager(
+            current_app.config['UPLOAD_DIR'],
+            max_bytes=current_app.config['UPLOAD_MAX_BYTES'],
+            chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'],
+            ttl=current_app.config['UPLOAD_TTL']
+        )
+    return _upload_manager
+
+@bp.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """建立分段上傳（JSON: filename、size），回傳 upload_id 與建議的分段大小
+    
+    之後以 PUT /api/uploads/<upload_id>?offset=N 依序上傳各段（請求內容為原始
+    位元組，X-Chunk-SHA256 標頭為該段的 SHA-256），最後呼叫 finalize 開始轉換。
+    """
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '')
+    if not filename.lower().endswith('.pdf'):
+        return jsonify({'error': '請上傳PDF檔案'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': '缺少檔案大小 size'}), 400
+    
+    manager = get_upload_manager()
+    try:
+        state = manager.create(filename, size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413 if size > 0 else 400
+    
+    upload_id = state['upload_id']
+    logger.info(f"建立分段上傳 {upload_id}: {filename}（{size} 位元組）")
+    return jsonify({
+        'upload_id': upload_id,
+        'chunk_size': manager.chunk_size,
+        'offset': 0,
+        'upload_url': f'/api/uploads/{upload_id}',
+        'finalize_url': f'/api/uploads/{upload_id}/finalize'
+    }), 201
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """查詢已接收的位移量（中斷後從 offset 處續傳）"""
+    state = get_upload_manager().status(upload_id)
+    if state is None:
+        return jsonify({'error': '找不到此上傳'}), 404
+    return jsonify(_upload_state(state))
+
+@bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """上傳一段內容：直接從請求串流寫入磁碟，不經過表單解析
+    
+    位移不符回傳 409 與伺服器目前的 offset；校驗失敗回傳 422，該段不會寫入。
+    """
+    offset = request.args.get('offset', type=int)
+    sha256 = request.headers.get('X-Chunk-SHA256')
+    if offset is None or not sha256:
+        return jsonify({'error': '缺少 offset 參數或 X-Chunk-SHA256 標頭'}), 400
+    if request.content_length is None:
+        return jsonify({'error': '缺少 Content-Length'}), 411
+    
+    try:
+        state = get_upload_manager().write_chunk(upload_id, offset, request.stream,
+                                                 request.content_length, sha256)
+    except UploadError as e:
+        return _upload_error(e)
+    if state is None:
+        return jsonify({'error': '找不到此上傳'}), 404
+    return jsonify(_upload_state(state))
+
+@bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """完成分段上傳（可附 JSON sha256 校驗完整檔案），排入非同步轉換工作"""
+    manager = get_upload_manager()
+    data = request.get_json(silent=True) or {}
+    try:
+        # 暫存檔在上傳的檔案鎖內移入工作目錄（同一檔案系統時只是改名），不再複製一次；
+        # 重複的 finalize 回傳同一個工作
+        job_id = manager.finalize(upload_id, get_job_manager().submit_file, sha256=data.get('sha256'))
+    except UploadError as e:
+        return _upload_error(e)
+    except PoolSaturated as e:
+        # 上傳保留原處，稍後重送 finalize 即可
+        return _pool_saturated(e)
+    if job_id is None:
+        return jsonify({'error': '找不到此上傳'}), 404
+    
+    logger.info(f"分段上傳 {upload_id} 完成，轉換工作 {job_id}")
+    return _job_accepted(job_id)
+
+@bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """放棄分段上傳並刪除已接收的內容"""
+    if not get_upload_manager().discard(upload_id):
+        return jsonify({'error': '找不到此上傳'}), 404
+    return '', 204
+
+def _upload_error(e):
+    """分段上傳錯誤的回應：位移不符 409、校驗失敗 422、其他 400，皆附上伺服器目前的 offset"""
+    if isinstance(e, OffsetMismatch):
+        code = 409
+    elif isinstance(e, ChecksumMismatch):
+        code = 422
+    else:
+        code = 400
+    return jsonify({'error': str(e), 'offset': e.offset}), code
+
+def _upload_state(state):
+    return {
+        'upload_id': state['upload_id'],
+        'filename': state['filename'],
+        'size': state['size'],
+        'offset': state['offset'],
+        'chunks': len(state['chunks']),
+        'complete': state['offset'] == state['size'],
+        'job_id': state.get('job_id')  # finalize 後的轉換工作
+    }
+
+@bp.route('/api/orders', methods=['GET'])
+def query_orders():
+    """查詢訂單資料庫（不重新抽取PDF）
+    
+    條件：work_order_no、sales_order_no、customer、from / to（上線日 YYYY-MM-DD）、
+    code（材料代碼）；limit（上限 ORDER_QUERY_MAX_LIMIT）與 offset 分頁。
+    """
+    store = get_order_store()
+    if store is None:
+        return jsonify({'error': '訂單資料庫未啟用（請設定 ORDER_STORE_PATH）'}), 404
+    try:
+        limit = min(int(request.args.get('limit', 100)), ORDER_QUERY_MAX_LIMIT)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit 與 offset 必須為整數'}), 400
+    if limit < 0 or offset < 0:
+        return jsonify({'error': 'limit 與 offset 不可為負數'}), 400
+    
+    started = time.perf_counter()
+    orders = store.query_orders(limit=limit, offset=offset, **_order_filters())
+    return jsonify({
+        'orders': orders,
+        'count': len(orders),
+        'offset': offset,
+        'query_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@bp.route('/api/materials/demand', methods=['GET'])
+def material_demand():
+    """各材料的總需求量、已領量與使用次數（條件同 /api/orders，另可指定 category）"""
+    store = get_order_store()
+    if store is None:
+        return jsonify({'error': '訂單資料庫未啟用（請設定 ORDER_STORE_PATH）'}), 404
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'limit 必須為整數'}), 400
+    
+    started = time.perf_counter()
+    materials = store.material_demand(category=request.args.get('category') or None, limit=limit,
+                                      **_order_filters())
+    return jsonify({
+        'materials': materials,
+        'count': len(materials),
+        'query_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+def _order_filters():
+    """查詢字串 → OrderStore 查詢條件"""
+    return {
+        'work_order_no': request.args.get('work_order_no'),
+        'sales_order_no': request.args.get('sales_order_no'),
+        'customer': request.args.get('customer'),
+        'date_from': request.args.get('from'),
+        'date_to': request.args.get('to'),
+        'material_code': request.args.get('code')
+    }
+
+@bp.route('/health', methods=['GET'])
 def health_check():
-    """健康檢查端點"""
+    """健康檢查端點（不觸發任何重量級模組的載入）"""
+    page_cache = _page_cache
     return jsonify({
         'status': 'ok',
         'message': 'PDF轉Excel服務運行正常',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'page_cache': page_cache.stats() if page_cache is not None else None,
+        'conversion_pool': _conversion_pool.stats() if _conversion_pool is not None else None
     })
 
-@app.errorhandler(413)
+@bp.route('/ready', methods=['GET'])
+def ready_check():
+    """就緒檢查：預熱完成前回傳 503，並回報匯入與預熱耗時"""
+    warm_up = current_app.extensions['warm_up']
+    ready = warm_up is None or warm_up.ready
+    return jsonify({
+        'ready': ready,
+        'import_seconds': round(IMPORT_SECONDS, 4) if IMPORT_SECONDS is not None else None,
+        'warm_up': warm_up.status() if warm_up is not None else None
+    }), 200 if ready else 503
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 格式的效能指標（本程序）"""
+    if not metrics.is_enabled():
+        return jsonify({'error': '效能指標未啟用'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.app_errorhandler(413)
 def too_large(e):
-    return jsonify({'error': '檔案過大，請上傳小於50MB的PDF檔案'}), 413
+    return jsonify({'error': '檔案過大，請上傳小於50MB的PDF檔案（較大的檔案請使用分段上傳 /api/uploads）'}), 413
+
+app = create_app()
+
+# 本模組的匯入耗時（WARMUP=sync 時包含預熱）
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
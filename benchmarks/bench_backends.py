@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文字抽取後端基準測試 - 比較各後端的頁/秒，並確認抽取出的訂單完全相同
+
+使用方式: python -m benchmarks.bench_backends [工單.pdf] [重複次數]
+（未指定 PDF 時使用 20 頁的合成工單）
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_pdf
+from final.backends import BACKENDS
+from final.pdf_extractor import FinalPDFExtractor
+
+
+def run_backend(pdf_path, backend, repeat):
+    """回傳 (最佳耗時秒數, 頁數, 訂單)"""
+    best = None
+    for _ in range(repeat):
+        extractor = FinalPDFExtractor(pdf_path, backend=backend)
+        started = time.perf_counter()
+        orders = extractor.extract_orders()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, extractor.page_count, orders
+
+
+def main():
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if len(sys.argv) > 1:
+            pdf_path = sys.argv[1]
+        else:
+            pdf_path = generate_pdf(os.path.join(temp_dir, "synthetic.pdf"), 20)
+        results = {name: run_backend(pdf_path, name, repeat) for name in BACKENDS}
+    baseline_seconds, page_count, baseline_orders = results['pdfplumber']
+    baseline = [order.to_dict() for order in baseline_orders]
+
+    print(f"📄 {pdf_path}: {page_count} 頁 / {len(baseline)} 筆工單（取 {repeat} 次最佳）")
+    for name, (seconds, _, orders) in results.items():
+        same = [order.to_dict() for order in orders] == baseline
+        print(f"⚡ {name:<10}: {page_count / seconds:8.1f} 頁/秒 "
+              f"({baseline_seconds / seconds:.2f}x)  訂單{'相同 ✅' if same else '不同 ❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+材料欄位基準測試 - 比較 MaterialIndex 逐筆累加與 MaterialTable 向量化計算
+訂單明細分類材料欄位、材料統計與統計摘要的耗時，並確認兩種做法產生的
+Excel 檔位元組完全相同
+
+使用方式: python -m benchmarks.bench_materials [工單筆數] [重複次數]
+（預設 30000 筆工單，約 11 萬列耗料）
+"""
+
+import hashlib
+import io
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_lines
+from final.excel_writer import BASE_COLUMNS, MATERIAL_COLUMNS, normalize_workbook, order_row
+from final.material_index import MaterialIndex
+from final.material_table import MaterialTable
+from final.pdf_extractor import FinalPDFExtractor
+
+PROCESSED_AT = datetime(2025, 8, 5, 12, 0, 0)
+
+
+class LegacyExtractor(FinalPDFExtractor):
+    """舊版 Excel 輸出（以 MaterialIndex 逐筆產生分類材料欄位與統計）"""
+
+    def _save_to_excel(self, excel_path, streaming=False):
+        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+            index = self.material_index
+            df_data = [order_row(order, columns)
+                       for order, columns in zip(self.orders, index.order_columns)]
+            df = pd.DataFrame(df_data)
+            other_columns = [col for col in df.columns
+                             if col not in BASE_COLUMNS + MATERIAL_COLUMNS
+                             and not col.startswith("耗料")]
+            column_order = BASE_COLUMNS + MATERIAL_COLUMNS + other_columns
+            df = df.reindex(columns=[col for col in column_order if col in df.columns])
+            df.to_excel(writer, sheet_name='訂單明細', index=False)
+            pd.DataFrame(index.material_statistics()).to_excel(writer, sheet_name='材料統計', index=False)
+            pd.DataFrame([index.statistics(self._processed_at())]).to_excel(writer, sheet_name='統計摘要', index=False)
+        normalize_workbook(excel_path)
+
+
+def legacy_materials(orders):
+    """舊版：逐筆累加材料索引，回傳 (訂單明細, 材料統計, 統計摘要)"""
+    index = MaterialIndex.build(orders)
+    df = pd.DataFrame([order_row(order, columns) for order, columns in zip(orders, index.order_columns)])
+    return df, pd.DataFrame(index.material_statistics()), index.statistics(PROCESSED_AT)
+
+
+def vectorized_materials(orders):
+    """新版：扁平材料表，回傳 (訂單明細, 材料統計, 統計摘要)"""
+    table = MaterialTable.build(orders)
+    df = pd.DataFrame([order_row(order, {}) for order in orders])
+    for column, values in table.order_columns().items():
+        df[column] = values
+    return df, table.material_statistics(), table.statistics(df, PROCESSED_AT)
+
+
+def best_of(func, orders, repeat):
+    """回傳 (最佳耗時秒數, 結果)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(orders)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def workbook_digest(extractor_class, orders):
+    """以指定的 Excel 輸出產生活頁簿，回傳 (耗時秒數, SHA-256)"""
+    extractor = extractor_class("synthetic.pdf", quiet=True)
+    extractor.orders = orders
+    extractor.processed_at = PROCESSED_AT
+    buffer = io.BytesIO()
+    started = time.perf_counter()
+    extractor._save_to_excel(buffer)
+    return time.perf_counter() - started, hashlib.sha256(buffer.getvalue()).hexdigest()
+
+
+def main():
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    orders = FinalPDFExtractor("synthetic.pdf", quiet=True)._parse_variable_format(generate_lines(order_count))
+    material_rows = sum(len(order["耗料"]) for order in orders)
+    print(f"🧪 {len(orders)} 筆工單 / {material_rows} 列耗料（取 {repeat} 次最佳）")
+
+    legacy_seconds, legacy = best_of(legacy_materials, orders, repeat)
+    vector_seconds, vector = best_of(vectorized_materials, orders, repeat)
+    same = (legacy[0].astype(object).equals(vector[0][legacy[0].columns].astype(object))
+            and legacy[1].astype(object).equals(vector[1].astype(object))
+            and legacy[2] == vector[2])
+    print(f"⚡ MaterialIndex 逐筆: {legacy_seconds * 1000:8.1f} ms")
+    print(f"⚡ MaterialTable 向量化: {vector_seconds * 1000:8.1f} ms "
+          f"({legacy_seconds / vector_seconds:.2f}x)  結果{'相同 ✅' if same else '不同 ❌'}")
+
+    legacy_excel, legacy_digest = workbook_digest(LegacyExtractor, orders)
+    vector_excel, vector_digest = workbook_digest(FinalPDFExtractor, orders)
+    print(f"📊 _save_to_excel: 舊版 {legacy_excel:.2f} 秒 / 新版 {vector_excel:.2f} 秒  "
+          f"Excel檔{'位元組相同 ✅' if legacy_digest == vector_digest else '不同 ❌'}")
+
+
+if __name__ == "__main__":
+    main()
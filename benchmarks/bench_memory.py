@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+訂單記憶體基準測試 - 比較舊版 dict 結構與 __slots__ 紀錄每筆訂單佔用的位元組
+
+使用方式: python -m benchmarks.bench_memory [工單筆數]
+"""
+
+import contextlib
+import gc
+import io
+import sys
+import tracemalloc
+
+from benchmarks.bench_parser import LegacyExtractor
+from benchmarks.synthetic import generate_lines
+from final.pdf_extractor import FinalPDFExtractor
+
+
+def retained_bytes(extractor, lines):
+    """解析後仍被訂單佔用的位元組數（回傳 (位元組, 訂單, 材料項數)）"""
+    gc.collect()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        orders = extractor._parse_variable_format(lines)
+    extractor = None
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    materials = sum(len(order["耗料"]) for order in orders)
+    return current, orders, materials
+
+
+def main():
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lines = generate_lines(order_count)
+
+    dict_bytes, dict_orders, materials = retained_bytes(LegacyExtractor("synthetic.pdf"), lines)
+    del dict_orders
+    record_bytes, record_orders, _ = retained_bytes(FinalPDFExtractor("synthetic.pdf"), lines)
+
+    print(f"📄 合成資料: {order_count} 筆工單 / {materials} 項材料")
+    print(f"📦 dict 結構: {dict_bytes / order_count:,.0f} bytes/訂單 ({dict_bytes / 1024 / 1024:.1f} MB)")
+    print(f"🗜️  slots紀錄: {record_bytes / order_count:,.0f} bytes/訂單 ({record_bytes / 1024 / 1024:.1f} MB)")
+    print(f"⚡ 節省比例: {1 - record_bytes / dict_bytes:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平行分片基準測試 - 比較不同子程序數的頁/秒與相對單程序的加速比，
+並確認接合後的訂單與單程序完全相同
+
+合成工單每頁 40 行、每筆工單行數不固定，許多分片邊界落在 PD 區塊中間；
+結果列出被分片邊界切開的區塊數，確認接合步驟確實被測到。
+任一子程序數的結果與單程序不同時以結束碼 1 結束。
+
+使用方式: python -m benchmarks.bench_parallel [工單.pdf] [--pages 200] [--workers 1,2,4]
+                                              [--repeat 1] [--backend pdfminer]
+（未指定 PDF 時使用 --pages 頁的合成工單）
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_pdf
+from final.backends import BACKENDS, get_backend
+from final.pdf_extractor import FinalPDFExtractor, shard_bounds
+
+
+def run(pdf_path, workers, backend, repeat):
+    """回傳 (最佳耗時秒數, 訂單)"""
+    best = None
+    for _ in range(repeat):
+        extractor = FinalPDFExtractor(pdf_path, backend=backend, quiet=True)
+        started = time.perf_counter()
+        orders = extractor.extract_orders(workers=workers)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, orders
+
+
+def split_blocks(pdf_path, workers, backend):
+    """分片邊界中落在 PD 區塊中間（該頁第一行不是 PD 行）的個數與總邊界數"""
+    with get_backend(backend).open(pdf_path) as pdf:
+        bounds = shard_bounds(pdf.page_count, workers)[1:-1]
+        split = 0
+        for page_num in bounds:
+            lines = FinalPDFExtractor._split_lines(pdf.page_text(page_num))
+            if lines and not lines[0].startswith('PD'):
+                split += 1
+    return split, len(bounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="平行分片基準測試")
+    parser.add_argument("pdf", nargs="?", help="工單 PDF（未指定時產生合成工單）")
+    parser.add_argument("--pages", type=int, default=200, help="合成工單頁數")
+    parser.add_argument("--workers", default=None,
+                        help="以逗號分隔的子程序數（預設 2、4、8… 到CPU核心數）")
+    parser.add_argument("--repeat", type=int, default=1, help="每種設定重複次數（取最佳）")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=None, help="文字抽取後端")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(value) for value in args.workers.split(',')]
+    else:
+        worker_counts = sorted({2, cpus} | {count for count in (4, 8, 16, 32) if count < cpus})
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = args.pdf or generate_pdf(os.path.join(temp_dir, "synthetic.pdf"), args.pages)
+        baseline_seconds, baseline_orders = run(pdf_path, 1, args.backend, args.repeat)
+        baseline = [order.to_dict() for order in baseline_orders]
+        with get_backend(args.backend).open(pdf_path) as pdf:
+            page_count = pdf.page_count
+
+        print(f"📄 {pdf_path}: {page_count} 頁 / {len(baseline)} 筆工單"
+              f"（CPU核心 {cpus}，取 {args.repeat} 次最佳）")
+        print(f"⚡ workers= 1: {page_count / baseline_seconds:8.1f} 頁/秒 (1.00x)")
+
+        mismatched = False
+        for workers in worker_counts:
+            if workers <= 1:
+                continue
+            seconds, orders = run(pdf_path, workers, args.backend, args.repeat)
+            same = [order.to_dict() for order in orders] == baseline
+            mismatched = mismatched or not same
+            split, boundaries = split_blocks(pdf_path, workers, args.backend)
+            print(f"⚡ workers={workers:>2}: {page_count / seconds:8.1f} 頁/秒 "
+                  f"({baseline_seconds / seconds:.2f}x)  "
+                  f"跨分片區塊 {split}/{boundaries}  訂單{'相同 ✅' if same else '不同 ❌'}")
+
+    if cpus < max(worker_counts):
+        print(f"⚠️ CPU核心只有 {cpus} 個，超過的子程序數不會再加速")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+區塊解析器微基準測試 - 比較逐一 re.match 的舊版解析與預先編譯分類器的行/秒
+
+使用方式: python -m benchmarks.bench_parser [工單筆數]
+"""
+
+import contextlib
+import io
+import re
+import sys
+import time
+
+from benchmarks.synthetic import generate_lines
+from final.pdf_extractor import FinalPDFExtractor
+
+
+class LegacyExtractor(FinalPDFExtractor):
+    """舊版解析邏輯（逐個 token 比對四個樣式字串、子字串判斷行類型，
+    訂單與材料皆為 dict）"""
+
+    valid_patterns = [
+        r'^H[A-Z]-',
+        r'^I[AB][A-Z]{2,3}\d+z$',
+        r'^[A-Z]{1,2}$',
+        r'^\d+$'
+    ]
+
+    def _report_order(self, order):
+        customer = order.get('客戶名稱', 'Unknown')
+        product = order.get('上階品名', 'Unknown')
+        material_count = len(order.get('耗料', []))
+        print(f"    ✅ {order['工單單號']} - {customer} - {product} ({material_count}種材料)")
+
+    def _parse_order_block(self, block_lines):
+        if len(block_lines) < 2:
+            return None
+        order = self._create_empty_order()
+        if not self._parse_main_line(order, block_lines[0]):
+            return None
+        for line in block_lines[1:]:
+            if 'SD' in line or 'SA' in line:
+                self._parse_secondary_line(order, line)
+            elif '耗料代碼' in line or '需求量' in line or '已領量' in line:
+                continue
+            else:
+                self._parse_material_line(order, line)
+        if "耗料" not in order:
+            order["耗料"] = []
+        return order
+
+    def _parse_main_line(self, order, line) -> bool:
+        parts = line.split()
+        if len(parts) < 6:  # 放寬要求：最少需要6個欄位
+            return False
+        
+        try:
+            order["工單單號"] = parts[0]  # PD20250805002
+            order["上線日"] = parts[1].replace('/', '-')  # 2025/08/06 -> 2025-08-06
+            order["客戶名稱"] = parts[2]  # 客戶名稱
+            
+            # 品號+品名處理
+            no_and_name = parts[3]
+            if '包膠' in no_and_name:
+                order["NO"] = no_and_name.replace('包膠', '')
+                order["品名"] = '包膠'
+            elif '包套管' in no_and_name:
+                order["NO"] = no_and_name.replace('包套管', '')
+                order["品名"] = '包套管'
+            elif '面層包膠' in no_and_name:
+                order["NO"] = no_and_name.replace('面層包膠', '')
+                order["品名"] = '面層包膠'
+            else:
+                order["NO"] = no_and_name
+            
+            order["上階品名"] = parts[4]
+            order["上階規格"] = parts[5] if len(parts) > 5 else ""
+            
+            # 數字欄位處理（容錯處理）
+            order["總長"] = 0
+            order["數量"] = 1
+            order["顏色"] = ""
+            order["硬度"] = None
+            order["硬度公差"] = None
+            
+            # 如果有足夠欄位，嘗試解析數字和顏色
+            if len(parts) > 6:
+                try:
+                    order["總長"] = int(parts[6]) if parts[6].isdigit() else 0
+                except (ValueError, IndexError):
+                    pass
+            
+            if len(parts) > 7:
+                try:
+                    order["數量"] = int(parts[7]) if parts[7].isdigit() else 1
+                except (ValueError, IndexError):
+                    pass
+            
+            if len(parts) > 8:
+                order["顏色"] = parts[8]
+            
+            # 硬度±公差處理（如果存在）
+            if len(parts) > 9:
+                try:
+                    hardness_str = parts[9]
+                    hardness_match = re.match(r'(\d+)±(\d+)', hardness_str)
+                    if hardness_match:
+                        order["硬度"] = int(hardness_match.group(1))
+                        order["硬度公差"] = int(hardness_match.group(2))
+                    elif hardness_str.isdigit():
+                        order["硬度"] = int(hardness_str)
+                        order["硬度公差"] = 5  # 預設公差
+                except (ValueError, IndexError):
+                    pass
+            
+            return True
+            
+        except (ValueError, IndexError) as e:
+            print(f"      ⚠️ 主行解析錯誤: {e}")
+            return False
+    
+    def _parse_secondary_line(self, order, line):
+        parts = line.split()
+        if len(parts) >= 2:
+            order["產品類別"] = parts[0]  # A, B, C, etc.
+            order["訂單單號"] = parts[1]  # SD20250804004-001
+            
+            # 備註處理（跳過固定文字）
+            skip_words = {'耗料代碼', '需求量', '已領量', '模具'}
+            remarks = []
+            
+            for part in parts[2:]:
+                if part not in skip_words:
+                    remarks.append(part)
+            
+            if remarks:
+                order["客戶備註"] = ' '.join(remarks)
+
+    def _parse_material_line(self, order, line):
+        tokens = line.split()
+        if len(tokens) < 2:
+            return
+        i = 0
+        while i + 1 < len(tokens):
+            code = tokens[i]
+            if any(re.match(pattern, code) for pattern in self.valid_patterns):
+                try:
+                    need_qty = float(tokens[i + 1])
+                    received_qty = float(tokens[i + 2]) if i + 2 < len(tokens) else 0.0
+                    order.setdefault("耗料", []).append({
+                        "代碼": code,
+                        "需求量": need_qty,
+                        "已領量": received_qty
+                    })
+                    if re.match(r'^I[AB][A-Z]{2,3}\d+z$', code):
+                        print(f"      🔍 特殊材料: {code}")
+                    i += 3
+                    continue
+                except (ValueError, IndexError):
+                    pass
+            i += 1
+
+    def _create_empty_order(self):
+        return {
+            "上線日": None,
+            "客戶名稱": None,
+            "上階品名": None,
+            "上階規格": None,
+            "數量": None,
+            "硬度": None,
+            "硬度公差": None,
+            "客戶備註": None,
+            "顏色": None,
+            "工單單號": None,
+            "產品類別": None,
+            "訂單單號": None,
+            "NO": None,
+            "品名": None,
+            "總長": None,
+            "耗料": []
+        }
+
+
+def run(extractor, lines, repeat=3):
+    """回傳 (最佳耗時秒數, 訂單)"""
+    best = None
+    orders = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            orders = extractor._parse_variable_format(lines)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, orders
+
+
+def main():
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    lines = generate_lines(order_count)
+
+    legacy_time, legacy_orders = run(LegacyExtractor("synthetic.pdf"), lines)
+    compiled_time, compiled_orders = run(FinalPDFExtractor("synthetic.pdf"), lines)
+
+    if legacy_orders != compiled_orders:
+        print("❌ 兩種解析結果不一致")
+        sys.exit(1)
+
+    print(f"📄 合成資料: {order_count} 筆工單 / {len(lines)} 行")
+    print(f"🐢 舊版解析: {len(lines) / legacy_time:,.0f} 行/秒 ({legacy_time:.3f}s)")
+    print(f"🚀 編譯解析: {len(lines) / compiled_time:,.0f} 行/秒 ({compiled_time:.3f}s)")
+    print(f"⚡ 加速倍數: {legacy_time / compiled_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轉換流程基準測試 - 以合成工單 PDF（1 到 1000 頁）分別計時各階段：
+開啟PDF、抽取文字、_parse_variable_format、統計、_save_to_excel，
+記錄吞吐量與各階段的記憶體峰值，結果存成 JSON 以便比較不同版本
+
+使用方式: python -m benchmarks.bench_pipeline [--sizes 1,10,100,1000] [--backend pdfminer]
+                                              [--output 結果.json] [--compare 上次結果.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from importlib import metadata
+
+from benchmarks.synthetic import generate_pdf
+from final.backends import BACKENDS
+from final.pdf_extractor import FinalPDFExtractor
+
+STAGES = ["open", "extract_text", "parse", "statistics", "save_excel"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PACKAGES = ["pdfplumber", "pdfminer.six", "pandas", "openpyxl"]
+
+
+class StageTimer:
+    """記錄各階段耗時；memory=True 時同時記錄各階段的 tracemalloc 峰值"""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.seconds = {}
+        self.peak_bytes = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        yield
+        self.seconds[name] = time.perf_counter() - started
+        if self.memory:
+            self.peak_bytes[name] = tracemalloc.get_traced_memory()[1]
+
+
+def run_stages(pdf_path, backend, timer):
+    """依序執行各階段，回傳 (頁數, 訂單數)"""
+    extractor = FinalPDFExtractor(pdf_path, backend=backend)
+
+    with timer.stage("open"):
+        document = extractor.backend.open(pdf_path)
+        page_count = document.page_count
+
+    with timer.stage("extract_text"), document:
+        lines = []
+        for page_num in range(page_count):
+            lines.extend(extractor._split_lines(document.page_text(page_num)))
+
+    with timer.stage("parse"):
+        extractor.orders = extractor._parse_variable_format(lines)
+
+    with timer.stage("statistics"):
+        extractor.get_statistics()
+        extractor._get_material_statistics()
+
+    with timer.stage("save_excel"):
+        extractor._save_to_excel(io.BytesIO())
+
+    return page_count, len(extractor.orders)
+
+
+def peak_memory(pdf_path, backend):
+    """以 tracemalloc 重跑一次，回傳各階段的 Python 記憶體峰值（位元組）"""
+    timer = StageTimer(memory=True)
+    tracemalloc.start()
+    try:
+        run_stages(pdf_path, backend, timer)
+    finally:
+        tracemalloc.stop()
+    return timer.peak_bytes
+
+
+def benchmark(page_counts, backend, repeat, fixtures_dir, measure_memory=True):
+    results = []
+    for page_count in page_counts:
+        pdf_path = os.path.join(fixtures_dir, f"synthetic_{page_count}p.pdf")
+        if not os.path.exists(pdf_path):
+            generate_pdf(pdf_path, page_count)
+
+        best = None
+        for _ in range(repeat):
+            timer = StageTimer()
+            pages, orders = run_stages(pdf_path, backend, timer)
+            if best is None or sum(timer.seconds.values()) < sum(best.values()):
+                best = timer.seconds
+        peaks = peak_memory(pdf_path, backend) if measure_memory else {}
+
+        total = sum(best.values())
+        result = {
+            "pages": pages,
+            "orders": orders,
+            "file_bytes": os.path.getsize(pdf_path),
+            "total_seconds": total,
+            "pages_per_sec": pages / total,
+            "orders_per_sec": orders / total,
+            "stages": {stage: {"seconds": best[stage], "peak_bytes": peaks.get(stage)}
+                       for stage in STAGES}
+        }
+        results.append(result)
+        print_result(result)
+    return results
+
+
+def print_result(result):
+    print(f"\n📄 {result['pages']} 頁 / {result['orders']} 筆工單: "
+          f"{result['total_seconds']:.2f} 秒，{result['pages_per_sec']:.1f} 頁/秒，"
+          f"{result['orders_per_sec']:.1f} 筆/秒")
+    for stage, values in result["stages"].items():
+        peak = values["peak_bytes"]
+        peak_text = f"{peak / 1024 / 1024:8.1f} MB" if peak is not None else ""
+        print(f"   {stage:<13}{values['seconds']:9.3f} 秒 {peak_text}")
+
+
+def compare(results, previous_path):
+    """與先前的結果比較各階段耗時（>1 表示變慢）"""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {item["pages"]: item for item in json.load(f)["results"]}
+    print(f"\n📊 與 {previous_path} 比較（耗時比例）")
+    for result in results:
+        old = previous.get(result["pages"])
+        if old is None:
+            continue
+        ratios = "  ".join(f"{stage} {result['stages'][stage]['seconds'] / old['stages'][stage]['seconds']:.2f}x"
+                           for stage in STAGES if old["stages"][stage]["seconds"] > 0)
+        print(f"   {result['pages']:>5} 頁: {ratios}")
+
+
+def environment(backend):
+    """執行環境與套件版本"""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().replace(microsecond=0).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "backend": backend,
+        "packages": versions
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="轉換流程基準測試")
+    parser.add_argument("--sizes", default="1,10,100", help="頁數（逗號分隔，如 1,10,100,1000）")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="pdfplumber")
+    parser.add_argument("--repeat", type=int, default=1, help="每個大小重複次數（取最快）")
+    parser.add_argument("--fixtures", default=None, help="合成 PDF 的存放目錄（預設為暫存目錄）")
+    parser.add_argument("--output", default=None, help="結果 JSON 路徑（預設 benchmarks/results/）")
+    parser.add_argument("--compare", default=None, help="先前的結果 JSON")
+    parser.add_argument("--no-memory", action="store_true", help="不量測記憶體峰值")
+    args = parser.parse_args()
+
+    page_counts = [int(size) for size in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixtures_dir = args.fixtures or temp_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+        results = benchmark(page_counts, args.backend, args.repeat, fixtures_dir,
+                            measure_memory=not args.no_memory)
+
+    report = dict(environment(args.backend), results=results)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果已儲存: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成工單資料產生器 - 產生與真實工單明細表相同結構的文字行
+（PD 主行、SD/SA 次要行、耗料表頭、H/I 系列材料行與中文客戶名稱），
+並可離線寫成 PDF 作為效能測試的固定資料
+
+使用方式: python -m benchmarks.synthetic 輸出.pdf 頁數
+"""
+
+import random
+import sys
+import zlib
+from typing import List
+
+CUSTOMERS = ["台灣橡膠", "大同機械", "永豐工業", "華新精密", "金輪製造", "正新輸送", "建大滾輪"]
+PRODUCTS = ["滾輪", "膠輥", "輸送輪", "壓輪", "導輪"]
+COLORS = ["黑", "紅", "綠", "白"]
+REMARKS = ["急件", "", "", "模具 共用", "客供料"]
+
+
+def material_code(rng: random.Random) -> str:
+    """隨機材料代碼（H系列、特殊I系列、簡化與數字代碼）"""
+    kind = rng.random()
+    if kind < 0.55:
+        return f"H{rng.choice('SCDNAEPB')}-C{rng.randint(1, 9)}-{rng.randint(10, 99)}-02-{rng.choice('AB')}"
+    if kind < 0.85:
+        return f"I{rng.choice('AB')}{rng.choice(['AD', 'AZ', 'BCD'])}{rng.randint(10 ** 11, 10 ** 13)}z"
+    return rng.choice(["C", "G", "21", "35"])
+
+
+def order_lines(index: int, rng: random.Random) -> List[str]:
+    """產生單筆工單的所有行"""
+    day = rng.randint(1, 28)
+    no = f"R{rng.randint(100, 999)}" + rng.choice(["包膠", "包套管", "面層包膠", "", ""])
+    hardness = rng.choice(["70±5", "80±3", "65", ""])
+    main = (f"PD202508{day:02d}{index:05d} 2025/08/{day:02d} {rng.choice(CUSTOMERS)} {no} "
+            f"{rng.choice(PRODUCTS)} φ{rng.randint(20, 90)}x{rng.randint(100, 900)} "
+            f"{rng.randint(100, 2000)} {rng.randint(1, 50)} {rng.choice(COLORS)} {hardness}")
+    secondary = (f"{rng.choice('ABC')} {rng.choice(['SD', 'SA'])}202508{day:02d}{index % 1000:03d}-"
+                 f"{rng.randint(1, 9):03d} {rng.choice(REMARKS)} 耗料代碼 需求量 已領量")
+    lines = [main.strip(), " ".join(secondary.split())]
+    for _ in range(rng.randint(1, 4)):
+        tokens = []
+        for _ in range(rng.randint(1, 2)):
+            tokens += [material_code(rng), f"{rng.randint(1, 5000) / 10}", f"{rng.randint(0, 5)}"]
+        lines.append(" ".join(tokens))
+    return lines
+
+
+def generate_lines(order_count: int, seed: int = 20250805) -> List[str]:
+    """產生 order_count 筆工單的文字行（固定種子，可重現）"""
+    rng = random.Random(seed)
+    lines = []
+    for index in range(order_count):
+        lines.extend(order_lines(index, rng))
+    return lines
+
+
+# 合成 PDF 的版面：每頁行數、字級與行距（點）
+LINES_PER_PAGE = 40
+FONT_SIZE = 8
+LINE_HEIGHT = 18
+
+
+def generate_page_lines(page_count: int, seed: int = 20250805) -> List[str]:
+    """產生剛好 page_count 頁的文字行（最後一筆工單可能被截斷）"""
+    rng = random.Random(seed)
+    wanted = page_count * LINES_PER_PAGE
+    lines = []
+    index = 0
+    while len(lines) < wanted:
+        lines.extend(order_lines(index, rng))
+        index += 1
+    return lines[:wanted]
+
+
+def write_pdf(path: str, lines: List[str], lines_per_page: int = LINES_PER_PAGE):
+    """將文字行寫成 PDF（不需任何第三方套件）
+
+    使用 Adobe 內建的 MSung-Light 字型 (UniCNS-UCS2-H)，不嵌入字型檔；
+    每個 token 以絕對座標定位並留有間距，抽取後會還原成以空白分隔的
+    原始文字行。
+    """
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects: List[bytes] = []
+
+    def add(data: bytes) -> int:
+        objects.append(data)
+        return len(objects)
+
+    font = add(b'')
+    descendant = add(b'')
+    descriptor = add(b'')
+    objects[font - 1] = (f"<< /Type /Font /Subtype /Type0 /BaseFont /MSung-Light "
+                         f"/Encoding /UniCNS-UCS2-H /DescendantFonts [{descendant} 0 R] >>").encode()
+    objects[descendant - 1] = (f"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /MSung-Light "
+                               f"/CIDSystemInfo << /Registry (Adobe) /Ordering (CNS1) /Supplement 0 >> "
+                               f"/FontDescriptor {descriptor} 0 R /DW 1000 /W [1 95 500] >>").encode()
+    objects[descriptor - 1] = (b"<< /Type /FontDescriptor /FontName /MSung-Light /Flags 6 "
+                               b"/FontBBox [0 -200 1000 900] /ItalicAngle 0 /Ascent 880 "
+                               b"/Descent -120 /CapHeight 880 /StemV 93 >>")
+
+    pages_id = add(b'')
+    kids = []
+    for page_lines in pages:
+        ops = []
+        y = 800
+        for line in page_lines:
+            x = 20
+            ops.append(f"BT /F1 {FONT_SIZE} Tf")
+            for token in line.split(" "):
+                ops.append(f"1 0 0 1 {x} {y} Tm <{token.encode('utf-16-be').hex()}> Tj")
+                # 半形字寬為全形的一半，token 之間保留明顯的間距
+                x += sum(FONT_SIZE if ord(c) > 127 else FONT_SIZE // 2 for c in token) + 10
+            ops.append("ET")
+            y -= LINE_HEIGHT
+        stream = zlib.compress("\n".join(ops).encode())
+        contents = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+                       + stream + b"\nendstream")
+        kids.append(add((f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 1400 842] "
+                         f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {contents} 0 R >>").encode()))
+    objects[pages_id - 1] = (f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] "
+                             f"/Count {len(kids)} >>").encode()
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, data in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + data + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_pdf(path: str, page_count: int, seed: int = 20250805) -> str:
+    """產生 page_count 頁的合成工單 PDF，回傳路徑"""
+    write_pdf(path, generate_page_lines(page_count, seed))
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    generate_pdf(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文字抽取後端 - 將 PDF 頁面轉為文字（每行一列）供區塊解析器使用
+
+- pdfplumber（預設）：page.extract_text()，先建立完整的字元物件再依座標分行
+- pdfminer：直接驅動 pdfminer 的版面分析 (LAParams)，略過 pdfplumber 的
+  物件包裝與字元分群；不排序文字框 (boxes_flow=None)，最後把同一高度的
+  文字行依 x 座標接成一行，輸出與 pdfplumber 相同的行
+
+後端物件可序列化，平行模式會將其傳給子程序。
+bytearray、memoryview、mmap 與共享暫存檔（SpoolHandle）以 BufferReader 讀取，
+不複製整份PDF。
+"""
+
+import io
+import mmap
+import os
+from typing import BinaryIO, Dict, List, Optional, Type, Union
+
+import pdfplumber
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTTextContainer, LTTextLine
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+
+from final.spool import BufferReader, SpoolHandle
+
+PdfSource = Union[str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap, SpoolHandle, BinaryIO]
+
+DEFAULT_BACKEND = 'pdfplumber'
+
+# 同一行文字的垂直容許誤差（與 pdfplumber extract_text 的 y_tolerance 相同）
+LINE_Y_TOLERANCE = 3
+
+
+class TextDocument:
+    """已開啟的 PDF（以 with 使用，結束時關閉）"""
+    
+    page_count = 0
+    
+    def page_text(self, page_num: int) -> Optional[str]:
+        """第 page_num 頁（從 0 起算）的文字，處理完即釋放該頁的快取"""
+        raise NotImplementedError
+    
+    def page_object(self, page_num: int):
+        """第 page_num 頁的 pdfminer PDFPage（計算頁面指紋用）"""
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TextBackend:
+    """文字抽取後端"""
+    
+    name = ''
+    
+    def open(self, source: PdfSource) -> TextDocument:
+        raise NotImplementedError
+
+
+class _PdfplumberDocument(TextDocument):
+
+    def __init__(self, source: PdfSource):
+        stream = _binary_source(source)
+        # 由位元組或暫存檔建立的讀取器由本物件關閉（解除映射）
+        self._stream = stream if stream is not source and not isinstance(stream, (str, os.PathLike)) else None
+        try:
+            self._pdf = pdfplumber.open(stream)
+        except Exception:
+            if self._stream is not None:
+                self._stream.close()
+            raise
+        self.page_count = len(self._pdf.pages)
+    
+    def page_text(self, page_num: int) -> Optional[str]:
+        page = self._pdf.pages[page_num]
+        text = page.extract_text()
+        # pdfplumber 0.10+ 的 close() 另外清除文字對照表快取
+        release = getattr(page, 'close', None) or page.flush_cache
+        release()
+        return text
+    
+    def page_object(self, page_num: int):
+        return self._pdf.pages[page_num].page_obj
+    
+    def close(self):
+        self._pdf.close()
+        if self._stream is not None:
+            self._stream.close()
+
+
+class PdfplumberBackend(TextBackend):
+    """pdfplumber 的 extract_text()（原有行為）"""
+    
+    name = 'pdfplumber'
+    
+    def open(self, source: PdfSource) -> TextDocument:
+        return _PdfplumberDocument(source)
+
+
+class _PdfminerDocument(TextDocument):
+
+    def __init__(self, source: PdfSource, laparams: LAParams):
+        stream = _binary_source(source)
+        self._file = open(stream, 'rb') if isinstance(stream, (str, os.PathLike)) else stream
+        self._owns_file = self._file is not source
+        try:
+            document = PDFDocument(PDFParser(self._file))
+            self._pages = list(PDFPage.create_pages(document))
+        except Exception:
+            self.close()
+            raise
+        self.page_count = len(self._pages)
+        
+        resources = PDFResourceManager(caching=True)  # 字型與 CMap 跨頁共用
+        self._device = PDFPageAggregator(resources, laparams=laparams)
+        self._interpreter = PDFPageInterpreter(resources, self._device)
+    
+    def page_text(self, page_num: int) -> Optional[str]:
+        self._interpreter.process_page(self._pages[page_num])
+        layout = self._device.get_result()
+        
+        text_lines = []
+        containers = [layout]
+        while containers:
+            for item in containers.pop():
+                if isinstance(item, LTTextLine):
+                    text_lines.append(item)
+                elif isinstance(item, LTTextContainer):
+                    containers.append(item)
+        
+        # 表格欄位間距大時同一列會分成多個文字框，依高度重新併成一行
+        text_lines.sort(key=lambda line: (-line.y1, line.x0))
+        rows: List[List] = []
+        last_y = None
+        for line in text_lines:
+            if last_y is None or last_y - line.y1 > LINE_Y_TOLERANCE:
+                rows.append([])
+            rows[-1].append(line)
+            last_y = line.y1
+        
+        return '\n'.join(
+            ' '.join(line.get_text().strip() for line in sorted(row, key=lambda line: line.x0))
+            for row in rows
+        )
+    
+    def page_object(self, page_num: int):
+        return self._pages[page_num]
+    
+    def close(self):
+        if self._owns_file:
+            self._file.close()
+
+
+class PdfminerBackend(TextBackend):
+    """直接使用 pdfminer 版面分析的精簡後端"""
+    
+    name = 'pdfminer'
+    
+    def __init__(self, laparams: Optional[LAParams] = None):
+        if laparams is None:
+            laparams = LAParams(line_overlap=0.5, char_margin=2.0, word_margin=0.1,
+                                line_margin=0.5, boxes_flow=None)
+        self.laparams = laparams
+    
+    def open(self, source: PdfSource) -> TextDocument:
+        return _PdfminerDocument(source, self.laparams)
+
+
+BACKENDS: Dict[str, Type[TextBackend]] = {
+    PdfplumberBackend.name: PdfplumberBackend,
+    PdfminerBackend.name: PdfminerBackend,
+}
+
+
+def get_backend(backend: Union[str, TextBackend, None] = None) -> TextBackend:
+    """依名稱（或直接傳入的後端物件）取得後端，None 為預設後端"""
+    if isinstance(backend, TextBackend):
+        return backend
+    name = backend or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"未知的抽取後端: {name}（可用: {', '.join(BACKENDS)}）")
+    return BACKENDS[name]()
+
+
+def _binary_source(source: PdfSource):
+    """路徑原樣回傳，位元組與緩衝區包成讀取器，暫存檔以 mmap 開啟，檔案物件移到開頭"""
+    if isinstance(source, bytes):
+        return io.BytesIO(source)  # BytesIO 與 bytes 共用同一塊記憶體，直到寫入為止
+    if isinstance(source, (bytearray, memoryview, mmap.mmap)):
+        return BufferReader(source)
+    if isinstance(source, SpoolHandle):
+        return source.open()
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    source.seek(0)
+    return source
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批次轉換 - 多個PDF（或ZIP壓縮檔內的PDF）以多個子程序同時抽取，
+輸出一份合併的活頁簿
+
+每個子程序回傳該檔的訂單與材料索引，主程序只合併各檔的彙總值，
+不重新掃描合併後的訂單。總耗時接近最大單一檔案的處理時間。
+記憶體中的PDF先寫入共享暫存檔，子程序只收到 SpoolHandle（見 final.spool）。
+
+網頁服務指定共用轉換程序池（pool）時改用該程序池，不另外建立子程序，
+同時進行的轉換數受程序池的名額限制（不足時拋出 PoolSaturated）。
+"""
+
+import contextlib
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from final.excel_writer import BASE_COLUMNS, MATERIAL_COLUMNS, normalize_workbook, order_row
+from final.material_index import MaterialIndex
+from final.pdf_extractor import FinalPDFExtractor, PdfSource
+from final.spool import PdfSpool, SpoolHandle
+
+# 合併活頁簿中標示訂單來源的欄位
+SOURCE_COLUMN = "來源檔案"
+
+
+class BatchResult:
+    """單一檔案的抽取結果（子程序回傳）"""
+    
+    def __init__(self, name: str, orders: List[Any], index: MaterialIndex, processed_at: datetime):
+        self.name = name
+        self.orders = orders
+        self.index = index
+        self.processed_at = processed_at
+
+
+def read_zip_pdfs(stream: Union[str, BinaryIO], max_bytes: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """讀出ZIP中所有PDF [(檔名, 內容)]，依壓縮檔內順序
+    
+    max_bytes 限制解壓縮後的總大小，超過時拋出 ValueError。
+    """
+    with zipfile.ZipFile(stream) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith('.pdf')
+                   and not os.path.basename(info.filename).startswith('.')]
+        total = sum(info.file_size for info in members)
+        if max_bytes is not None and total > max_bytes:
+            raise ValueError(f"壓縮檔解壓縮後 {total} bytes，超過上限 {max_bytes} bytes")
+        return [(os.path.basename(info.filename), archive.read(info)) for info in members]
+
+
+def convert_batch(sources: List[Tuple[str, PdfSource]], workers: Optional[int] = None,
+                  pool=None) -> List[BatchResult]:
+    """以子程序同時抽取多個PDF，依輸入順序回傳各檔結果
+    
+    sources 為 [(檔名, 路徑、PDF位元組或 SpoolHandle)]。較大的檔案先送出，
+    避免最大的檔案最後才開始而拉長總耗時。workers=None 使用全部CPU核心。
+    pool 為共用轉換程序池（final.pool.ConversionPool）時改在其中抽取並忽略 workers。
+    """
+    if not sources:
+        return []
+    if pool is not None:
+        return _convert_in_pool(sources, pool)
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    if workers == 1:
+        return [_extract_file(name, source) for name, source in sources]
+    
+    with contextlib.ExitStack() as spools:
+        sources = [(name, _shared_source(name, source, spools)) for name, source in sources]
+        order = sorted(range(len(sources)), key=lambda i: _source_size(sources[i][1]), reverse=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {i: pool.submit(_extract_file, *sources[i]) for i in order}
+            return [futures[i].result() for i in range(len(sources))]
+
+
+def merge_results(results: List[BatchResult]) -> Tuple[List[Any], List[str], MaterialIndex, datetime]:
+    """合併各檔結果，回傳 (訂單, 各訂單來源檔名, 合併索引, 處理時間)"""
+    orders = []
+    names = []
+    index = MaterialIndex()
+    for result in results:
+        orders.extend(result.orders)
+        names.extend([result.name] * len(result.orders))
+        index.merge(result.index)
+    processed_at = max((result.processed_at for result in results),
+                       default=datetime.now().replace(microsecond=0))
+    return orders, names, index, processed_at
+
+
+def save_batch_workbook(excel_path: Union[str, BinaryIO], results: List[BatchResult]) -> int:
+    """將批次結果寫成一份活頁簿（訂單明細含來源檔案欄位），回傳訂單數"""
+    orders, names, index, processed_at = merge_results(results)
+    
+    with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+        df_data = []
+        for order, name, columns in zip(orders, names, index.order_columns):
+            row = order_row(order, columns)
+            row[SOURCE_COLUMN] = name
+            df_data.append(row)
+        
+        df = pd.DataFrame(df_data)
+        
+        # 來源檔案放在最前面，其餘欄位順序與單檔輸出相同
+        leading = [SOURCE_COLUMN] + BASE_COLUMNS + MATERIAL_COLUMNS
+        other_columns = [col for col in df.columns
+                         if col not in leading and not col.startswith("耗料")]
+        column_order = leading + other_columns
+        df = df.reindex(columns=[col for col in column_order if col in df.columns])
+        df.to_excel(writer, sheet_name='訂單明細', index=False)
+        
+        pd.DataFrame(index.material_statistics()).to_excel(writer, sheet_name='材料統計', index=False)
+        
+        stats = index.statistics(processed_at)
+        stats["檔案數"] = len(results)
+        pd.DataFrame([stats]).to_excel(writer, sheet_name='統計摘要', index=False)
+    
+    normalize_workbook(excel_path)
+    return len(orders)
+
+
+def _convert_in_pool(sources: List[Tuple[str, PdfSource]], pool) -> List[BatchResult]:
+    """在共用轉換程序池中抽取，最多同時佔用程序池子程序數的名額"""
+    with contextlib.ExitStack() as spools, pool.reserve(min(len(sources), pool.workers)) as lease:
+        sources = [(name, _shared_source(name, source, spools)) for name, source in sources]
+        order = sorted(range(len(sources)), key=lambda i: _source_size(sources[i][1]), reverse=True)
+        
+        def convert(i: int) -> BatchResult:
+            name, source = sources[i]
+            result = pool.convert(source, name, None, lease=lease)
+            return BatchResult(name, result.orders, result.index, result.processed_at)
+        
+        with ThreadPoolExecutor(max_workers=lease.slots) as threads:
+            futures = {i: threads.submit(convert, i) for i in order}
+            return [futures[i].result() for i in range(len(sources))]
+
+
+def _extract_file(name: str, source: PdfSource) -> BatchResult:
+    """子程序工作：抽取單一檔案並建立其材料索引"""
+    extractor = FinalPDFExtractor(source, name=name, quiet=True)
+    extractor.extract_orders()
+    return BatchResult(name, extractor.orders, extractor.material_index, extractor.processed_at)
+
+
+def _shared_source(name: str, source: PdfSource, spools: contextlib.ExitStack) -> PdfSource:
+    """PDF位元組寫入共享暫存檔（批次結束時刪除），其他來源直接傳給子程序"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return spools.enter_context(PdfSpool.from_source(source, name=name)).handle()
+    return source
+
+
+def _source_size(source: PdfSource) -> int:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if isinstance(source, SpoolHandle):
+        return source.size
+    return len(source)
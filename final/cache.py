@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轉換結果快取 - 以上傳檔案內容的 SHA-256 為鍵，儲存解析後的訂單與 Excel 檔
+
+快取放在磁碟上，可由多個 gunicorn worker 共用：
+- 寫入先寫暫存檔再以 os.replace 原子替換，讀取端不會看到寫到一半的檔案
+- 命中時更新檔案修改時間，作為 LRU 的存取時間
+- 超過位元組預算或存活時間 (TTL) 的項目在寫入後清除，清除時以檔案鎖互斥
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+from final.records import as_dict
+from final.spool import SpoolHandle
+
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，僅略過清除時的跨程序互斥
+    fcntl = None
+
+WORKBOOK_SUFFIX = '.xlsx'
+ORDERS_SUFFIX = '.json'
+TEMP_PREFIX = '.tmp-'
+STALE_TEMP_SECONDS = 3600  # 寫入中斷遺留的暫存檔保留時間
+HASH_BUFFER = 1024 * 1024  # 計算快取鍵時每次讀取的位元組數
+
+
+class ConversionCache:
+    """磁碟型轉換快取（內容定址、位元組上限、LRU/TTL 清除）"""
+    
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024,
+                 ttl: Optional[float] = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+    
+    @staticmethod
+    def key_for(source: Union[bytes, str, SpoolHandle, BinaryIO]) -> str:
+        """計算PDF內容（位元組、路徑、SpoolHandle 或可 seek 的檔案物件）的快取鍵（SHA-256）"""
+        if isinstance(source, bytes):
+            return hashlib.sha256(source).hexdigest()
+        digest = hashlib.sha256()
+        if isinstance(source, SpoolHandle):
+            source = source.path
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_BUFFER), b''):
+                    digest.update(chunk)
+        else:
+            source.seek(0)
+            for chunk in iter(lambda: source.read(HASH_BUFFER), b''):
+                digest.update(chunk)
+            source.seek(0)
+        return digest.hexdigest()
+    
+    def get_workbook(self, key: str) -> Optional[bytes]:
+        """取得快取的 Excel 檔內容，未命中回傳 None"""
+        return self._read(key + WORKBOOK_SUFFIX)
+    
+    def get_orders(self, key: str) -> Optional[Dict[str, Any]]:
+        """取得快取的解析結果 {"processed_at": ..., "orders": [...]}，未命中回傳 None"""
+        data = self._read(key + ORDERS_SUFFIX)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+    
+    def put(self, key: str, orders: Optional[Dict[str, Any]] = None,
+            workbook: Optional[bytes] = None):
+        """寫入解析結果與（或）Excel 檔，並依預算清除舊項目"""
+        if orders is not None:
+            payload = json.dumps(orders, ensure_ascii=False, default=as_dict).encode('utf-8')
+            self._write(key + ORDERS_SUFFIX, payload)
+        if workbook is not None:
+            self._write(key + WORKBOOK_SUFFIX, workbook)
+        self.evict()
+    
+    def evict(self):
+        """清除過期項目，並由最久未使用者開始清除直到總大小不超過預算"""
+        with self._lock():
+            now = time.time()
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.startswith(TEMP_PREFIX):
+                        if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                            self._remove(entry.path)
+                        continue
+                    if not entry.name.endswith((WORKBOOK_SUFFIX, ORDERS_SUFFIX)):
+                        continue
+                    if self.ttl is not None and now - stat.st_mtime > self.ttl:
+                        self._remove(entry.path)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+    
+    def _read(self, name: str) -> Optional[bytes]:
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if self.ttl is not None and time.time() - os.stat(path).st_mtime > self.ttl:
+                return None
+            os.utime(path)  # 記錄存取時間供 LRU 使用
+        except FileNotFoundError:
+            # 可能剛好被其他 worker 清除
+            return None
+        return data
+    
+    def _write(self, name: str, data: bytes):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, os.path.join(self.directory, name))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+    
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    
+    def _lock(self):
+        return _FileLock(os.path.join(self.directory, '.lock'))
+
+
+class _FileLock:
+    """以 flock 實作的跨程序互斥鎖"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+    
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+    
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
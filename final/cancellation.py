@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+協作式取消 - 抽取器在每頁與每個 PD 區塊之間檢查取消旗標與期限
+
+CancelToken 可由其他執行緒觸發（例如偵測到用戶端斷線），並可附帶期限
+（time.time() 時間戳）。以 CancelToken.shared() 建立時取消旗標另以
+暫存檔標記，複製到轉換程序池的子程序後仍能看到父程序的取消。
+
+DisconnectWatcher 在背景執行緒中定期檢查請求的連線，連線被重設（用戶端
+關閉分頁、代理逾時）時觸發取消，讓 worker 不必把沒有人下載的檔案處理完。
+"""
+
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from typing import Optional
+
+CANCELLED = 'cancelled'
+DEADLINE = 'deadline'
+
+_REASONS = {
+    CANCELLED: '轉換已取消',
+    DEADLINE: '轉換超過時限'
+}
+
+
+class ConversionCancelled(Exception):
+    """轉換被取消或超過期限（reason 為 CANCELLED 或 DEADLINE）"""
+    
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+    
+    def __str__(self) -> str:
+        return _REASONS.get(self.reason, self.reason)
+
+
+class CancelToken:
+    """取消旗標與期限"""
+    
+    def __init__(self, deadline: Optional[float] = None, path: Optional[str] = None):
+        self.deadline = deadline  # time.time() 時間戳，None 不限時間
+        self.path = path          # 跨程序的取消標記檔（shared() 建立）
+        self.reason: Optional[str] = None
+        self.partial: Optional[str] = None  # 轉換以部分結果結束時的原因（由轉換流程記錄）
+        self._event = threading.Event()
+    
+    @classmethod
+    def shared(cls, deadline: Optional[float] = None) -> 'CancelToken':
+        """可跨程序檢查的取消旗標（用完需呼叫 close() 刪除標記檔）"""
+        path = os.path.join(tempfile.gettempdir(), f'pdf-cancel-{uuid.uuid4().hex}')
+        return cls(deadline=deadline, path=path)
+    
+    @classmethod
+    def with_timeout(cls, seconds: float, shared: bool = False) -> 'CancelToken':
+        """從現在起 seconds 秒後到期（0 或負數不限時間）"""
+        deadline = time.time() + seconds if seconds > 0 else None
+        return cls.shared(deadline) if shared else cls(deadline)
+    
+    def cancel(self, reason: str = CANCELLED):
+        """觸發取消（可重複呼叫，保留第一次的原因）"""
+        if self._event.is_set():
+            return
+        self.reason = reason
+        self._event.set()
+        if self.path is not None:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(reason)
+    
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.reason = f.read() or CANCELLED
+            except FileNotFoundError:  # 父程序已 close()
+                self.reason = CANCELLED
+            self._event.set()
+            return True
+        return False
+    
+    def check(self):
+        """已取消或超過期限時拋出 ConversionCancelled"""
+        if self.cancelled:
+            raise ConversionCancelled(self.reason)
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise ConversionCancelled(DEADLINE)
+    
+    def close(self):
+        """刪除跨程序的取消標記檔"""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+    
+    def __getstate__(self):
+        # 傳給子程序時只帶期限、標記檔與已知的原因
+        return {'deadline': self.deadline, 'path': self.path, 'reason': self.reason}
+    
+    def __setstate__(self, state):
+        self.__init__(state['deadline'], state['path'])
+        if state['reason'] is not None:
+            self.reason = state['reason']
+            self._event.set()
+
+
+class DisconnectWatcher:
+    """背景檢查用戶端連線，斷線時觸發取消（以 with 使用）
+    
+    sock 為請求的連線（gunicorn 的 environ['gunicorn.socket']）；為 None
+    （例如開發伺服器）時不檢查。請求內容需已讀取完畢。期限由抽取器自行檢查。
+    
+    連線錯誤（ECONNRESET、EPIPE 等）一定觸發取消。讀取端的 EOF 也可能是用戶端
+    送完請求後只關閉寫入端（shutdown(SHUT_WR)，部分 HTTP/1.0 用戶端與代理如此），
+    仍在等待回應，因此只在 eof_cancels=True 時視為斷線。
+    """
+    
+    def __init__(self, sock: Optional[socket.socket], token: CancelToken, interval: float = 0.5,
+                 eof_cancels: bool = False):
+        self.sock = sock
+        self.token = token
+        self.interval = interval
+        self.eof_cancels = eof_cancels
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def __enter__(self) -> 'DisconnectWatcher':
+        if self.sock is not None:
+            self._thread = threading.Thread(target=self._watch, name='disconnect-watcher', daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return False
+    
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            if _disconnected(self.sock, self.eof_cancels):
+                self.token.cancel(CANCELLED)
+                return
+
+
+def _disconnected(sock: socket.socket, eof_cancels: bool = False) -> bool:
+    """連線是否已被對方重設（eof_cancels=True 時讀取端的 EOF 也算，不消耗已到達的資料）"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b'' and eof_cancels
+    except ConnectionError:
+        return True
+    except (OSError, ValueError):
+        return False
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串流 Excel 輸出 - 以 openpyxl 唯寫模式逐列寫入，不建立 DataFrame
+
+訂單明細一邊讀取訂單一邊寫出，材料統計與統計摘要只累加彙總值，
+記憶體用量與訂單數無關。單一工作表超過 Excel 列數上限時自動續寫到
+「訂單明細 (2)」等接續工作表。
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Union
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+from final.material_index import MaterialIndex
+
+# Excel 單一工作表的列數上限（含表頭）
+MAX_SHEET_ROWS = 1048576
+
+# 活頁簿 zip 項目與文件屬性的固定時間（zip 可表示的最早時間），
+# 讓相同資料一定產生相同的活頁簿；處理時間只寫在統計摘要中
+FIXED_TIMESTAMP = datetime(1980, 1, 1)
+
+# 改寫活頁簿時每次複製的位元組數
+COPY_BUFFER = 1024 * 1024
+
+# 訂單明細欄位順序，將分類材料放在前面
+BASE_COLUMNS = ["工單單號", "訂單單號", "客戶名稱", "上階品名", "上階規格",
+                "數量", "硬度", "硬度公差", "顏色", "上線日", "產品類別"]
+MATERIAL_COLUMNS = ["H系列代碼", "原料公斤數", "I系列代碼", "鐵材隻數", "其他材料"]
+EXTRA_COLUMNS = ["客戶備註", "NO", "品名", "總長"]
+ORDER_COLUMNS = BASE_COLUMNS + MATERIAL_COLUMNS + EXTRA_COLUMNS
+
+MATERIAL_STAT_COLUMNS = ["材料類別", "材料代碼", "總需求量", "使用次數"]
+
+# 與 pandas 輸出相同的表頭樣式
+_THIN = Side(style='thin')
+_HEADER_FONT = Font(bold=True)
+_HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+_CORE_TIMESTAMP_RE = re.compile(rb'(<dcterms:(created|modified)\b[^>]*>)[^<]*(</dcterms:\2>)')
+
+
+def normalize_workbook(excel_path: Union[str, BinaryIO]):
+    """固定活頁簿中的時間戳記，讓相同資料產生位元組完全相同的檔案
+
+    openpyxl 會以目前時間寫入 docProps/core.xml 的建立/修改時間，
+    zip 項目的修改時間也是寫入當下的時間；兩者都改為 FIXED_TIMESTAMP。
+    excel_path 可為檔案路徑或可讀寫、可 seek 的檔案物件。
+
+    zip 項目逐一以 COPY_BUFFER 大小的區塊複製到暫存檔再換回原處，
+    記憶體用量與活頁簿大小無關。
+    """
+    if isinstance(excel_path, str):
+        directory = os.path.dirname(os.path.abspath(excel_path))
+        fd, temp_path = tempfile.mkstemp(prefix='.normalize-', suffix='.xlsx', dir=directory)
+        try:
+            with os.fdopen(fd, 'w+b') as target:
+                _rewrite_workbook(excel_path, target)
+            shutil.copymode(excel_path, temp_path)
+            os.replace(temp_path, excel_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return
+    
+    with tempfile.TemporaryFile() as target:
+        excel_path.seek(0)
+        _rewrite_workbook(excel_path, target)
+        target.seek(0)
+        excel_path.seek(0)
+        excel_path.truncate()
+        shutil.copyfileobj(target, excel_path, COPY_BUFFER)
+
+
+def _rewrite_workbook(source_path: Union[str, BinaryIO], target: BinaryIO):
+    """逐一複製 zip 項目到 target，改寫時間戳記"""
+    date_time = FIXED_TIMESTAMP.timetuple()[:6]
+    w3cdtf = FIXED_TIMESTAMP.strftime('%Y-%m-%dT%H:%M:%SZ').encode()
+    
+    with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(target, 'w') as archive:
+        for info in source.infolist():
+            fixed = zipfile.ZipInfo(info.filename, date_time=date_time)
+            fixed.compress_type = info.compress_type
+            fixed.external_attr = info.external_attr
+            if info.filename == 'docProps/core.xml':
+                # 文件屬性只有幾百位元組，整個讀入改寫
+                data = _CORE_TIMESTAMP_RE.sub(lambda m: m.group(1) + w3cdtf + m.group(3),
+                                              source.read(info))
+                archive.writestr(fixed, data)
+                continue
+            # 預先填入大小，讓 zipfile 依原大小決定是否需要 ZIP64
+            fixed.file_size = info.file_size
+            with source.open(info) as src, archive.open(fixed, 'w') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER)
+
+
+def order_row(order: Dict[str, Any], material_columns: Dict[str, str]) -> Dict[str, Any]:
+    """將訂單轉為 Excel 列（material_columns 為材料索引產生的分類材料欄位）"""
+    row = order.copy()
+    row.update(material_columns)
+    
+    if "耗料" in row:
+        del row["耗料"]
+    
+    return row
+
+
+class _SheetStream:
+    """逐列寫入工作表，超過列數上限時續寫到接續工作表"""
+    
+    def __init__(self, workbook: Workbook, title: str, columns: List[str],
+                 max_rows: int = MAX_SHEET_ROWS):
+        self.workbook = workbook
+        self.title = title
+        self.columns = columns
+        self.max_rows = max_rows
+        self._part = 0
+        self._rows = 0
+        self._sheet = None
+    
+    def append(self, values: Iterable[Any]):
+        if self._sheet is None or self._rows >= self.max_rows:
+            self._new_sheet()
+        self._sheet.append(list(values))
+        self._rows += 1
+    
+    def finish(self):
+        """確保至少有一個（只含表頭的）工作表"""
+        if self._sheet is None:
+            self._new_sheet()
+    
+    def _new_sheet(self):
+        self._part += 1
+        title = self.title if self._part == 1 else f"{self.title} ({self._part})"
+        self._sheet = self.workbook.create_sheet(title)
+        header = []
+        for column in self.columns:
+            cell = WriteOnlyCell(self._sheet, value=column)
+            cell.font = _HEADER_FONT
+            cell.border = _HEADER_BORDER
+            cell.alignment = _HEADER_ALIGNMENT
+            header.append(cell)
+        self._sheet.append(header)
+        self._rows = 1
+
+
+class StreamingWorkbookWriter:
+    """串流寫入訂單明細、材料統計與統計摘要三個工作表
+    
+    用法:
+        writer = StreamingWorkbookWriter(excel_path)
+        for order in extractor.iter_orders():
+            writer.add_order(order)
+        writer.close(extractor.processed_at)
+    """
+    
+    def __init__(self, excel_path: Union[str, BinaryIO], max_rows: int = MAX_SHEET_ROWS):
+        self.excel_path = excel_path
+        self.workbook = Workbook(write_only=True)
+        self._orders = _SheetStream(self.workbook, '訂單明細', ORDER_COLUMNS, max_rows)
+        self._max_rows = max_rows
+        
+        # 彙總值（材料統計與統計摘要），不保留各訂單資料
+        self.index = MaterialIndex(track_orders=False)
+    
+    def add_order(self, order: Dict[str, Any]):
+        """寫入一筆訂單並累加統計"""
+        row = order_row(order, self.index.add_order(order))
+        self._orders.append(row.get(column) for column in ORDER_COLUMNS)
+    
+    def close(self, processed_at: Optional[datetime] = None):
+        """寫入統計工作表並存檔（processed_at 預設為目前時間）"""
+        processed_at = processed_at or datetime.now().replace(microsecond=0)
+        self._orders.finish()
+        
+        material_sheet = _SheetStream(self.workbook, '材料統計', MATERIAL_STAT_COLUMNS, self._max_rows)
+        for stat in self.index.material_statistics():
+            material_sheet.append(stat.values())
+        material_sheet.finish()
+        
+        stats = self.index.statistics(processed_at)
+        stats_sheet = _SheetStream(self.workbook, '統計摘要', list(stats))
+        stats_sheet.append(stats.values())
+        
+        self.workbook.save(self.excel_path)
+        normalize_workbook(self.excel_path)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+輕量輸出格式 - CSV、JSON Lines、Parquet
+
+以長格式材料表輸出：每項耗料一列，附上訂單欄位與材料類別；沒有耗料的
+訂單輸出一列、材料欄位留空。訂單逐筆寫出，不建立 DataFrame，也不經過
+Excel 活頁簿，適合載入資料庫的下游腳本使用。
+
+Parquet 需要選用套件 pyarrow，未安裝時 available_formats() 不包含 parquet。
+"""
+
+import csv
+import importlib.util
+import json
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from final.material_index import material_category
+
+# 訂單欄位（與 Excel 訂單明細的順序相同）與材料欄位
+ORDER_FIELDS = ["工單單號", "訂單單號", "客戶名稱", "上階品名", "上階規格",
+                "數量", "硬度", "硬度公差", "顏色", "上線日", "產品類別",
+                "客戶備註", "NO", "品名", "總長"]
+MATERIAL_FIELDS = ["材料序號", "材料類別", "材料代碼", "需求量", "已領量"]
+LONG_COLUMNS = ORDER_FIELDS + MATERIAL_FIELDS
+
+_NO_MATERIAL = (None,) * len(MATERIAL_FIELDS)
+
+
+def material_rows(order: Dict[str, Any]) -> List[Tuple]:
+    """單筆訂單的長格式列（每項耗料一列）"""
+    base = tuple(order.get(field) for field in ORDER_FIELDS)
+    materials = order.get("耗料") or ()
+    if not materials:
+        return [base + _NO_MATERIAL]
+    return [base + (number, material_category(material["代碼"]), material["代碼"],
+                    material["需求量"], material["已領量"])
+            for number, material in enumerate(materials, 1)]
+
+
+class TableWriter:
+    """長格式材料表的串流輸出：逐筆 add_order()，最後 close()"""
+    
+    name = ''
+    extension = ''
+    media_type = ''
+    
+    def __init__(self, output: BinaryIO):
+        self.output = output
+        self.rows = 0
+    
+    @classmethod
+    def available(cls) -> bool:
+        return True
+    
+    def add_order(self, order: Dict[str, Any]):
+        rows = material_rows(order)
+        self.rows += len(rows)
+        self._write_rows(rows)
+    
+    def _write_rows(self, rows: List[Tuple]):
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class CsvTableWriter(TableWriter):
+    """UTF-8 CSV（含表頭列）"""
+    
+    name = 'csv'
+    extension = 'csv'
+    media_type = 'text/csv'
+    
+    def __init__(self, output: BinaryIO):
+        super().__init__(output)
+        self._writer = csv.writer(self)
+        self._writer.writerow(LONG_COLUMNS)
+    
+    def write(self, text: str):
+        """csv.writer 的輸出目標：編碼後直接寫入二進位輸出"""
+        self.output.write(text.encode('utf-8'))
+    
+    def _write_rows(self, rows: List[Tuple]):
+        self._writer.writerows(rows)
+
+
+class JsonLinesTableWriter(TableWriter):
+    """JSON Lines：每列一個 JSON 物件"""
+    
+    name = 'jsonl'
+    extension = 'jsonl'
+    media_type = 'application/x-ndjson'
+    
+    def _write_rows(self, rows: List[Tuple]):
+        write = self.output.write
+        for row in rows:
+            write(json.dumps(dict(zip(LONG_COLUMNS, row)), ensure_ascii=False).encode('utf-8'))
+            write(b'\n')
+
+
+class ParquetTableWriter(TableWriter):
+    """Parquet（需要 pyarrow），每累積 row_group_rows 列寫出一個 row group"""
+    
+    name = 'parquet'
+    extension = 'parquet'
+    media_type = 'application/vnd.apache.parquet'
+    
+    _INT_FIELDS = {"數量", "硬度", "硬度公差", "總長", "材料序號"}
+    _FLOAT_FIELDS = {"需求量", "已領量"}
+    
+    def __init__(self, output: BinaryIO, row_group_rows: int = 65536):
+        super().__init__(output)
+        import pyarrow
+        import pyarrow.parquet
+        
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(name, self._field_type(pyarrow, name)) for name in LONG_COLUMNS])
+        self._writer = pyarrow.parquet.ParquetWriter(output, self._schema)
+        self._row_group_rows = row_group_rows
+        self._columns: List[list] = [[] for _ in LONG_COLUMNS]
+        self._buffered = 0
+    
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec('pyarrow') is not None
+    
+    @classmethod
+    def _field_type(cls, pyarrow, name: str):
+        if name in cls._INT_FIELDS:
+            return pyarrow.int64()
+        if name in cls._FLOAT_FIELDS:
+            return pyarrow.float64()
+        return pyarrow.string()
+    
+    def _write_rows(self, rows: List[Tuple]):
+        columns = self._columns
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+        self._buffered += len(rows)
+        if self._buffered >= self._row_group_rows:
+            self._flush()
+    
+    def _flush(self):
+        if not self._buffered:
+            return
+        arrays = [self._pyarrow.array(column, type=field.type)
+                  for column, field in zip(self._columns, self._schema)]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self._schema))
+        self._columns = [[] for _ in LONG_COLUMNS]
+        self._buffered = 0
+    
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+WRITERS: Dict[str, Type[TableWriter]] = {
+    CsvTableWriter.name: CsvTableWriter,
+    JsonLinesTableWriter.name: JsonLinesTableWriter,
+    ParquetTableWriter.name: ParquetTableWriter,
+}
+
+
+def available_formats() -> List[str]:
+    """目前環境可用的輸出格式"""
+    return [name for name, writer in WRITERS.items() if writer.available()]
+
+
+def get_writer(output_format: str) -> Type[TableWriter]:
+    """依格式名稱取得輸出類別"""
+    writer = WRITERS.get(output_format)
+    if writer is None:
+        raise ValueError(f"未知的輸出格式: {output_format}（可用: {', '.join(available_formats())}）")
+    if not writer.available():
+        raise ValueError(f"輸出格式 {output_format} 需要安裝 pyarrow")
+    return writer
+
+
+def write_orders(orders: Iterable[Dict[str, Any]], output: BinaryIO, output_format: str,
+                 on_order: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+    """將訂單逐筆寫成指定格式，回傳輸出的列數
+    
+    orders 可為 iter_orders() 產生器；on_order 會在每筆訂單寫出前呼叫。
+    """
+    writer = get_writer(output_format)(output)
+    for order in orders:
+        if on_order is not None:
+            on_order(order)
+        writer.add_order(order)
+    writer.close()
+    return writer.rows
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量批次處理 - 命令列的目錄/萬用字元模式
+
+以清單檔 (manifest) 記錄「PDF 內容 SHA-256 → 輸出檔」，之後執行時內容
+未變更且輸出檔仍存在的 PDF 直接略過。檔案大小與修改時間都沒變時沿用
+上次的雜湊值，不必重新讀取整個檔案。待處理的檔案分散到多個子程序。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from final.pdf_extractor import FinalPDFExtractor
+from final.store import OrderStore
+
+MANIFEST_VERSION = 1
+MANIFEST_SAVE_INTERVAL = 50  # 每完成幾個檔案寫回一次清單，中斷時不必全部重做
+
+
+class Manifest:
+    """內容雜湊 → 輸出檔的清單（JSON 檔）"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}  # SHA-256 -> 輸出檔與處理資訊
+        self.paths: Dict[str, Dict[str, Any]] = {}  # PDF 路徑 -> 大小、修改時間與 SHA-256
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+                self.paths = data.get('paths', {})
+    
+    def digest(self, path: str) -> str:
+        """PDF 內容的 SHA-256（大小與修改時間未變時沿用記錄）"""
+        stat = os.stat(path)
+        known = self.paths.get(path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+        
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        self.paths[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        return sha256
+    
+    def is_current(self, sha256: str, output_kinds: Optional[Iterable[str]] = None) -> bool:
+        """此內容已處理過且輸出檔都還在
+        
+        output_kinds 為需要的輸出種類（如 json、excel、csv），先前以其他格式
+        輸出的檔案視為需要重新處理；沒有訂單（無輸出檔）的檔案不受影響。
+        """
+        entry = self.files.get(sha256)
+        if not entry:
+            return False
+        outputs = entry['outputs']
+        if outputs and output_kinds is not None and not set(output_kinds) <= set(outputs):
+            return False
+        return all(os.path.exists(path) for path in outputs.values())
+    
+    def record(self, sha256: str, entry: Dict[str, Any]):
+        self.files[sha256] = entry
+    
+    def save(self):
+        """原子寫回清單檔"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'files': self.files, 'paths': self.paths},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """展開目錄（遞迴）與萬用字元為 PDF 絕對路徑，去除重複並保留順序"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = []
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith('.pdf'))
+        elif glob.has_magic(pattern):
+            found = sorted(path for path in glob.glob(pattern, recursive=True)
+                           if os.path.isfile(path) and path.lower().endswith('.pdf'))
+        else:
+            found = [pattern] if os.path.isfile(pattern) else []
+            if not found:
+                print(f"⚠️  找不到: {pattern}")
+        paths.extend(os.path.abspath(path) for path in found)
+    return list(dict.fromkeys(paths))
+
+
+def run_incremental(patterns: Iterable[str], output_dir: str = "output",
+                    manifest_path: Optional[str] = None, workers: Optional[int] = None,
+                    force: bool = False, backend: Optional[str] = None,
+                    order_log_sample: int = 0, output_format: Optional[str] = None,
+                    store_path: Optional[str] = None) -> Dict[str, Any]:
+    """處理所有輸入的PDF，略過未變更的檔案，回傳執行統計
+
+    backend 為文字抽取後端名稱（None 為預設後端）。抽取器以安靜模式執行，
+    每個檔案只記錄一筆摘要事件；order_log_sample=N 時另外每 N 筆訂單記錄一筆。
+    output_format 為 csv/jsonl/parquet 時輸出長格式材料表，取代 JSON 與 Excel。
+    store_path 為訂單資料庫路徑時一併寫入訂單（以PDF修改時間為報表版本時間），
+    尚未匯入資料庫的PDF即使輸出檔都在也會重新處理。
+    """
+    started = time.perf_counter()
+    manifest = Manifest(manifest_path or os.path.join(output_dir, 'manifest.json'))
+    store = OrderStore(store_path) if store_path else None
+    output_kinds = (output_format,) if output_format else ('json', 'excel')
+    
+    pending = []
+    queued = set()
+    unchanged = duplicates = 0
+    for path in expand_inputs(patterns):
+        sha256 = manifest.digest(path)
+        if sha256 in queued:
+            duplicates += 1  # 同一內容（例如複製到多個目錄）只處理一次
+        elif (not force and manifest.is_current(sha256, output_kinds)
+              and (store is None or store.has_source(sha256))):
+            unchanged += 1
+        else:
+            queued.add(sha256)
+            pending.append((path, sha256))
+    
+    skipped = unchanged + duplicates
+    print(f"📂 共 {len(pending) + skipped} 個PDF，{unchanged} 個未變更、{duplicates} 個內容重複略過，"
+          f"{len(pending)} 個待處理")
+    
+    report = {'files': 0, 'skipped': skipped, 'failed': 0, 'pages': 0, 'orders': 0}
+    
+    def finish(path, sha256, result):
+        if isinstance(result, Exception):
+            report['failed'] += 1
+            print(f"❌ {path}: {result}")
+            return
+        report['files'] += 1
+        report['pages'] += result['pages']
+        report['orders'] += result['orders']
+        manifest.record(sha256, dict(result, source=path))
+        if report['files'] % MANIFEST_SAVE_INTERVAL == 0:
+            manifest.save()
+    
+    workers = min(workers or os.cpu_count() or 1, max(len(pending), 1))
+    if workers == 1:
+        for path, sha256 in pending:
+            try:
+                result = _process_file(path, sha256, output_dir, backend, order_log_sample,
+                                       output_format, store_path)
+            except Exception as e:
+                result = e
+            finish(path, sha256, result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_process_file, path, sha256, output_dir, backend,
+                                   order_log_sample, output_format, store_path): (path, sha256)
+                       for path, sha256 in pending}
+            for future in as_completed(futures):
+                path, sha256 = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                finish(path, sha256, result)
+    
+    manifest.save()
+    
+    report['seconds'] = time.perf_counter() - started
+    _print_report(report)
+    return report
+
+
+def _process_file(path: str, sha256: str, output_dir: str,
+                  backend: Optional[str] = None, order_log_sample: int = 0,
+                  output_format: Optional[str] = None, store_path: Optional[str] = None) -> Dict[str, Any]:
+    """子程序工作：抽取單一PDF並儲存 JSON/Excel（及寫入訂單資料庫）"""
+    extractor = FinalPDFExtractor(path, backend=backend, quiet=True, order_log_sample=order_log_sample)
+    orders = extractor.extract_orders()
+    # 檔名加上雜湊值，不同目錄下的同名檔案不會互相覆蓋
+    base_name = f"{os.path.splitext(os.path.basename(path))[0]}_{sha256[:8]}"
+    if not orders:
+        outputs = {}
+    elif output_format:
+        outputs = extractor.save_table(output_dir, output_format, base_name=base_name)
+    else:
+        outputs = extractor.save_results(output_dir, base_name=base_name)
+    if store_path:
+        OrderStore(store_path).upsert_orders(orders, source=path, sha256=sha256,
+                                             revised_at=datetime.fromtimestamp(os.path.getmtime(path)))
+    return {
+        'outputs': outputs,
+        'orders': len(orders),
+        'pages': extractor.page_count,
+        'processed_at': extractor.processed_at.isoformat()
+    }
+
+
+def _print_report(report: Dict[str, Any]):
+    seconds = max(report['seconds'], 1e-9)
+    print(f"\n{'='*60}")
+    print(f"📈 批次處理報告")
+    print(f"{'='*60}")
+    print(f"📄 已處理: {report['files']} 個檔案（略過 {report['skipped']}、失敗 {report['failed']}）")
+    print(f"📑 頁數: {report['pages']}，訂單: {report['orders']}")
+    print(f"⏱️  耗時: {seconds:.2f} 秒")
+    print(f"🚀 吞吐量: {report['files'] / seconds:.2f} 檔/秒，{report['pages'] / seconds:.2f} 頁/秒")
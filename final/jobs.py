@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非同步轉換工作 - 上傳後立即回傳工作編號，背景執行緒進行抽取
+
+工作狀態寫在磁碟上的 status.json（原子替換），因此同一目錄下的任何
+gunicorn worker 都能回應狀態查詢與下載，不限於接收上傳的那一個。
+頁數進度由 JobProgress 直接寫入狀態檔，轉換在子程序中進行時也能回報。
+
+指定共用轉換程序池（pool）時，提交工作前先預留名額：程序池與等待佇列
+都已滿時 submit() 拋出 PoolSaturated（不建立工作），名額保留到轉換結束。
+
+目錄結構:
+    <directory>/<job_id>/input.pdf      上傳的PDF
+    <directory>/<job_id>/status.json    狀態與頁數進度
+    <directory>/<job_id>/result.xlsx    完成後的Excel檔
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+# 工作狀態
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# convert(pdf_path, excel_path, progress, lease) -> 是否產生Excel
+# （lease 為預留的程序池名額，未指定程序池時為 None）
+Converter = Callable[[str, str, 'JobProgress', Any], bool]
+
+
+class JobProgress:
+    """將頁數進度寫入工作的狀態檔（可序列化，可交給轉換子程序呼叫）"""
+    
+    def __init__(self, job_dir: str):
+        self.job_dir = job_dir
+    
+    def __call__(self, pages_done: int, pages_total: int):
+        status = _read_status(self.job_dir)
+        if status is None:
+            return
+        status.update(pages_done=pages_done, pages_total=pages_total)
+        _write_status(self.job_dir, status)
+
+
+class JobManager:
+    """背景轉換工作管理"""
+    
+    def __init__(self, directory: str, convert: Converter, max_workers: int = 2,
+                 ttl: float = 3600, pool=None):
+        self.directory = directory
+        self.convert = convert
+        self.ttl = ttl
+        self.pool = pool  # final.pool.ConversionPool，None 不預留名額
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-job')
+        os.makedirs(directory, exist_ok=True)
+    
+    def submit(self, stream: BinaryIO, filename: str) -> str:
+        """保存上傳內容並排入背景執行，回傳工作編號（程序池已滿時拋出 PoolSaturated）"""
+        lease = self._reserve()
+        try:
+            job_id = self._create()
+            with open(self._path(job_id, 'input.pdf'), 'wb') as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            raise
+        return self._enqueue(job_id, filename, lease)
+    
+    def submit_file(self, path: str, filename: str) -> str:
+        """將已在磁碟上的PDF（例如分段上傳完成的檔案）移入工作目錄並排入背景執行，
+        回傳工作編號（同一檔案系統時只是改名，不複製內容）
+        
+        程序池已滿時拋出 PoolSaturated，檔案留在原處。
+        """
+        lease = self._reserve()
+        try:
+            job_id = self._create()
+            shutil.move(path, self._path(job_id, 'input.pdf'))
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            raise
+        return self._enqueue(job_id, filename, lease)
+    
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """讀取工作狀態，不存在回傳 None"""
+        if not _JOB_ID_RE.match(job_id):
+            return None
+        return _read_status(os.path.join(self.directory, job_id))
+    
+    def result_path(self, job_id: str) -> Optional[str]:
+        """已完成工作的Excel檔路徑，尚未完成回傳 None"""
+        status = self.status(job_id)
+        if not status or status['status'] != DONE:
+            return None
+        return self._path(job_id, 'result.xlsx')
+    
+    def cleanup(self):
+        """刪除超過保存時間的工作目錄"""
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not _JOB_ID_RE.match(entry.name):
+                    continue
+                try:
+                    expired = now - entry.stat().st_mtime > self.ttl
+                except FileNotFoundError:
+                    continue
+                if expired:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+    
+    def _run(self, job_id: str, lease=None):
+        """背景執行轉換並持續更新狀態（結束時釋放預留的名額）"""
+        try:
+            self._execute(job_id, lease)
+        finally:
+            if lease is not None:
+                lease.release()
+    
+    def _execute(self, job_id: str, lease=None):
+        status = self.status(job_id)
+        if status is None:
+            return
+        
+        status['status'] = RUNNING
+        self._write_status(job_id, status)
+        try:
+            produced = self.convert(self._path(job_id, 'input.pdf'), self._path(job_id, 'result.xlsx'),
+                                    JobProgress(os.path.join(self.directory, job_id)), lease)
+            # 轉換期間進度已寫入狀態檔
+            status = self.status(job_id) or status
+            if produced:
+                status['status'] = DONE
+            else:
+                status.update(status=FAILED, error='未能從PDF中抽取到訂單資料，請檢查PDF格式')
+        except Exception as e:
+            status = self.status(job_id) or status
+            status.update(status=FAILED, error=f'處理失敗: {str(e)}')
+        finally:
+            try:
+                os.unlink(self._path(job_id, 'input.pdf'))
+            except OSError:
+                pass
+        status['finished_at'] = time.time()
+        self._write_status(job_id, status)
+    
+    def _reserve(self):
+        return self.pool.reserve() if self.pool is not None else None
+    
+    def _create(self) -> str:
+        self.cleanup()
+        
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.directory, job_id))
+        return job_id
+    
+    def _enqueue(self, job_id: str, filename: str, lease=None) -> str:
+        self._write_status(job_id, {
+            'job_id': job_id,
+            'filename': filename,
+            'status': QUEUED,
+            'pages_done': 0,
+            'pages_total': None,
+            'error': None,
+            'created_at': time.time()
+        })
+        self._executor.submit(self._run, job_id, lease)
+        return job_id
+    
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self.directory, job_id, name)
+    
+    def _write_status(self, job_id: str, status: Dict[str, Any]):
+        _write_status(os.path.join(self.directory, job_id), status)
+
+
+def _read_status(job_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(job_dir, 'status.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_status(job_dir: str, status: Dict[str, Any]):
+    fd, temp_path = tempfile.mkstemp(dir=job_dir, prefix='.status-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False)
+    os.replace(temp_path, os.path.join(job_dir, 'status.json'))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日誌設定 - 抽取器以 logging 輸出事件（取代逐筆 print）
+
+事件的結構化欄位以 extra=log_event(...) 附加在 LogRecord 上
+（record.event 與 record.fields），JsonFormatter 會輸出為每行一筆 JSON，
+方便集中收集；一般格式則只顯示訊息文字。
+"""
+
+import json
+import logging
+from typing import Any, Dict, Optional, Union
+
+
+def log_event(event: str, **fields) -> Dict[str, Any]:
+    """logging 呼叫的 extra 參數：事件名稱與欄位"""
+    return {'event': event, 'fields': fields}
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆日誌輸出為一行 JSON（事件欄位展開在最上層）"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        event = getattr(record, 'event', None)
+        if event:
+            data['event'] = event
+            data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: Union[str, int] = logging.INFO, json_format: bool = False,
+                      fmt: Optional[str] = None):
+    """設定根 logger（已設定過 handler 時不會覆蓋）"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(fmt or logging.BASIC_FORMAT))
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level, handlers=[handler])
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+材料索引 - 單次掃描所有訂單，建立材料分類、總需求量、使用次數與各訂單的
+分類材料欄位，供統計摘要、材料統計、列印摘要與 Excel 輸出共用
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+# 材料類別（依代碼開頭分類）
+H_SERIES = 'H系列'
+I_SERIES = 'I系列'
+OTHER = '其他'
+CATEGORIES = (H_SERIES, I_SERIES, OTHER)
+
+
+def material_category(code: str) -> str:
+    """依材料代碼判斷類別"""
+    if code.startswith('H'):
+        return H_SERIES
+    if code.startswith('I'):
+        return I_SERIES
+    return OTHER
+
+
+class MaterialEntry:
+    """單一材料代碼的彙總"""
+    
+    __slots__ = ('code', 'category', 'total_demand', 'usage_count', 'orders')
+    
+    def __init__(self, code: str, category: str):
+        self.code = code
+        self.category = category
+        self.total_demand = 0
+        self.usage_count = 0
+        self.orders: List[int] = []  # 使用此材料的訂單索引（依出現順序，可重複）
+
+
+class MaterialIndex:
+    """訂單材料索引
+    
+    track_orders=True 時保留各訂單的分類材料欄位與各材料的訂單索引；
+    串流輸出只需要彙總值時可設為 False，記憶體用量只與材料種類數有關。
+    """
+    
+    def __init__(self, track_orders: bool = True):
+        self.track_orders = track_orders
+        self.order_count = 0
+        self.material_count = 0
+        self.total_demand = 0
+        self.customer_counts: Dict[Any, int] = {}  # 客戶名稱 -> 訂單數
+        self.products = set()
+        self.materials: Dict[str, MaterialEntry] = {}  # 依首次出現順序
+        self.order_columns: List[Dict[str, str]] = []  # 各訂單的分類材料欄位
+    
+    @classmethod
+    def build(cls, orders: Iterable[Dict[str, Any]], track_orders: bool = True) -> 'MaterialIndex':
+        """單次掃描建立索引"""
+        index = cls(track_orders=track_orders)
+        for order in orders:
+            index.add_order(order)
+        return index
+    
+    def add_order(self, order: Dict[str, Any]) -> Dict[str, str]:
+        """加入一筆訂單，回傳其分類材料欄位（H系列代碼、原料公斤數等）"""
+        order_index = self.order_count
+        self.order_count += 1
+        
+        customer = order.get("客戶名稱", "未知")
+        self.customer_counts[customer] = self.customer_counts.get(customer, 0) + 1
+        if order.get("上階品名"):
+            self.products.add(order["上階品名"])
+        
+        h_codes = []      # H系列代碼
+        h_quantities = [] # H系列原料公斤數
+        i_codes = []      # I系列代碼
+        i_quantities = [] # I系列鐵材隻數
+        other_materials = []  # 其他材料
+        
+        for material in order.get("耗料", []):
+            code = material.get("代碼", "")
+            qty = material.get("需求量", 0)
+            self.material_count += 1
+            self.total_demand += qty
+            
+            entry = self.materials.get(code)
+            if entry is None:
+                entry = self.materials[code] = MaterialEntry(code, material_category(code))
+            entry.total_demand += qty
+            entry.usage_count += 1
+            if self.track_orders:
+                entry.orders.append(order_index)
+            
+            if entry.category == H_SERIES:
+                h_codes.append(code)
+                h_quantities.append(str(qty))  # 純數字，方便運算
+            elif entry.category == I_SERIES:
+                i_codes.append(code)
+                i_quantities.append(str(qty))  # 純數字，方便運算
+            else:
+                other_materials.append(f"{code}({qty})")
+        
+        columns = {
+            "H系列代碼": "; ".join(h_codes),
+            "原料公斤數": "; ".join(h_quantities),
+            "I系列代碼": "; ".join(i_codes),
+            "鐵材隻數": "; ".join(i_quantities),
+            "其他材料": "; ".join(other_materials)
+        }
+        if self.track_orders:
+            self.order_columns.append(columns)
+        return columns
+    
+    def merge(self, other: 'MaterialIndex') -> 'MaterialIndex':
+        """併入另一份索引的彙總值（other 的訂單接在本索引之後），回傳 self
+        
+        各檔案分別建立的索引可直接合併，不必重新掃描合併後的訂單；
+        材料仍依首次出現順序排列。
+        """
+        offset = self.order_count
+        self.order_count += other.order_count
+        self.material_count += other.material_count
+        self.total_demand += other.total_demand
+        for customer, count in other.customer_counts.items():
+            self.customer_counts[customer] = self.customer_counts.get(customer, 0) + count
+        self.products.update(other.products)
+        
+        for code, other_entry in other.materials.items():
+            entry = self.materials.get(code)
+            if entry is None:
+                entry = self.materials[code] = MaterialEntry(code, other_entry.category)
+            entry.total_demand += other_entry.total_demand
+            entry.usage_count += other_entry.usage_count
+            if self.track_orders:
+                entry.orders.extend(order_index + offset for order_index in other_entry.orders)
+        
+        if self.track_orders:
+            self.order_columns.extend(other.order_columns)
+        return self
+    
+    @property
+    def customer_total(self) -> int:
+        """不同客戶數（不含空白客戶名稱）"""
+        return sum(1 for customer in self.customer_counts if customer)
+    
+    def statistics(self, processed_at: datetime) -> Dict[str, Any]:
+        """統計摘要"""
+        return {
+            "總訂單數": self.order_count,
+            "客戶數量": self.customer_total,
+            "產品類型數": len(self.products),
+            "總材料項目": self.material_count,
+            "總需求量": self.total_demand,
+            "處理時間": processed_at.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def material_statistics(self) -> List[Dict[str, Any]]:
+        """材料統計（依類別分組，各組內依總需求量由大到小）"""
+        stats = []
+        for category in CATEGORIES:
+            entries = [entry for entry in self.materials.values() if entry.category == category]
+            for entry in sorted(entries, key=lambda e: e.total_demand, reverse=True):
+                stats.append({
+                    "材料類別": category,
+                    "材料代碼": entry.code,
+                    "總需求量": entry.total_demand,
+                    "使用次數": entry.usage_count
+                })
+        return stats
+    
+    def top_customers(self, limit: int = 5) -> List[tuple]:
+        """訂單數最多的客戶 [(客戶名稱, 訂單數)]"""
+        return sorted(self.customer_counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+    
+    def top_materials(self, limit: int = 5) -> List[tuple]:
+        """總需求量最大的材料 [(代碼, 總需求量)]"""
+        totals = [(entry.code, entry.total_demand) for entry in self.materials.values() if entry.code]
+        return sorted(totals, key=lambda x: x[1], reverse=True)[:limit]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扁平材料表 - 以 NumPy/pandas 欄位計算訂單明細的分類材料欄位、材料統計與統計摘要
+
+所有訂單的耗料攤平成一張表（每項耗料一列）：訂單索引、材料代碼、類別、
+需求量、已領量。材料代碼先依首次出現順序編號（即分組鍵），類別只對不重複
+的代碼做向量化字串比對；材料統計為依代碼編號的一次分組彙總，各訂單的
+H系列代碼、原料公斤數等欄位則依（訂單, 類別）排序後以 np.add.reduceat
+分段串接。輸出與 MaterialIndex 逐筆累加的結果完全相同：
+
+- 各材料的總需求量以 np.bincount 依出現順序逐項相加，總需求量以 np.cumsum
+  累加，浮點數結果與逐筆相加一致（pandas groupby sum 採補償求和、
+  ndarray.sum 採兩兩求和，末位可能不同）
+- 數量字串以 astype(str) 轉換，與 str(float) 相同
+- 同類別內依總需求量由大到小排列，相同時維持首次出現順序
+"""
+
+from datetime import datetime
+from itertools import chain
+from typing import Any, Dict, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from final.material_index import CATEGORIES, H_SERIES, I_SERIES, OTHER
+
+_CATEGORY_NAMES = np.array(CATEGORIES, dtype=object)
+_H, _I, _OTHER = (CATEGORIES.index(category) for category in (H_SERIES, I_SERIES, OTHER))
+
+
+class MaterialTable:
+    """扁平材料表（每項耗料一列，依訂單順序、訂單內依耗料順序排列）"""
+    
+    def __init__(self, order_count: int, order_index: np.ndarray, code_index: np.ndarray,
+                 codes: np.ndarray, need: np.ndarray, received: np.ndarray):
+        self.order_count = order_count
+        self.order_index = order_index  # 各列所屬的訂單索引
+        self.code_index = code_index    # 各列的材料代碼編號（codes 的索引）
+        self.codes = codes              # 不重複的材料代碼（依首次出現順序）
+        self.need = need                # 需求量
+        self.received = received        # 已領量
+        self.code_category = _categorize(codes)       # 各代碼的類別編號
+        self.category = self.code_category[code_index]  # 各列的類別編號
+    
+    @classmethod
+    def build(cls, orders: Sequence[Mapping[str, Any]]) -> 'MaterialTable':
+        """攤平所有訂單的耗料（唯一的逐項 Python 迴圈只負責取出欄位值）"""
+        counts = [len(order.get("耗料", ())) for order in orders]
+        materials = list(chain.from_iterable(order.get("耗料", ()) for order in orders))
+        size = len(materials)
+        
+        code_index, codes = pd.factorize(
+            np.array([material.get("代碼", "") for material in materials], dtype=object), sort=False)
+        need = np.fromiter((material.get("需求量", 0) for material in materials), dtype=np.float64, count=size)
+        received = np.fromiter((material.get("已領量", 0) for material in materials), dtype=np.float64, count=size)
+        order_index = np.repeat(np.arange(len(orders)), counts)
+        return cls(len(orders), order_index, code_index, np.asarray(codes, dtype=object), need, received)
+    
+    def __len__(self) -> int:
+        return len(self.need)
+    
+    @property
+    def total_demand(self) -> float:
+        """總需求量（依出現順序逐項累加；沒有耗料時為 0）"""
+        return float(np.cumsum(self.need)[-1]) if len(self) else 0
+    
+    def order_columns(self) -> Dict[str, np.ndarray]:
+        """各訂單的分類材料欄位（H系列代碼、原料公斤數、I系列代碼、鐵材隻數、其他材料）"""
+        columns = {name: np.full(self.order_count, '', dtype=object)
+                   for name in ("H系列代碼", "原料公斤數", "I系列代碼", "鐵材隻數", "其他材料")}
+        if not len(self):
+            return columns
+        
+        # H/I 系列列出代碼與數量兩欄，其他材料為「代碼(數量)」一欄
+        quantities = self.need.astype(str).astype(object)
+        labels = self.codes[self.code_index]
+        other = self.category == _OTHER
+        labels[other] = labels[other] + '(' + quantities[other] + ')'
+        
+        # 依（訂單, 類別）穩定排序，同組各列前加上分隔字串後分段串接
+        keys = self.order_index * len(CATEGORIES) + self.category
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        separators = np.full(len(keys), '; ', dtype=object)
+        separators[starts] = ''
+        labels = np.add.reduceat(separators + labels[order], starts)
+        quantities = np.add.reduceat(separators + quantities[order], starts)
+        orders, categories = np.divmod(keys[starts], len(CATEGORIES))
+        
+        for category, code_column, quantity_column in ((_H, "H系列代碼", "原料公斤數"),
+                                                       (_I, "I系列代碼", "鐵材隻數"),
+                                                       (_OTHER, "其他材料", None)):
+            selected = categories == category
+            columns[code_column][orders[selected]] = labels[selected]
+            if quantity_column is not None:
+                columns[quantity_column][orders[selected]] = quantities[selected]
+        return columns
+    
+    def material_statistics(self) -> pd.DataFrame:
+        """材料統計（依類別分組，各組內依總需求量由大到小）"""
+        if not len(self):
+            return pd.DataFrame()
+        
+        code_count = len(self.codes)
+        total_demand = np.bincount(self.code_index, weights=self.need, minlength=code_count)
+        usage_count = np.bincount(self.code_index, minlength=code_count)
+        order = np.lexsort((np.arange(code_count), -total_demand, self.code_category))
+        return pd.DataFrame({
+            "材料類別": _CATEGORY_NAMES[self.code_category[order]],
+            "材料代碼": self.codes[order],
+            "總需求量": total_demand[order],
+            "使用次數": usage_count[order]
+        })
+    
+    def statistics(self, order_frame: pd.DataFrame, processed_at: datetime) -> Dict[str, Any]:
+        """統計摘要（客戶與產品數取自訂單明細的 DataFrame）"""
+        customers = order_frame["客戶名稱"].dropna().unique() if self.order_count else ()
+        products = order_frame["上階品名"].dropna().unique() if self.order_count else ()
+        return {
+            "總訂單數": self.order_count,
+            "客戶數量": sum(1 for customer in customers if customer),
+            "產品類型數": sum(1 for product in products if product),
+            "總材料項目": len(self),
+            "總需求量": self.total_demand,
+            "處理時間": processed_at.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+
+def _categorize(codes: np.ndarray) -> np.ndarray:
+    """依代碼開頭判斷類別編號（與 material_category 相同）"""
+    prefix = pd.Series(codes, dtype=object).str[:1].to_numpy()
+    return np.select([prefix == 'H', prefix == 'I'], [_H, _I], _OTHER)
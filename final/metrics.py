@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+效能指標 - 各轉換階段的耗時、頁數、訂單/材料數與輸入輸出位元組
+
+以 Prometheus 文字格式輸出（/metrics），單次轉換的各階段耗時另外可轉成
+Server-Timing 標頭。不依賴 prometheus_client；指標存在程序記憶體中，
+多個 gunicorn worker 各自計數。
+
+預設停用：停用時 timings() 回傳不做任何事的空物件，熱路徑上只多一次
+方法呼叫。
+"""
+
+import contextvars
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+# 階段耗時的分桶（秒）
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 每份文件頁數的分桶
+PAGE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_enabled = False
+_current: contextvars.ContextVar = contextvars.ContextVar('conversion_timings', default=None)
+
+
+class Counter:
+    """只增不減的計數器（可帶標籤）"""
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + '_total', dict(zip(self.labelnames, key)), value
+
+
+class Gauge:
+    """可增可減的數值（例如佇列深度）"""
+    
+    kind = 'gauge'
+    
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+    
+    def set(self, value: float):
+        self.value = value
+    
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        yield self.name, {}, self.value
+
+
+class Histogram:
+    """累積分桶的直方圖（可帶標籤）"""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...],
+                 labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], List] = {}  # 標籤 -> [各分桶計數, 總和, 次數]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+    
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative
+            yield self.name + '_bucket', dict(labels, le='+Inf'), count
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+class Registry:
+    """指標集合"""
+    
+    def __init__(self):
+        self.metrics: List = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Prometheus 文字格式 (text/plain; version=0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'pdf_conversion_stage_seconds', '各轉換階段的耗時（秒）', STAGE_BUCKETS, ('stage',)))
+CONVERSION_SECONDS = REGISTRY.register(Histogram(
+    'pdf_conversion_seconds', '整次轉換的耗時（秒）', STAGE_BUCKETS))
+DOCUMENT_PAGES = REGISTRY.register(Histogram(
+    'pdf_document_pages', '每份PDF的頁數', PAGE_BUCKETS))
+CONVERSIONS = REGISTRY.register(Counter(
+    'pdf_conversions', '轉換請求數', ('status',)))
+PAGES = REGISTRY.register(Counter('pdf_pages', '已處理的頁數'))
+ORDERS = REGISTRY.register(Counter('pdf_orders', '已抽取的訂單數'))
+MATERIALS = REGISTRY.register(Counter('pdf_materials', '已抽取的材料項數'))
+BYTES_IN = REGISTRY.register(Counter('pdf_bytes_in', '上傳的PDF位元組數'))
+BYTES_OUT = REGISTRY.register(Counter('pdf_bytes_out', '回傳的檔案位元組數'))
+POOL_WORKERS = REGISTRY.register(Gauge('pdf_pool_workers', '轉換程序池的子程序數'))
+POOL_BUSY = REGISTRY.register(Gauge('pdf_pool_busy_workers', '正在轉換的子程序數'))
+POOL_QUEUED = REGISTRY.register(Gauge('pdf_pool_queue_depth', '等待子程序的轉換數'))
+POOL_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'pdf_pool_wait_seconds', '轉換在佇列中等待子程序的時間（秒）', STAGE_BUCKETS))
+POOL_REJECTED = REGISTRY.register(Counter('pdf_pool_rejected', '佇列已滿而拒絕（429）的轉換數'))
+
+
+class _Stage:
+    """計時區段（以 with 使用），結束時累加到 Timings"""
+    
+    __slots__ = ('timings', 'name', 'started')
+    
+    def __init__(self, timings: 'Timings', name: str):
+        self.timings = timings
+        self.name = name
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.timings.add(self.name, time.perf_counter() - self.started)
+
+
+class Timings:
+    """一次轉換中各階段的累計耗時（同一階段可多次進出，例如逐頁抽取）"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = {}
+    
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+    
+    def add(self, name: str, seconds: float):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+    
+    def server_timing(self) -> str:
+        """Server-Timing 標頭值（毫秒）"""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.seconds.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ', '.join(entries)
+
+
+class _NullStage:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+class _NullTimings:
+    """停用時的空物件"""
+    
+    seconds: Dict[str, float] = {}
+    
+    def stage(self, name: str) -> _NullStage:
+        return _NULL_STAGE
+    
+    def add(self, name: str, seconds: float):
+        pass
+    
+    def __bool__(self):
+        return False
+    
+    def server_timing(self) -> str:
+        return ''
+
+
+_NULL_STAGE = _NullStage()
+NULL_TIMINGS = _NullTimings()
+
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def start_conversion() -> 'Timings':
+    """開始一次轉換（例如一個請求），之後同一執行緒/情境內的 timings() 都記到這裡"""
+    if not _enabled:
+        return NULL_TIMINGS
+    timings = Timings()
+    _current.set(timings)
+    return timings
+
+
+def timings() -> 'Timings':
+    """目前轉換的計時物件；沒有進行中的轉換或停用時回傳空物件"""
+    if not _enabled:
+        return NULL_TIMINGS
+    return _current.get() or NULL_TIMINGS
+
+
+def record_document(pages: int, orders: int, materials: int):
+    """記錄一份PDF的頁數、訂單與材料數"""
+    if not _enabled:
+        return
+    PAGES.inc(pages)
+    ORDERS.inc(orders)
+    MATERIALS.inc(materials)
+    DOCUMENT_PAGES.observe(pages)
+
+
+def pool_state(workers: int, busy: int, queued: int):
+    """更新轉換程序池的子程序數、忙碌數與佇列深度"""
+    if not _enabled:
+        return
+    POOL_WORKERS.set(workers)
+    POOL_BUSY.set(busy)
+    POOL_QUEUED.set(queued)
+
+
+def pool_wait(seconds: float):
+    """記錄一次轉換在佇列中等待的時間"""
+    if _enabled:
+        POOL_WAIT_SECONDS.observe(seconds)
+
+
+def pool_rejected():
+    if _enabled:
+        POOL_REJECTED.inc()
+
+
+def finish_conversion(conversion_timings: 'Timings', status: str,
+                      bytes_in: int = 0, bytes_out: int = 0):
+    """結束一次轉換：各階段耗時寫入直方圖並累加位元組數"""
+    if not _enabled:
+        return
+    for name, seconds in conversion_timings.seconds.items():
+        STAGE_SECONDS.observe(seconds, stage=name)
+    CONVERSION_SECONDS.observe(time.perf_counter() - conversion_timings.started)
+    CONVERSIONS.inc(status=status)
+    BYTES_IN.inc(bytes_in)
+    BYTES_OUT.inc(bytes_out)
+    if _current.get() is conversion_timings:
+        _current.set(None)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
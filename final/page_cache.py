@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+頁面快取 - 以頁面內容的指紋為鍵，保存該頁抽取出的文字行
+
+ERP 一天會重新產出同一份工單報表好幾次，通常只有最後幾頁有變動。
+指紋由頁面的內容串流、解析後的資源（字型、XObject 等）與頁面尺寸/旋轉
+計算而得，與物件編號無關，因此重新產出的文件中沒有變動的頁面也能命中，
+只有真正不同的頁面需要重新抽取。
+
+快取限制最多保存的頁數，超過時淘汰最久未使用的頁面 (LRU)，並記錄
+命中/未命中/淘汰次數。可由多個執行緒共用。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from pdfminer.pdftypes import PDFObjRef, PDFStream
+from pdfminer.psparser import PSLiteral
+
+# 影響文字抽取結果的頁面屬性（Contents 與 Resources 另外展開）
+_PAGE_KEYS = ('MediaBox', 'CropBox', 'Rotate')
+
+
+class PageCache:
+    """頁面文字行的 LRU 快取"""
+    
+    def __init__(self, max_pages: int = 2000):
+        self.max_pages = max_pages
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Hashable, Tuple[str, ...]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            lines = self._entries.get(key)
+            if lines is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return lines
+    
+    def put(self, key: Hashable, lines):
+        if self.max_pages <= 0:
+            return
+        with self._lock:
+            self._entries[key] = tuple(lines)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_pages:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pages': len(self._entries),
+                'max_pages': self.max_pages,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def page_fingerprint(page, memo: Optional[Dict[int, bytes]] = None) -> str:
+    """pdfminer PDFPage 內容與資源的 SHA-256
+    
+    memo 為同一份文件內共用的「物件編號 → 摘要」表，字型等跨頁共用的
+    資源只需計算一次。
+    """
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256()
+    for key in _PAGE_KEYS:
+        digest.update(_object_digest(page.attrs.get(key), memo, set())[0])
+    digest.update(_object_digest(page.attrs.get('Resources'), memo, set())[0])
+    digest.update(_object_digest(page.attrs.get('Contents'), memo, set())[0])
+    return digest.hexdigest()
+
+
+def _object_digest(obj, memo: Dict[int, bytes], visiting: set) -> Tuple[bytes, bool]:
+    """PDF 物件（遞迴解析參照）的摘要，與物件編號無關；另回傳是否遇到循環參照
+    
+    遇到循環參照的摘要取決於從哪個物件走進循環，不寫入 memo（每頁各自重新計算），
+    memo 中只有與走訪順序無關的摘要。
+    """
+    if isinstance(obj, PDFObjRef):
+        objid = obj.objid
+        if objid in memo:
+            return memo[objid], False
+        if objid in visiting:  # 循環參照
+            return b'cycle', True
+        visiting.add(objid)
+        value, cyclic = _object_digest(obj.resolve(), memo, visiting)
+        visiting.discard(objid)
+        if not cyclic:
+            memo[objid] = value
+        return value, cyclic
+    
+    digest = hashlib.sha256()
+    cyclic = False
+    if isinstance(obj, PDFStream):
+        digest.update(b'stream')
+        value, cyclic = _object_digest(
+            {key: value for key, value in obj.attrs.items() if key not in ('Length', 'Filter', 'DecodeParms')},
+            memo, visiting)
+        digest.update(value)
+        digest.update(obj.get_data())
+    elif isinstance(obj, dict):
+        digest.update(b'dict')
+        for key in sorted(obj, key=str):
+            if key == 'Parent':  # 父節點指回頁面樹，與頁面內容無關
+                continue
+            digest.update(str(key).encode('utf-8', 'surrogatepass'))
+            value, item_cyclic = _object_digest(obj[key], memo, visiting)
+            digest.update(value)
+            cyclic = cyclic or item_cyclic
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'list')
+        for item in obj:
+            value, item_cyclic = _object_digest(item, memo, visiting)
+            digest.update(value)
+            cyclic = cyclic or item_cyclic
+    elif isinstance(obj, PSLiteral):
+        digest.update(b'name' + str(obj.name).encode('utf-8', 'surrogatepass'))
+    elif isinstance(obj, bytes):
+        digest.update(b'bytes' + obj)
+    else:
+        digest.update(repr(obj).encode('utf-8', 'surrogatepass'))
+    return digest.digest(), cyclic
@@ -5,416 +5,624 @@
 整合固定格式解析和增強格式匹配
 """
 
-import pdfplumber
 import pandas as pd
+import contextlib
 import re
+import glob
 import json
+import logging
 import os
-from typing import List, Dict, Optional, Any
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import (List, Dict, Optional, Any, Tuple, Iterable, Iterator, Callable, Union,
+                    BinaryIO)
 from datetime import datetime
 
+from final.backends import BACKENDS, PdfSource, TextBackend, get_backend
+from final.cancellation import DEADLINE, CancelToken, ConversionCancelled
+
+from final.excel_writer import (BASE_COLUMNS, MATERIAL_COLUMNS, StreamingWorkbookWriter,
+                                normalize_workbook, order_row)
+from final.exporters import WRITERS, available_formats, get_writer, write_orders
+from final import metrics
+from final.logs import configure_logging, log_event
+from final.material_index import MaterialIndex
+from final.material_table import MaterialTable
+from final.page_cache import PageCache, page_fingerprint
+from final.records import Material, Order, as_dict
+from final.spool import PdfSpool, SpoolHandle
+
+ProgressCallback = Callable[[int, int], None]
+
+# 平行模式中每個子程序至少處理的頁數（頁數不足時減少子程序數或改用單程序）
+PARALLEL_MIN_PAGES = 8
+
+logger = logging.getLogger(__name__)
+
+# 支援的材料代碼格式（合併為單一預先編譯樣式，每個 token 只比對一次）
+_MATERIAL_CODE_RE = re.compile(r"""
+    H[A-Z]-                             # 任何 H?- 開頭 (HC-, HD-, HS-, HN-, HA-, HE-, HP-, HB-等)
+  | (?P<special>I[AB][A-Z]{2,3}\d+z)$  # 特殊I系列: IAAD...z, IBAZ...z
+  | [A-Z]{1,2}$                         # 簡化代碼: g, C
+  | \d+$                               # 數字代碼: 21
+""", re.VERBOSE)
+
+# 行類型
+LINE_MAIN = 'main'            # PD 開頭的主要資料行
+LINE_SECONDARY = 'secondary'  # 第2欄為訂單號（SD/SA）的次要資料行
+LINE_HEADER = 'header'        # 耗料表頭行
+LINE_MATERIAL = 'material'    # 材料行
+
+# 行分類與欄位切分（單一預先編譯樣式，每行只掃描一次）：
+# 最外層具名群組即行類型（match.lastgroup），內層群組為各欄位；
+# 類型依欄位位置判斷，不以整行的子字串判斷。數字欄位只在整個 token 為數字時
+# 擷取，硬度±公差直接以群組取出
+_LINE_RE = re.compile(r"""
+    (?P<main>
+        (?P<work_order>PD\S*)                               # 工單單號 PD20250805002
+        (?:\s+(?P<date>\S+)\s+(?P<customer>\S+)\s+(?P<no>\S+)  # 上線日、客戶、品號+品名
+           \s+(?P<parent>\S+)\s+(?P<spec>\S+)                # 上階品名、規格（至少6欄）
+           (?:\s+(?:(?P<length>\d+)(?!\S)|\S+))?             # 總長
+           (?:\s+(?:(?P<quantity>\d+)(?!\S)|\S+))?           # 數量
+           (?:\s+(?P<color>\S+))?                            # 顏色
+           (?:\s+(?:(?P<hardness>\d+)±(?P<tolerance>\d+)\S*   # 硬度±公差: 70±5
+                   |(?P<plain_hardness>\d+)(?!\S)            # 只有硬度: 65
+                   |\S+))?
+        )?
+    )
+  | (?P<secondary>(?=(?P<category>\S+))(?P=category)           # 第1欄不回溯（失敗時立即換下一種）
+        \s+(?P<sales_order>S[DA]\d\S*)(?P<remarks>.*))
+  | (?P<header>耗料代碼|需求量|已領量)
+  | (?P<material>)
+""", re.VERBOSE)
+
+# 主要資料行的欄位群組（依 _parse_main_line 使用的順序）
+_MAIN_FIELDS = ('work_order', 'date', 'customer', 'no', 'parent', 'spec', 'length', 'quantity',
+                'color', 'hardness', 'tolerance', 'plain_hardness')
+
+# 次要資料行備註中略過的固定文字
+_REMARK_SKIP_WORDS = frozenset({'耗料代碼', '需求量', '已領量', '模具'})
+
+
+def classify_line(line: str) -> str:
+    """判斷行的類型（LINE_MAIN、LINE_SECONDARY、LINE_HEADER 或 LINE_MATERIAL）"""
+    return _LINE_RE.match(line).lastgroup
+
+
 class FinalPDFExtractor:
     """最終版 PDF 抽取器 - 完整功能版本"""
     
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: PdfSource, name: Optional[str] = None,
+                 backend: Union[str, TextBackend, None] = None,
+                 page_cache: Optional[PageCache] = None, quiet: bool = False,
+                 order_log_sample: int = 0, cancel_token: Optional[CancelToken] = None,
+                 deadline: Optional[float] = None):
+        """pdf_path 可為檔案路徑、PDF 位元組（bytes、memoryview、mmap）、
+        可 seek 的二進位檔案物件或共享暫存檔的 SpoolHandle（final.spool）
+        
+        backend 為文字抽取後端名稱（'pdfplumber'、'pdfminer'）或後端物件，
+        None 使用預設的 pdfplumber。
+        page_cache 為可跨文件共用的頁面快取：內容未變動的頁面直接沿用
+        上次抽取的文字行（僅單程序模式使用）。
+        
+        逐頁、逐筆訂單與特殊材料的事件以 DEBUG 等級記錄，每份文件結束時
+        以 INFO 記錄一筆摘要事件。quiet=True（大量處理用）時即使開啟 DEBUG
+        也不產生逐頁/逐筆事件；order_log_sample=N 時，未記錄逐筆事件的情況下
+        每 N 筆訂單以 INFO 記錄一筆抽樣事件。
+        
+        cancel_token 與 deadline（time.time() 時間戳）在每頁與每個 PD 區塊之間
+        檢查，取消或超過期限時拋出 ConversionCancelled。
+        """
         self.pdf_path = pdf_path
+        self.backend = get_backend(backend)
+        self.page_cache = page_cache
+        self.quiet = quiet
+        self.order_log_sample = order_log_sample
+        self.cancel_token = cancel_token
+        self.deadline = deadline
+        self.cancelled: Optional[str] = None  # 以部分結果結束時的原因（extract_orders(partial=True)）
+        self.name = name or _source_name(pdf_path)  # 用於輸出檔名與摘要
         self.orders = []
+        self.processed_at: Optional[datetime] = None  # 抽取完成時間，寫入統計摘要
+        self.page_count = 0
+        self._material_index: Optional[MaterialIndex] = None
+        self._material_index_key = None
+        self._strings: Dict[str, str] = {}  # 重複字串的字典表（每個抽取器各自一份）
+        self._log_detail = False  # 是否記錄逐頁/逐筆事件（每份文件開始時決定一次）
+        self._order_number = 0
+    
+    def extract_orders(self, workers: Optional[int] = 1,
+                       progress: Optional[ProgressCallback] = None,
+                       backend: Union[str, TextBackend, None] = None,
+                       partial: bool = False) -> List[Order]:
+        """主要抽取函數（收集 iter_orders 的所有訂單）
         
-        # 支援的材料代碼格式
-        self.valid_patterns = [
-            r'^H[A-Z]-',               # 任何 H?- 開頭 (HC-, HD-, HS-, HN-, HA-, HE-, HP-, HB-等)
-            r'^I[AB][A-Z]{2,3}\d+z$',  # 特殊I系列: IAAD...z, IBAZ...z
-            r'^[A-Z]{1,2}$',           # 簡化代碼: g, C
-            r'^\d+$'                   # 數字代碼: 21
-        ]
-        
-    def extract_orders(self) -> List[Dict[str, Any]]:
-        """主要抽取函數"""
-        print(f"🔍 開始處理 PDF: {self.pdf_path}")
-        
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                print(f"  處理第 {page_num + 1} 頁")
-                
-                text = page.extract_text()
-                if text:
-                    lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    page_orders = self._parse_variable_format(lines)
-                    self.orders.extend(page_orders)
-        
-        print(f"✅ 共抽取到 {len(self.orders)} 筆訂單")
+        取消或超過期限時拋出 ConversionCancelled；partial=True 時改為保留中斷前
+        已解析的訂單並回傳，原因記錄在 self.cancelled。
+        """
+        try:
+            for order in self.iter_orders(workers=workers, progress=progress, backend=backend):
+                self.orders.append(order)
+        except ConversionCancelled as e:
+            if not partial:
+                raise
+            self.cancelled = e.reason
+            self.processed_at = datetime.now().replace(microsecond=0)
         return self.orders
     
-    def _parse_variable_format(self, lines: List[str]) -> List[Dict[str, Any]]:
-        """解析可變格式資料（以PD開頭劃分區塊）"""
-        orders = []
-        i = 0
+    def iter_orders(self, workers: Optional[int] = 1,
+                    progress: Optional[ProgressCallback] = None,
+                    backend: Union[str, TextBackend, None] = None) -> Iterator[Order]:
+        """逐筆產生訂單（串流模式）
+
+        每個 PD 區塊一結束就立即產生訂單，頁面處理完即釋放其版面與字元快取，
+        記憶體用量不會隨頁數成長。不會寫入 self.orders。
+
+        workers > 1 時啟用平行模式：頁面切成連續分片交給子程序抽取與解析，
+        再依頁序合併；結果與單程序模式完全相同。workers=None 使用全部CPU核心。
+        每個子程序至少分到 PARALLEL_MIN_PAGES 頁才會平行，頁數不足時減少
+        子程序數或直接以單程序處理。
         
-        while i < len(lines):
-            if lines[i].startswith('PD'):
-                start = i
-                # 找到下一筆 PD 或文件結尾
-                i += 1
-                while i < len(lines) and not lines[i].startswith('PD'):
-                    i += 1
-                
-                # 取得這筆訂單的所有行
-                block_lines = lines[start:i]
-                order = self._parse_order_block(block_lines)
-                if order:
-                    orders.append(order)
-                    customer = order.get('客戶名稱', 'Unknown')
-                    product = order.get('上階品名', 'Unknown')
-                    material_count = len(order.get('耗料', []))
-                    print(f"    ✅ {order['工單單號']} - {customer} - {product} ({material_count}種材料)")
-            else:
-                i += 1
+        progress(已處理頁數, 總頁數) 會在每頁（平行模式為每個分片）完成後呼叫。
+        backend 指定本次使用的文字抽取後端，None 沿用建構時的設定。
+        """
+        started = time.perf_counter()
+        self._begin_logging()
+        if self._log_detail:
+            logger.debug("🔍 開始處理 PDF: %s", self.name)
+        
+        if workers is None:
+            workers = os.cpu_count() or 1
+        backend = self.backend if backend is None else get_backend(backend)
+        timings = metrics.timings()  # 停用時為空物件
+        
+        count = materials = 0
+        self._check_cancelled()
+        with timings.stage('open'):
+            document = backend.open(self.pdf_path)
+        with document as pdf:
+            page_count = self.page_count = pdf.page_count
+            # 子程序啟動與開啟文件的成本需由足夠的頁數攤提
+            workers = min(workers, page_count // PARALLEL_MIN_PAGES)
+            parallel = workers > 1
+            if progress:
+                progress(0, page_count)
+            if not parallel:
+                # 跨頁串接所有行，讓跨頁的 PD 區塊不會被切斷
+                for block_lines in self._iter_blocks(self._iter_page_lines(pdf, progress, backend)):
+                    self._check_cancelled()
+                    with timings.stage('parse'):
+                        order = self._parse_order_block(block_lines)
+                    if order:
+                        self._report_order(order)
+                        count += 1
+                        materials += len(order.materials)
+                        yield order
+        
+        if parallel:
+            for order in self._iter_parallel(page_count, workers, progress, backend):
+                count += 1
+                materials += len(order.materials)
+                yield order
         
+        self.processed_at = datetime.now().replace(microsecond=0)
+        metrics.record_document(page_count, count, materials)
+        seconds = time.perf_counter() - started
+        logger.info("✅ %s: 共抽取到 %d 筆訂單（%d 頁，%.2f 秒）", self.name, count, page_count, seconds,
+                    extra=log_event('document', source=self.name, pages=page_count, orders=count,
+                                    materials=materials, seconds=round(seconds, 3),
+                                    backend=backend.name, workers=workers))
+    
+    def _check_cancelled(self):
+        """已取消或超過期限時拋出 ConversionCancelled（每頁與每個 PD 區塊之間呼叫）"""
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise ConversionCancelled(DEADLINE)
+    
+    def _begin_logging(self):
+        """每份文件開始時決定是否記錄逐筆事件（熱迴圈內只檢查一個屬性）"""
+        self._log_detail = not self.quiet and logger.isEnabledFor(logging.DEBUG)
+        self._order_number = 0
+    
+    def _iter_page_lines(self, pdf, progress: Optional[ProgressCallback] = None,
+                         backend: Optional[TextBackend] = None) -> Iterator[str]:
+        """逐頁產生文字行，每頁處理完立即釋放快取"""
+        page_count = pdf.page_count
+        timings = metrics.timings()
+        memo = {}  # 跨頁共用資源（字型等）的摘要
+        for page_num in range(page_count):
+            self._check_cancelled()
+            if self._log_detail:
+                logger.debug("處理第 %d 頁", page_num + 1)
+            lines = None
+            if self.page_cache is not None:
+                # 不同後端的分行結果可能不同，鍵值包含後端名稱
+                with timings.stage('page_cache'):
+                    key = ((backend or self.backend).name, page_fingerprint(pdf.page_object(page_num), memo))
+                    lines = self.page_cache.get(key)
+            if lines is None:
+                with timings.stage('extract_text'):
+                    lines = self._split_lines(pdf.page_text(page_num))
+                if self.page_cache is not None:
+                    self.page_cache.put(key, lines)
+            if progress:
+                progress(page_num + 1, page_count)
+            yield from lines
+    
+    def _iter_parallel(self, page_count: int, workers: int,
+                       progress: Optional[ProgressCallback] = None,
+                       backend: Optional[TextBackend] = None) -> Iterator[Order]:
+        """平行分片抽取，並將跨分片的 PD 區塊重新接合"""
+        bounds = shard_bounds(page_count, workers)
+        shard_count = len(bounds) - 1
+        
+        # 記憶體中的 PDF 只寫入一次共享暫存檔，各子程序以 mmap 讀取並只開啟一次
+        carry = None  # 上一分片尚未結束的最後區塊
+        with _shard_source(self.pdf_path) as source, \
+                ProcessPoolExecutor(max_workers=min(workers, shard_count), initializer=_open_shard_document,
+                                    initargs=(source, backend or self.backend)) as pool:
+            results = pool.map(_extract_shard, bounds[:-1], bounds[1:])
+            # 等待子程序的時間記為分片抽取階段
+            results = _timed(results, metrics.timings(), 'shards')
+            for (start, end), (head, shard_orders, tail) in zip(zip(bounds, bounds[1:]), results):
+                try:
+                    self._check_cancelled()
+                except ConversionCancelled:
+                    # 尚未開始的分片不再執行，只等待執行中的分片結束
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+                if self._log_detail:
+                    logger.debug("處理第 %d-%d 頁", start + 1, end)
+                if progress:
+                    progress(end, page_count)
+                if carry is not None:
+                    carry.extend(head)
+                if tail is None:
+                    # 本分片沒有新的 PD 行，整片都屬於上一個區塊
+                    continue
+                if carry is not None:
+                    shard_orders.insert(0, self._parse_order_block(carry))
+                for order in shard_orders:
+                    if order:
+                        self._report_order(order)
+                        yield order
+                carry = tail
+        
+        if carry is not None:
+            order = self._parse_order_block(carry)
+            if order:
+                self._report_order(order)
+                yield order
+    
+    @staticmethod
+    def _split_lines(text: Optional[str]) -> List[str]:
+        """將頁面文字切成去除空白的非空行"""
+        if not text:
+            return []
+        return [line.strip() for line in text.split('\n') if line.strip()]
+    
+    @staticmethod
+    def _split_blocks(lines: List[str]) -> Tuple[List[str], List[List[str]]]:
+        """以PD開頭劃分區塊，回傳（第一個PD之前的行, 各區塊的行）"""
+        head = []
+        blocks = []
+        for line in lines:
+            if line.startswith('PD'):
+                blocks.append([line])
+            elif blocks:
+                blocks[-1].append(line)
+            else:
+                head.append(line)
+        return head, blocks
+    
+    @staticmethod
+    def _iter_blocks(lines: Iterable[str]) -> Iterator[List[str]]:
+        """串流版區塊劃分：下一個PD出現（或輸入結束）時產生前一個區塊"""
+        block = None
+        for line in lines:
+            if line.startswith('PD'):
+                if block is not None:
+                    yield block
+                block = [line]
+            elif block is not None:
+                block.append(line)
+        if block is not None:
+            yield block
+    
+    def _parse_variable_format(self, lines: List[str]) -> List[Order]:
+        """解析可變格式資料（以PD開頭劃分區塊）"""
+        orders = []
+        self._begin_logging()
+        for block_lines in self._iter_blocks(lines):
+            order = self._parse_order_block(block_lines)
+            if order:
+                self._report_order(order)
+                orders.append(order)
         return orders
     
-    def _parse_order_block(self, block_lines: List[str]) -> Optional[Dict[str, Any]]:
+    def _report_order(self, order: Order):
+        """單筆訂單事件：逐筆記錄 (DEBUG) 或依抽樣間隔記錄 (INFO)"""
+        self._order_number += 1
+        if self._log_detail:
+            level = logging.DEBUG
+        elif self.order_log_sample and self._order_number % self.order_log_sample == 0:
+            level = logging.INFO
+        else:
+            return
+        logger.log(level, "✅ %s - %s - %s (%d種材料)", order.work_order_no, order.customer,
+                   order.parent_name, len(order.materials),
+                   extra=log_event('order', source=self.name, number=self._order_number,
+                                   work_order_no=order.work_order_no, customer=order.customer,
+                                   materials=len(order.materials)))
+    
+    def _parse_order_block(self, block_lines: List[str]) -> Optional[Order]:
         """解析單個訂單區塊（可變行數）"""
         if len(block_lines) < 2:
             return None
         
         order = self._create_empty_order()
+        match_line = _LINE_RE.match
         
         # 第1行一定是主要資料
-        if not self._parse_main_line(order, block_lines[0]):
+        if not self._parse_main_line(order, match_line(block_lines[0])):
             return None
         
-        # 其餘行：次要資料或耗料
+        # 其餘行：次要資料或耗料（分類時已切好的欄位直接交給解析）
         for line in block_lines[1:]:
-            if 'SD' in line or 'SA' in line:  # 包含訂單號的行
-                self._parse_secondary_line(order, line)
-            elif '耗料代碼' in line or '需求量' in line or '已領量' in line:
-                # 跳過表頭行
-                continue
-            else:
-                # 嘗試解析為材料行
+            match = match_line(line)
+            kind = match.lastgroup
+            if kind == LINE_SECONDARY:
+                self._parse_secondary_line(order, match)
+            elif kind == LINE_MATERIAL:
                 self._parse_material_line(order, line)
-        
-        # 最終處理
-        self._finalize_order(order)
+            # 表頭行直接跳過
         
         return order
     
-    def _parse_main_line(self, order: Dict[str, Any], line: str) -> bool:
-        """解析主要資料行（放寬欄位要求）"""
-        parts = line.split()
-        if len(parts) < 6:  # 放寬要求：最少需要6個欄位
+    def _parse_main_line(self, order: Order, match: re.Match) -> bool:
+        """解析主要資料行（_LINE_RE 的比對結果，放寬欄位要求：最少6個欄位）"""
+        if match.lastgroup != LINE_MAIN:
             return False
-        
-        try:
-            order["工單單號"] = parts[0]  # PD20250805002
-            order["上線日"] = parts[1].replace('/', '-')  # 2025/08/06 -> 2025-08-06
-            order["客戶名稱"] = parts[2]  # 客戶名稱
-            
-            # 品號+品名處理
-            no_and_name = parts[3]
-            if '包膠' in no_and_name:
-                order["NO"] = no_and_name.replace('包膠', '')
-                order["品名"] = '包膠'
-            elif '包套管' in no_and_name:
-                order["NO"] = no_and_name.replace('包套管', '')
-                order["品名"] = '包套管'
-            elif '面層包膠' in no_and_name:
-                order["NO"] = no_and_name.replace('面層包膠', '')
-                order["品名"] = '面層包膠'
-            else:
-                order["NO"] = no_and_name
-            
-            order["上階品名"] = parts[4]
-            order["上階規格"] = parts[5] if len(parts) > 5 else ""
-            
-            # 數字欄位處理（容錯處理）
-            order["總長"] = 0
-            order["數量"] = 1
-            order["顏色"] = ""
-            order["硬度"] = None
-            order["硬度公差"] = None
-            
-            # 如果有足夠欄位，嘗試解析數字和顏色
-            if len(parts) > 6:
-                try:
-                    order["總長"] = int(parts[6]) if parts[6].isdigit() else 0
-                except (ValueError, IndexError):
-                    pass
-            
-            if len(parts) > 7:
-                try:
-                    order["數量"] = int(parts[7]) if parts[7].isdigit() else 1
-                except (ValueError, IndexError):
-                    pass
-            
-            if len(parts) > 8:
-                order["顏色"] = parts[8]
-            
-            # 硬度±公差處理（如果存在）
-            if len(parts) > 9:
-                try:
-                    hardness_str = parts[9]
-                    hardness_match = re.match(r'(\d+)±(\d+)', hardness_str)
-                    if hardness_match:
-                        order["硬度"] = int(hardness_match.group(1))
-                        order["硬度公差"] = int(hardness_match.group(2))
-                    elif hardness_str.isdigit():
-                        order["硬度"] = int(hardness_str)
-                        order["硬度公差"] = 5  # 預設公差
-                except (ValueError, IndexError):
-                    pass
-            
-            return True
-            
-        except (ValueError, IndexError) as e:
-            print(f"      ⚠️ 主行解析錯誤: {e}")
+        (work_order_no, online_date, customer, no_and_name, parent_name, parent_spec, length, quantity,
+         color, hardness, tolerance, plain_hardness) = match.group(*_MAIN_FIELDS)
+        if parent_spec is None:
             return False
+        
+        # 重複出現的日期、客戶、品名、顏色等字串共用同一物件（字典編碼）
+        shared = self._strings.setdefault
+        
+        order.work_order_no = work_order_no  # PD20250805002
+        online_date = online_date.replace('/', '-')  # 2025/08/06 -> 2025-08-06
+        order.online_date = shared(online_date, online_date)
+        order.customer = shared(customer, customer)  # 客戶名稱
+        
+        # 品號+品名處理
+        if '包膠' in no_and_name:
+            order.no = no_and_name.replace('包膠', '')
+            order.name = '包膠'
+        elif '包套管' in no_and_name:
+            order.no = no_and_name.replace('包套管', '')
+            order.name = '包套管'
+        elif '面層包膠' in no_and_name:
+            order.no = no_and_name.replace('面層包膠', '')
+            order.name = '面層包膠'
+        else:
+            order.no = no_and_name
+        
+        order.parent_name = shared(parent_name, parent_name)
+        order.parent_spec = shared(parent_spec, parent_spec)
+        
+        # 數字欄位只在整個欄位為數字時才有群組，其餘沿用預設值（容錯處理）
+        order.length = int(length) if length is not None else 0
+        order.quantity = int(quantity) if quantity is not None else 1
+        order.color = shared(color, color) if color is not None else ""
+        
+        # 硬度±公差處理（如果存在）
+        if tolerance is not None:
+            order.hardness = int(hardness)
+            order.hardness_tolerance = int(tolerance)
+        elif plain_hardness is not None:
+            order.hardness = int(plain_hardness)
+            order.hardness_tolerance = 5  # 預設公差
+        
+        return True
     
-    def _parse_secondary_line(self, order: Dict[str, Any], line: str):
-        """解析次要資訊行"""
-        parts = line.split()
-        if len(parts) >= 2:
-            order["產品類別"] = parts[0]  # A, B, C, etc.
-            order["訂單單號"] = parts[1]  # SD20250804004-001
-            
-            # 備註處理（跳過固定文字）
-            skip_words = {'耗料代碼', '需求量', '已領量', '模具'}
-            remarks = []
-            
-            for part in parts[2:]:
-                if part not in skip_words:
-                    remarks.append(part)
-            
-            if remarks:
-                order["客戶備註"] = ' '.join(remarks)
+    def _parse_secondary_line(self, order: Order, match: re.Match):
+        """解析次要資訊行（_LINE_RE 的比對結果）"""
+        category = match['category']
+        order.category = self._strings.setdefault(category, category)  # A, B, C, etc.
+        order.sales_order_no = match['sales_order']  # SD20250804004-001
+        
+        # 備註處理（跳過固定文字）
+        remarks = [part for part in match['remarks'].split() if part not in _REMARK_SKIP_WORDS]
+        if remarks:
+            order.remarks = ' '.join(remarks)
     
-    def _parse_material_line(self, order: Dict[str, Any], line: str):
+    def _parse_material_line(self, order: Order, line: str):
         """解析材料資訊行，支援同一行多組材料（追加模式）"""
         tokens = line.split()
-        if len(tokens) < 2:
+        token_count = len(tokens)
+        if token_count < 2:
             return
         
+        materials = order.materials
+        shared = self._strings.setdefault
+        match_code = _MATERIAL_CODE_RE.match
         i = 0
-        while i + 1 < len(tokens):
+        while i + 1 < token_count:
             code = tokens[i]
             
             # 檢查是否像材料代碼
-            if any(re.match(pattern, code) for pattern in self.valid_patterns):
+            code_match = match_code(code)
+            if code_match is not None:
                 try:
                     need_qty = float(tokens[i + 1])
-                    received_qty = float(tokens[i + 2]) if i + 2 < len(tokens) else 0.0
-                    
+                    received_qty = float(tokens[i + 2]) if i + 2 < token_count else 0.0
+                except ValueError:
+                    # 如果數量解析失敗，跳過這個token繼續
+                    pass
+                else:
                     # 追加材料到訂單
-                    material_item = {
-                        "代碼": code,
-                        "需求量": need_qty,
-                        "已領量": received_qty
-                    }
-                    order.setdefault("耗料", []).append(material_item)
+                    materials.append(Material(shared(code, code), need_qty, received_qty))
                     
                     # 特殊代碼提示
-                    if re.match(r'^I[AB][A-Z]{2,3}\d+z$', code):
-                        print(f"      🔍 特殊材料: {code}")
+                    if self._log_detail and code_match.lastgroup == 'special':
+                        logger.debug("🔍 特殊材料: %s", code)
                     
                     # 跳過已處理的3個token（代碼、需求量、已領量）
                     i += 3
                     continue
-                    
-                except (ValueError, IndexError):
-                    # 如果數量解析失敗，跳過這個token繼續
-                    pass
             
             i += 1
     
-    
-    def _finalize_order(self, order: Dict[str, Any]):
-        """最終處理和驗證訂單"""
-        # 確保耗料欄位存在
-        if "耗料" not in order:
-            order["耗料"] = []
-    
-    def _create_empty_order(self) -> Dict[str, Any]:
+    def _create_empty_order(self) -> Order:
         """創建空訂單結構"""
-        return {
-            "上線日": None,
-            "客戶名稱": None,
-            "上階品名": None,
-            "上階規格": None,
-            "數量": None,
-            "硬度": None,
-            "硬度公差": None,
-            "客戶備註": None,
-            "顏色": None,
-            "工單單號": None,
-            "產品類別": None,
-            "訂單單號": None,
-            "NO": None,
-            "品名": None,
-            "總長": None,
-            "耗料": []
-        }
-    
-    def save_results(self, output_dir: str = "output"):
-        """儲存結果到多種格式"""
+        return Order()
+    
+    def save_results(self, output_dir: str = "output",
+                     orders: Optional[Iterable[Dict[str, Any]]] = None,
+                     streaming: bool = False, base_name: Optional[str] = None):
+        """儲存結果到多種格式
+
+        orders 可傳入 iter_orders() 產生器：JSON 會邊抽取邊寫入。
+        streaming=False 時訂單同時收集到 self.orders 供 Excel 與統計使用；
+        streaming=True 時 Excel 也逐筆串流寫出，訂單不會保留在記憶體中。
+        base_name 為輸出檔名前綴（預設為PDF檔名），後面會再加上時間戳記。
+        """
         os.makedirs(output_dir, exist_ok=True)
         
-        base_name = os.path.splitext(os.path.basename(self.pdf_path))[0]
+        base_name = base_name or os.path.splitext(os.path.basename(self.name))[0]
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        json_path = os.path.join(output_dir, f"{base_name}_extracted_{timestamp}.json")
+        excel_path = os.path.join(output_dir, f"{base_name}_extracted_{timestamp}.xlsx")
+        writer = StreamingWorkbookWriter(excel_path) if streaming else None
         
         # 1. 儲存 JSON
-        json_path = os.path.join(output_dir, f"{base_name}_extracted_{timestamp}.json")
         with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(self.orders, f, ensure_ascii=False, indent=2)
-        print(f"💾 JSON 已儲存: {json_path}")
+            if orders is None and writer is None:
+                json.dump(self.orders, f, ensure_ascii=False, indent=2, default=as_dict)
+            else:
+                source = self.orders if orders is None else orders
+                on_order = writer.add_order if writer is not None else self.orders.append
+                self._write_json_stream(f, source, on_order)
+        logger.info("💾 JSON 已儲存: %s", json_path)
         
         # 2. 儲存 Excel
-        excel_path = os.path.join(output_dir, f"{base_name}_extracted_{timestamp}.xlsx")
-        self._save_to_excel(excel_path)
-        print(f"📊 Excel 已儲存: {excel_path}")
+        if writer is not None:
+            writer.close(self._processed_at())
+        else:
+            self._save_to_excel(excel_path)
+        logger.info("📊 Excel 已儲存: %s", excel_path)
         
         return {"json": json_path, "excel": excel_path}
     
-    def _save_to_excel(self, excel_path: str):
-        """儲存到 Excel（多工作表，材料代碼分類）"""
-        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-            # 主訂單資料
-            df_data = []
+    def save_table(self, output_dir: str = "output", output_format: str = "csv",
+                   orders: Optional[Iterable[Dict[str, Any]]] = None,
+                   base_name: Optional[str] = None) -> Dict[str, str]:
+        """以長格式材料表輸出 CSV / JSON Lines / Parquet（不產生 Excel）
+
+        orders 可傳入 iter_orders() 產生器逐筆寫出（訂單不保留在記憶體中），
+        預設輸出 self.orders。
+        """
+        extension = get_writer(output_format).extension
+        os.makedirs(output_dir, exist_ok=True)
+        
+        base_name = base_name or os.path.splitext(os.path.basename(self.name))[0]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(output_dir, f"{base_name}_extracted_{timestamp}.{extension}")
+        
+        with open(path, 'wb') as f:
+            rows = write_orders(self.orders if orders is None else orders, f, output_format)
+        logger.info("💾 %s 已儲存: %s（%d 列）", output_format.upper(), path, rows)
+        
+        return {output_format: path}
+    
+    def _write_json_stream(self, f, orders: Iterable[Dict[str, Any]],
+                           on_order: Callable[[Dict[str, Any]], None]):
+        """逐筆寫入 JSON 陣列，輸出與 json.dump(indent=2) 完全相同"""
+        f.write('[')
+        first = True
+        for order in orders:
+            on_order(order)
+            item = json.dumps(order, ensure_ascii=False, indent=2, default=as_dict)
+            f.write('\n  ' if first else ',\n  ')
+            f.write(item.replace('\n', '\n  '))
+            first = False
+        f.write(']' if first else '\n]')
+    
+    def _save_to_excel(self, excel_path: Union[str, BinaryIO], streaming: bool = False):
+        """儲存到 Excel（多工作表，材料代碼分類）
+        
+        excel_path 可為檔案路徑或可寫入、可 seek 的檔案物件（如 io.BytesIO）。
+        streaming=True 時改用唯寫模式逐列輸出，不建立 DataFrame。
+        """
+        if streaming:
+            writer = StreamingWorkbookWriter(excel_path)
             for order in self.orders:
-                row = order.copy()
-                
-                # 分類材料代碼和數量
-                h_codes = []      # H系列代碼
-                h_quantities = [] # H系列原料公斤數
-                i_codes = []      # I系列代碼  
-                i_quantities = [] # I系列鐵材隻數
-                other_materials = []  # 其他材料
-                
-                if order.get("耗料"):
-                    for material in order["耗料"]:
-                        code = material.get("代碼", "")
-                        qty = material.get("需求量", 0)
-                        
-                        if code.startswith('H'):
-                            h_codes.append(code)
-                            h_quantities.append(str(qty))  # 純數字，方便運算
-                        elif code.startswith('I'):
-                            i_codes.append(code)
-                            i_quantities.append(str(qty))  # 純數字，方便運算
-                        else:
-                            other_materials.append(f"{code}({qty})")
-                
-                # 新增分類欄位
-                row["H系列代碼"] = "; ".join(h_codes) if h_codes else ""
-                row["原料公斤數"] = "; ".join(h_quantities) if h_quantities else ""
-                row["I系列代碼"] = "; ".join(i_codes) if i_codes else ""
-                row["鐵材隻數"] = "; ".join(i_quantities) if i_quantities else ""
-                row["其他材料"] = "; ".join(other_materials) if other_materials else ""
-                
-                if "耗料" in row:
-                    del row["耗料"]
-                
-                df_data.append(row)
-            
-            df = pd.DataFrame(df_data)
+                writer.add_order(order)
+            writer.close(self._processed_at())
+            return
+        
+        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+            # 主訂單資料；耗料攤平為材料表，分類材料欄位與統計皆以向量化計算
+            table = MaterialTable.build(self.orders)
+            df = pd.DataFrame([order_row(order, {}) for order in self.orders])
+            if self.orders:
+                for column, values in table.order_columns().items():
+                    df[column] = values
             
             # 重新排序欄位，將分類材料放在前面
-            base_columns = ["工單單號", "訂單單號", "客戶名稱", "上階品名", "上階規格", 
-                          "數量", "硬度", "硬度公差", "顏色", "上線日", "產品類別"]
-            material_columns = ["H系列代碼", "原料公斤數", "I系列代碼", "鐵材隻數", "其他材料"]
             other_columns = [col for col in df.columns 
-                           if col not in base_columns + material_columns 
+                           if col not in BASE_COLUMNS + MATERIAL_COLUMNS 
                            and not col.startswith("耗料")]  # 排除舊的耗料欄位
             
-            column_order = base_columns + material_columns + other_columns
+            column_order = BASE_COLUMNS + MATERIAL_COLUMNS + other_columns
             df = df.reindex(columns=[col for col in column_order if col in df.columns])
             
             df.to_excel(writer, sheet_name='訂單明細', index=False)
             
             # 材料統計表
-            material_stats = self._get_material_statistics()
-            df_material_stats = pd.DataFrame(material_stats)
+            df_material_stats = table.material_statistics()
             df_material_stats.to_excel(writer, sheet_name='材料統計', index=False)
             
             # 統計資料
-            stats = self.get_statistics()
+            stats = table.statistics(df, self._processed_at())
             df_stats = pd.DataFrame([stats])
             df_stats.to_excel(writer, sheet_name='統計摘要', index=False)
+        
+        normalize_workbook(excel_path)
+    
+    @property
+    def material_index(self) -> MaterialIndex:
+        """目前訂單的材料索引（每次抽取只建立一次）"""
+        key = (id(self.orders), len(self.orders))
+        if self._material_index is None or self._material_index_key != key:
+            self._material_index = MaterialIndex.build(self.orders)
+            self._material_index_key = key
+        return self._material_index
     
     def get_statistics(self) -> Dict[str, Any]:
         """獲取統計資料"""
-        stats = {
-            "總訂單數": len(self.orders),
-            "客戶數量": len(set(o.get("客戶名稱") for o in self.orders if o.get("客戶名稱"))),
-            "產品類型數": len(set(o.get("上階品名") for o in self.orders if o.get("上階品名"))),
-            "總材料項目": sum(len(o.get("耗料", [])) for o in self.orders),
-            "總需求量": sum(m.get("需求量", 0) for o in self.orders for m in o.get("耗料", [])),
-            "處理時間": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        return stats
+        return self.material_index.statistics(self._processed_at())
+    
+    def _processed_at(self) -> datetime:
+        """處理時間（尚未抽取時使用目前時間）"""
+        return self.processed_at or datetime.now().replace(microsecond=0)
     
     def _get_material_statistics(self) -> List[Dict[str, Any]]:
         """獲取材料統計資料（按類別分組）"""
-        h_materials = {}
-        i_materials = {}
-        other_materials = {}
-        
-        for order in self.orders:
-            for material in order.get("耗料", []):
-                code = material.get("代碼", "")
-                qty = material.get("需求量", 0)
-                
-                if code.startswith('H'):
-                    h_materials[code] = h_materials.get(code, 0) + qty
-                elif code.startswith('I'):
-                    i_materials[code] = i_materials.get(code, 0) + qty
-                else:
-                    other_materials[code] = other_materials.get(code, 0) + qty
-        
-        stats = []
-        
-        # H系列材料統計
-        for code, total_qty in sorted(h_materials.items(), key=lambda x: x[1], reverse=True):
-            stats.append({
-                "材料類別": "H系列",
-                "材料代碼": code,
-                "總需求量": total_qty,
-                "使用次數": sum(1 for order in self.orders 
-                               for material in order.get("耗料", []) 
-                               if material.get("代碼") == code)
-            })
-        
-        # I系列材料統計
-        for code, total_qty in sorted(i_materials.items(), key=lambda x: x[1], reverse=True):
-            stats.append({
-                "材料類別": "I系列",
-                "材料代碼": code,
-                "總需求量": total_qty,
-                "使用次數": sum(1 for order in self.orders 
-                               for material in order.get("耗料", []) 
-                               if material.get("代碼") == code)
-            })
-        
-        # 其他材料統計
-        for code, total_qty in sorted(other_materials.items(), key=lambda x: x[1], reverse=True):
-            stats.append({
-                "材料類別": "其他",
-                "材料代碼": code,
-                "總需求量": total_qty,
-                "使用次數": sum(1 for order in self.orders 
-                               for material in order.get("耗料", []) 
-                               if material.get("代碼") == code)
-            })
-        
-        return stats
+        return self.material_index.material_statistics()
     
     def print_summary(self):
         """列印處理摘要"""
-        stats = self.get_statistics()
+        index = self.material_index
+        stats = index.statistics(self._processed_at())
         
         print(f"\n{'='*60}")
         print(f"📋 PDF 抽取摘要報告")
         print(f"{'='*60}")
-        print(f"📁 檔案: {os.path.basename(self.pdf_path)}")
+        print(f"📁 檔案: {os.path.basename(self.name)}")
         print(f"📊 總訂單數: {stats['總訂單數']}")
         print(f"👥 客戶數量: {stats['客戶數量']}")
         print(f"🔧 產品類型: {stats['產品類型數']}")
@@ -422,34 +630,143 @@ class FinalPDFExtractor:
         print(f"⚖️  總需求量: {stats['總需求量']:.1f} kg")
         print(f"⏰ 處理時間: {stats['處理時間']}")
         
-        # 客戶分布
-        customers = {}
-        materials = {}
-        
-        for order in self.orders:
-            customer = order.get("客戶名稱", "未知")
-            customers[customer] = customers.get(customer, 0) + 1
-            
-            for material in order.get("耗料", []):
-                code = material.get("代碼", "")
-                if code:
-                    materials[code] = materials.get(code, 0) + material.get("需求量", 0)
-        
         print(f"\n👥 主要客戶 (前5名):")
-        for customer, count in sorted(customers.items(), key=lambda x: x[1], reverse=True)[:5]:
+        for customer, count in index.top_customers(5):
             print(f"   {customer}: {count} 筆")
         
         print(f"\n🧪 主要材料 (前5種):")
-        for material, qty in sorted(materials.items(), key=lambda x: x[1], reverse=True)[:5]:
+        for material, qty in index.top_materials(5):
             print(f"   {material}: {qty:.1f} kg")
 
+def _source_name(source: PdfSource) -> str:
+    """PDF 來源的顯示名稱"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    name = getattr(source, 'name', None)
+    return name if isinstance(name, str) else 'upload.pdf'
+
+
+@contextlib.contextmanager
+def _shard_source(source: PdfSource) -> Iterator[PdfSource]:
+    """子程序可用的來源：路徑與暫存檔參照直接傳遞，其他內容寫入一次共享暫存檔（結束時刪除）"""
+    if isinstance(source, (str, os.PathLike, SpoolHandle)):
+        yield source
+        return
+    with PdfSpool.from_source(source, name=_source_name(source)) as spool:
+        yield spool.handle()
+
+
+def _timed(iterable: Iterable, timings, stage: str) -> Iterator:
+    """逐項產生，並將取得每一項的時間累加到 timings 的 stage 階段"""
+    iterator = iter(iterable)
+    while True:
+        with timings.stage(stage):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+_END = object()
+
+
+def shard_bounds(page_count: int, workers: int) -> List[int]:
+    """平行模式的分片邊界頁（第 k 片為 [bounds[k], bounds[k+1])）
+
+    分片數多於程序數，讓頁面內容不均時仍能平衡負載。
+    """
+    shard_count = min(page_count, workers * 4)
+    return [page_count * k // shard_count for k in range(shard_count + 1)]
+
+
+# 平行分片子程序內已開啟的文件（由 _open_shard_document 設定）
+_shard_extractor: Optional[FinalPDFExtractor] = None
+_shard_document = None
+
+
+def _open_shard_document(pdf_path: PdfSource, backend: TextBackend):
+    """子程序初始化：開啟一次文件（子程序結束時關閉）
+
+    同一子程序處理的各分片共用已解析的交叉參照表、頁面樹與字型資源。
+    """
+    global _shard_extractor, _shard_document
+    _shard_extractor = FinalPDFExtractor(pdf_path, backend=backend, quiet=True)
+    _shard_document = backend.open(pdf_path)
+
+
+def _extract_shard(start: int, end: int):
+    """子程序工作：抽取 [start, end) 頁並解析分片內完整的 PD 區塊
+
+    回傳 (第一個PD之前的行, 已完成的訂單, 最後一個區塊的行)。最後一個區塊
+    可能延續到下一分片，因此保留原始行交由主程序接合後再解析。
+    """
+    extractor = _shard_extractor
+    lines = []
+    for page_num in range(start, end):
+        lines.extend(extractor._split_lines(_shard_document.page_text(page_num)))
+    
+    head, blocks = extractor._split_blocks(lines)
+    tail = blocks.pop() if blocks else None
+    orders = [extractor._parse_order_block(block_lines) for block_lines in blocks]
+    return head, orders, tail
+
 
 def main():
-    """主程式"""
+    """主程式
+    
+    單一PDF：python -m final.pdf_extractor 檔案.pdf（未提供時詢問路徑）
+    批次模式：傳入多個檔案、目錄或萬用字元，未變更的PDF依清單檔略過
+    查詢訂單資料庫：python -m final.pdf_extractor query [條件]（見 final.store）
+    """
+    import argparse
     import sys
     
-    if len(sys.argv) > 1:
-        pdf_path = sys.argv[1]
+    if sys.argv[1:2] == ['query']:
+        from final.store import main as query_main
+        query_main(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(description="工單PDF抽取器")
+    parser.add_argument('inputs', nargs='*', help="PDF檔案、目錄或萬用字元（如 'archive/**/*.pdf'）")
+    parser.add_argument('-o', '--output', default='output', help="輸出目錄（預設 output）")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="批次模式的子程序數（預設為CPU核心數）")
+    parser.add_argument('--manifest', default=None,
+                        help="批次模式的清單檔（預設為 輸出目錄/manifest.json）")
+    parser.add_argument('--force', action='store_true', help="批次模式忽略清單，全部重新處理")
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                        help="文字抽取後端（預設 pdfplumber）")
+    parser.add_argument('--format', dest='output_format', choices=list(WRITERS), default=None,
+                        help="輸出長格式材料表（csv、jsonl、parquet），不產生 JSON 與 Excel")
+    parser.add_argument('-v', '--verbose', action='store_true', help="顯示逐頁與逐筆訂單的處理進度")
+    parser.add_argument('--sample-orders', type=int, default=0, metavar='N',
+                        help="未使用 -v 時每 N 筆訂單顯示一筆")
+    parser.add_argument('--log-json', action='store_true', help="日誌以每行一筆 JSON 輸出")
+    parser.add_argument('--store', nargs='?', metavar='DB', default=None,
+                        const=os.environ.get('ORDER_STORE_PATH') or os.path.join('output', 'orders.db'),
+                        help="同時將訂單寫入 SQLite 訂單資料庫（預設 ORDER_STORE_PATH 或 output/orders.db），"
+                             "之後以 query 子命令查詢")
+    args = parser.parse_args()
+    
+    if args.output_format and args.output_format not in available_formats():
+        parser.error(f"輸出格式 {args.output_format} 需要安裝 pyarrow")
+    
+    configure_logging(logging.INFO, json_format=args.log_json, fmt='%(message)s')
+    if args.verbose:
+        # 只開啟本套件的 DEBUG（pdfminer 的 DEBUG 日誌量極大）
+        logging.getLogger('final').setLevel(logging.DEBUG)
+        logger.setLevel(logging.DEBUG)  # 以 python -m 執行時本模組為 __main__
+    
+    if len(args.inputs) > 1 or any(os.path.isdir(path) or glob.has_magic(path) for path in args.inputs):
+        from final.incremental import run_incremental
+        run_incremental(args.inputs, output_dir=args.output, manifest_path=args.manifest,
+                        workers=args.workers, force=args.force, backend=args.backend,
+                        order_log_sample=args.sample_orders, output_format=args.output_format,
+                        store_path=args.store)
+        return
+    
+    if args.inputs:
+        pdf_path = args.inputs[0]
     else:
         pdf_path = input("請輸入 PDF 檔案路徑: ").strip()
     
@@ -458,7 +775,7 @@ def main():
         return
     
     # 建立抽取器
-    extractor = FinalPDFExtractor(pdf_path)
+    extractor = FinalPDFExtractor(pdf_path, backend=args.backend, order_log_sample=args.sample_orders)
     
     # 抽取訂單
     orders = extractor.extract_orders()
@@ -468,15 +785,25 @@ def main():
         extractor.print_summary()
         
         # 儲存結果
-        saved_files = extractor.save_results()
+        if args.output_format:
+            saved_files = extractor.save_table(args.output, args.output_format)
+        else:
+            saved_files = extractor.save_results(args.output)
         
         print(f"\n🎉 處理完成！")
         print(f"📁 檔案已儲存到: {list(saved_files.values())}")
         
+        if args.store:
+            from final.store import OrderStore, file_sha256
+            written = OrderStore(args.store).upsert_orders(
+                orders, source=pdf_path, sha256=file_sha256(pdf_path),
+                revised_at=datetime.fromtimestamp(os.path.getmtime(pdf_path)))
+            print(f"🗄️  已寫入訂單資料庫 {args.store}: {written} 筆")
+        
         # 顯示第一筆完整資料
         if orders:
             print(f"\n📄 第一筆訂單範例:")
-            print(json.dumps(orders[0], ensure_ascii=False, indent=2))
+            print(json.dumps(orders[0], ensure_ascii=False, indent=2, default=as_dict))
     else:
         print("❌ 未能抽取到任何訂單")
 
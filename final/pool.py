@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共用轉換程序池 - CPU 密集的PDF解析與輸出產生交給固定數量的子程序，
+並以有上限的等待佇列做准入控制
+
+每個 gunicorn worker 一個程序池（第一次轉換時才建立），請求執行緒只負責
+上傳、快取與回應，等待子程序時不佔用 CPU。子程序不直接由 worker fork：
+worker 有許多執行緒，fork 當下被其他執行緒持有的鎖（logging、sqlite、
+頁面快取）會讓子程序永遠卡住。改由單執行緒的 forkserver（已預先匯入
+重量級模組）產生子程序，不支援時使用 spawn；子程序在初始化時自行預熱。上傳內容以路徑或共享暫存檔的 SpoolHandle 交給子程序（見
+final.spool），不經由 pickle 複製整份PDF。
+
+同時進行中的轉換超過 workers + queue_size 時 convert() 直接拋出
+PoolSaturated，由端點回傳 429 與 Retry-After，不會無限制地接收工作。
+非同步工作與批次轉換以 reserve() 在提交時預留名額，同樣受此上限約束。
+
+佇列深度、忙碌的子程序數、等待時間與拒絕次數記錄在 final.metrics。
+"""
+
+import io
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from final import metrics
+from final.cancellation import CancelToken
+from final.logs import JsonFormatter, configure_logging
+from final.spool import SpoolHandle
+from final.warmup import WARMUP_MODULES, WarmUp
+
+# 估計 Retry-After 時，平均轉換耗時的平滑係數（指數移動平均）
+_SMOOTHING = 0.2
+
+# 子程序的啟動方式（不使用 fork，見模組說明）
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class PoolSaturated(RuntimeError):
+    """程序池與等待佇列都已滿（retry_after 為建議的重試秒數）"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConversionResult:
+    """子程序的轉換結果"""
+    
+    def __init__(self, name: str, orders: List[Any], processed_at: datetime, output: bytes, pages: int,
+                 materials: int, timings: Dict[str, float], started: float,
+                 cancelled: Optional[str] = None, index: Any = None):
+        self.name = name
+        self.orders = orders
+        self.processed_at = processed_at
+        self.output = output          # Excel 或長格式材料表（沒有訂單時為空）
+        self.pages = pages
+        self.materials = materials
+        self.timings = timings        # 子程序內各階段耗時（秒）
+        self.started = started        # 子程序開始處理的時間（time.time()）
+        self.cancelled = cancelled    # 以部分結果結束時的原因
+        self.index = index            # 材料索引（只抽取訂單、不產生輸出時）
+
+
+class PoolLease:
+    """預留的程序池名額（以 with 使用或呼叫 release()，可重複釋放）"""
+    
+    def __init__(self, pool: 'ConversionPool', slots: int):
+        self.pool = pool
+        self.slots = slots
+        self.released = False
+    
+    def release(self):
+        self.pool._release(self)
+    
+    def __enter__(self) -> 'PoolLease':
+        return self
+    
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ConversionPool:
+    """有上限的共用轉換程序池"""
+    
+    def __init__(self, workers: int, queue_size: int, page_cache_pages: int = 0,
+                 order_log_sample: int = 0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.page_cache_pages = page_cache_pages
+        self.order_log_sample = order_log_sample
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0            # 已接收（執行中 + 等待中）的轉換數
+        self._rejected = 0
+        self._average_seconds = 1.0  # 每次轉換的平均耗時（估計 Retry-After）
+        metrics.pool_state(workers, 0, 0)
+    
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+    
+    def reserve(self, slots: int = 1) -> PoolLease:
+        """預留最多 slots 個名額（依剩餘名額減少，至少 1 個），一個也沒有時拋出 PoolSaturated
+        
+        非同步工作在提交時預留，之後以 convert(lease=...) 轉換時不再檢查是否已滿；
+        批次轉換以同一份預留同時進行 lease.slots 個轉換。名額在 release() 前
+        一直計入進行中的轉換。
+        """
+        with self._lock:
+            self._admit()
+            granted = min(slots, self.capacity - self._pending)
+            self._pending += granted
+            self._report()
+        return PoolLease(self, granted)
+    
+    def convert(self, source: Union[str, bytes, SpoolHandle], name: Optional[str],
+                output_format: Optional[str], cancel_token: Optional[CancelToken] = None,
+                partial: bool = False, progress: Optional[Callable[[int, int], None]] = None,
+                lease: Optional[PoolLease] = None) -> ConversionResult:
+        """在子程序中抽取訂單並產生輸出（xlsx 或 exporters 的格式），等待完成後回傳
+        
+        source 應為檔案路徑或 SpoolHandle；位元組也可以，但會整份序列化給子程序。
+        output_format 為 None 時只抽取訂單，結果附帶材料索引（批次轉換）。
+        程序池已滿時立即拋出 PoolSaturated（以 reserve() 預留的 lease 轉換時不再檢查）；
+        子程序異常結束時重建程序池並拋出原例外。
+        cancel_token 需以 CancelToken.shared() 建立，子程序才看得到父程序的取消；
+        取消或超過期限時拋出 ConversionCancelled（partial=True 時回傳已解析的部分）。
+        progress(已處理頁數, 總頁數) 在子程序中呼叫，需可序列化（例如 final.jobs.JobProgress）。
+        """
+        with self._lock:
+            if lease is None:
+                self._admit()
+                self._pending += 1
+                self._report()
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=_mp_context(), initializer=_init_worker,
+                    initargs=(metrics.is_enabled(), self.page_cache_pages, self.order_log_sample)
+                    + _logging_settings())
+            executor = self._executor
+        
+        submitted = time.time()
+        try:
+            result = executor.submit(_convert, source, name, output_format, cancel_token, partial,
+                                     progress).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+        finally:
+            if lease is None:
+                with self._lock:
+                    self._pending -= 1
+                    self._report()
+        
+        finished = time.time()
+        with self._lock:
+            self._average_seconds += _SMOOTHING * (finished - result.started - self._average_seconds)
+        metrics.pool_wait(max(result.started - submitted, 0.0))
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """目前狀態（/health 回報）"""
+        with self._lock:
+            busy = min(self._pending, self.workers)
+            return {
+                'workers': self.workers,
+                'busy': busy,
+                'queued': self._pending - busy,
+                'queue_size': self.queue_size,
+                'utilization': round(busy / self.workers, 3),
+                'rejected': self._rejected,
+                'average_seconds': round(self._average_seconds, 3)
+            }
+    
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    def _admit(self):
+        """還有名額時返回，已滿時拋出 PoolSaturated（呼叫端需持有鎖）"""
+        if self._pending >= self.capacity:
+            self._rejected += 1
+            metrics.pool_rejected()
+            raise PoolSaturated(f"轉換佇列已滿（{self._pending} / {self.capacity}）",
+                                self._retry_after())
+    
+    def _release(self, lease: PoolLease):
+        with self._lock:
+            if lease.released:
+                return
+            lease.released = True
+            self._pending -= lease.slots
+            self._report()
+    
+    def _retry_after(self) -> int:
+        """佇列中的工作全部完成所需的估計秒數（呼叫端需持有鎖）"""
+        return max(1, math.ceil(self._pending / self.workers * self._average_seconds))
+    
+    def _report(self):
+        busy = min(self._pending, self.workers)
+        metrics.pool_state(self.workers, busy, self._pending - busy)
+
+
+# 子程序內的狀態（由 _init_worker 設定）
+_page_cache = None
+_order_log_sample = 0
+
+
+def _mp_context():
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == 'forkserver':
+        # forkserver 啟動時先匯入一次，之後產生的子程序直接共用（已啟動時不影響）
+        context.set_forkserver_preload(list(WARMUP_MODULES))
+    return context
+
+
+def _logging_settings():
+    """父程序根 logger 的等級與格式，子程序以相同設定輸出日誌"""
+    root = logging.getLogger()
+    return root.level, any(isinstance(handler.formatter, JsonFormatter) for handler in root.handlers)
+
+
+def _init_worker(metrics_enabled: bool, page_cache_pages: int, order_log_sample: int,
+                 log_level: int = logging.WARNING, log_json: bool = False):
+    """子程序初始化：日誌、預熱（匯入與 CMap）、指標開關、子程序自己的頁面快取"""
+    global _page_cache, _order_log_sample
+    configure_logging(log_level, json_format=log_json)
+    WarmUp().run()
+    metrics.set_enabled(metrics_enabled)
+    if page_cache_pages > 0:
+        from final.page_cache import PageCache
+        _page_cache = PageCache(max_pages=page_cache_pages)
+    _order_log_sample = order_log_sample
+
+
+def _convert(source: Union[str, bytes, SpoolHandle], name: Optional[str], output_format: Optional[str],
+             cancel_token: Optional[CancelToken] = None, partial: bool = False,
+             progress: Optional[Callable[[int, int], None]] = None) -> ConversionResult:
+    """子程序工作：抽取訂單並產生輸出（output_format 為 None 時改為附帶材料索引）"""
+    from final.pdf_extractor import FinalPDFExtractor
+    
+    started = time.time()
+    timings = metrics.start_conversion()
+    extractor = FinalPDFExtractor(source, name=name, page_cache=_page_cache, quiet=True,
+                                  order_log_sample=_order_log_sample, cancel_token=cancel_token)
+    orders = extractor.extract_orders(progress=progress, partial=partial)
+    
+    output = io.BytesIO()
+    index = None
+    if output_format is None:
+        index = extractor.material_index
+    elif orders:
+        if output_format == 'xlsx':
+            with timings.stage('excel'):
+                extractor._save_to_excel(output)
+        else:
+            from final.exporters import write_orders
+            with timings.stage('serialize'):
+                write_orders(orders, output, output_format)
+    return ConversionResult(extractor.name, orders, extractor.processed_at, output.getvalue(),
+                            extractor.page_count, sum(len(order.materials) for order in orders),
+                            dict(timings.seconds), started, extractor.cancelled, index)
+
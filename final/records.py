@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+精簡訂單與材料紀錄 - 以 __slots__ 取代每筆訂單 16 個鍵、每項材料 3 個鍵的 dict
+
+紀錄實作唯讀 Mapping 介面（order["客戶名稱"]、order.get("耗料", [])），
+既有以中文鍵存取的程式不需修改；只有在 JSON / Excel 輸出時才以 to_dict()
+轉回原本的 dict 結構。
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, List
+
+
+class Material(Mapping):
+    """單項耗料（代碼、需求量、已領量）"""
+    
+    __slots__ = ('code', 'need', 'received')
+    
+    _KEYS = {"代碼": 'code', "需求量": 'need', "已領量": 'received'}
+    
+    def __init__(self, code: str, need: float, received: float):
+        self.code = code
+        self.need = need
+        self.received = received
+    
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = self._KEYS.get(key)
+        return default if attr is None else getattr(self, attr)
+    
+    def __iter__(self):
+        return iter(self._KEYS)
+    
+    def __len__(self) -> int:
+        return 3
+    
+    def __repr__(self) -> str:
+        return f"Material({self.code!r}, {self.need!r}, {self.received!r})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"代碼": self.code, "需求量": self.need, "已領量": self.received}
+
+
+class Order(Mapping):
+    """單筆工單，鍵的順序與原本的 dict 結構相同"""
+    
+    _KEYS = {
+        "上線日": 'online_date',
+        "客戶名稱": 'customer',
+        "上階品名": 'parent_name',
+        "上階規格": 'parent_spec',
+        "數量": 'quantity',
+        "硬度": 'hardness',
+        "硬度公差": 'hardness_tolerance',
+        "客戶備註": 'remarks',
+        "顏色": 'color',
+        "工單單號": 'work_order_no',
+        "產品類別": 'category',
+        "訂單單號": 'sales_order_no',
+        "NO": 'no',
+        "品名": 'name',
+        "總長": 'length',
+        "耗料": 'materials'
+    }
+    
+    __slots__ = tuple(_KEYS.values())
+    
+    def __init__(self):
+        self.online_date = None         # 上線日
+        self.customer = None            # 客戶名稱
+        self.parent_name = None         # 上階品名
+        self.parent_spec = None         # 上階規格
+        self.quantity = None            # 數量
+        self.hardness = None            # 硬度
+        self.hardness_tolerance = None  # 硬度公差
+        self.remarks = None             # 客戶備註
+        self.color = None               # 顏色
+        self.work_order_no = None       # 工單單號
+        self.category = None            # 產品類別
+        self.sales_order_no = None      # 訂單單號
+        self.no = None                  # NO
+        self.name = None                # 品名
+        self.length = None              # 總長
+        self.materials: List[Material] = []  # 耗料
+    
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key: str, value: Any):
+        try:
+            setattr(self, self._KEYS[key], value)
+        except KeyError:
+            raise KeyError(key) from None
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = self._KEYS.get(key)
+        return default if attr is None else getattr(self, attr)
+    
+    def __iter__(self):
+        return iter(self._KEYS)
+    
+    def __len__(self) -> int:
+        return len(self._KEYS)
+    
+    def __repr__(self) -> str:
+        return f"Order({self.work_order_no!r}, {len(self.materials)} materials)"
+    
+    def copy(self) -> Dict[str, Any]:
+        """淺層 dict 複本（耗料仍為 Material 紀錄）"""
+        return {key: getattr(self, attr) for key, attr in self._KEYS.items()}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """轉回原本的 dict 結構"""
+        row = self.copy()
+        row["耗料"] = [material.to_dict() for material in self.materials]
+        return row
+
+
+def as_dict(record: Any) -> Any:
+    """json.dump 的 default：將 Order / Material 紀錄轉為 dict"""
+    if isinstance(record, (Order, Material)):
+        return record.to_dict()
+    raise TypeError(f"Object of type {type(record).__name__} is not JSON serializable")
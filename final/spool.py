@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享PDF暫存檔 - 上傳內容只寫入一次，子程序以 mmap 映射同一批實體頁面
+
+PdfSpool 是放在 SPOOL_DIR（預設 /dev/shm 共享記憶體，不存在時為系統暫存
+目錄）的暫存檔，可直接作為上傳檔案的寫入目標；指定 max_size 時小檔先留在
+程序記憶體，超過大小或要交給子程序時才寫入暫存檔。交給子程序的只有
+SpoolHandle（路徑與大小），子程序以唯讀 mmap 開啟，透過 BufferReader 讀取
+時不複製整份PDF；轉換程序池、平行分片與批次轉換都不必再序列化整份位元組。
+
+PdfSpool.close()（或 with 區塊結束）時刪除暫存檔；已映射的子程序可繼續
+讀到解除映射為止。異常中斷留下的暫存檔由 cleanup_stale() 清除。
+"""
+
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from typing import BinaryIO, Optional, Union
+
+SPOOL_PREFIX = 'pdf-spool-'
+COPY_BUFFER = 1024 * 1024
+
+
+SHARED_MEMORY_DIR = '/dev/shm'
+
+
+def default_directory() -> Optional[str]:
+    """SPOOL_DIR 環境變數；未設定時為可寫入的 /dev/shm，都沒有時為 None（系統暫存目錄）"""
+    directory = os.environ.get('SPOOL_DIR')
+    if directory:
+        return directory
+    if os.path.isdir(SHARED_MEMORY_DIR) and os.access(SHARED_MEMORY_DIR, os.W_OK):
+        return SHARED_MEMORY_DIR
+    return None
+
+
+class BufferReader(io.RawIOBase):
+    """以 memoryview 讀取 bytes、mmap 等緩衝區的唯讀檔案物件（不複製整個緩衝區）
+    
+    owner 為關閉時一併關閉的物件（例如 SpoolHandle.open() 建立的 mmap）。
+    """
+    
+    def __init__(self, buffer, owner=None):
+        self._view = memoryview(buffer).cast('B')
+        self._owner = owner
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        data = self._view[self._pos:self._pos + len(b)]
+        size = len(data)
+        b[:size] = data
+        self._pos += size
+        return size
+    
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(end, self._pos)
+        return data
+    
+    def readall(self) -> bytes:
+        return self.read()
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._pos + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"無效的 whence: {whence}")
+        if position < 0:
+            raise ValueError(f"負的位置: {position}")
+        self._pos = position
+        return position
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            if self._owner is not None:
+                self._owner.close()
+        super().close()
+
+
+class SpoolHandle:
+    """可序列化的暫存檔參照（傳給子程序）"""
+    
+    def __init__(self, path: str, size: int, name: Optional[str] = None):
+        self.path = path
+        self.size = size
+        self.name = name  # 原始檔名（抽取器的顯示名稱）
+    
+    def open(self) -> BufferReader:
+        """唯讀映射暫存檔，回傳的讀取器關閉時解除映射"""
+        if not self.size:
+            return BufferReader(b'')
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return BufferReader(mapped, owner=mapped)
+    
+    def __repr__(self) -> str:
+        return f"SpoolHandle({self.path!r}, size={self.size})"
+
+
+class PdfSpool:
+    """可寫入的共享暫存檔（檔案物件介面），close() 時刪除
+    
+    max_size > 0 時內容先寫入記憶體，超過 max_size 或呼叫 handle() 時才
+    移到暫存檔（與 tempfile.SpooledTemporaryFile 相同）；path 在此之前為 None。
+    """
+    
+    def __init__(self, directory: Optional[str] = None, name: Optional[str] = None,
+                 max_size: int = 0):
+        self.directory = directory or default_directory()
+        self.name = name
+        self.max_size = max_size
+        self.path: Optional[str] = None
+        self.file = io.BytesIO() if max_size > 0 else self._create()
+    
+    @classmethod
+    def from_source(cls, source: Union[bytes, bytearray, memoryview, BinaryIO],
+                    directory: Optional[str] = None, name: Optional[str] = None) -> 'PdfSpool':
+        """將位元組或檔案物件的內容寫入新的暫存檔（唯一一次複製）"""
+        spool = cls(directory, name)
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                spool.file.write(source)
+            else:
+                source.seek(0)
+                shutil.copyfileobj(source, spool.file, COPY_BUFFER)
+            spool.file.flush()
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+    
+    def write(self, data) -> int:
+        written = self.file.write(data)
+        if self.path is None and self.file.tell() > self.max_size:
+            self.rollover()
+        return written
+    
+    def rollover(self):
+        """記憶體中的內容移到暫存檔（已在暫存檔時不動作）"""
+        if self.path is not None:
+            return
+        buffer = self.file
+        self.file = self._create()
+        self.file.write(buffer.getbuffer())
+        self.file.seek(buffer.tell())
+        buffer.close()
+    
+    def handle(self) -> SpoolHandle:
+        """目前內容的參照（內容仍在記憶體時先移到暫存檔）"""
+        self.rollover()
+        self.file.flush()
+        return SpoolHandle(self.path, os.fstat(self.file.fileno()).st_size, self.name)
+    
+    def close(self):
+        """關閉並刪除暫存檔（可重複呼叫）"""
+        self.file.close()
+        if self.path is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+    
+    def _create(self) -> BinaryIO:
+        fd, self.path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix='.pdf', dir=self.directory)
+        return os.fdopen(fd, 'w+b')
+    
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+    
+    def __getattr__(self, attr):
+        # read、write、seek、tell 等檔案操作交給底層檔案
+        return getattr(self.file, attr)
+    
+    def __iter__(self):
+        return iter(self.file)
+    
+    def __enter__(self) -> 'PdfSpool':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cleanup_stale(directory: Optional[str] = None, max_age: float = 3600):
+    """刪除程序異常結束時留下、超過 max_age 秒的暫存檔"""
+    directory = directory or default_directory() or tempfile.gettempdir()
+    now = time.time()
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.startswith(SPOOL_PREFIX):
+                continue
+            try:
+                if now - entry.stat().st_mtime > max_age:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
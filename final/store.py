@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+訂單資料庫 - 將抽取的訂單與耗料寫入本機 SQLite，查詢時直接走索引，不必重新抽取PDF
+
+- 以工單單號為主鍵：同一工單出現在多個版本的報表時只保留一筆，
+  以報表版本時間（PDF 修改時間或上傳時間）較新的為準，與寫入順序無關
+- 工單單號、訂單單號、上線日、客戶名稱與材料代碼皆有索引
+- sources 表記錄已匯入的PDF內容雜湊，增量批次處理據此判斷是否需要重新匯入
+- 每次操作各自開啟連線（執行緒與 gunicorn fork 後的 worker 皆可安全使用），
+  WAL 模式下查詢不會被寫入阻擋
+
+命令列查詢: python -m final.pdf_extractor query --customer 台灣橡膠 --from 2025-08-01 --demand
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from final.material_index import material_category
+
+DEFAULT_STORE_PATH = os.path.join('output', 'orders.db')
+
+# 訂單欄位（與 Order.to_dict() 的鍵順序相同）→ 資料表欄位與型別
+ORDER_COLUMNS = [
+    ("上線日", 'online_date', 'TEXT'),
+    ("客戶名稱", 'customer', 'TEXT'),
+    ("上階品名", 'parent_name', 'TEXT'),
+    ("上階規格", 'parent_spec', 'TEXT'),
+    ("數量", 'quantity', 'INTEGER'),
+    ("硬度", 'hardness', 'INTEGER'),
+    ("硬度公差", 'hardness_tolerance', 'INTEGER'),
+    ("客戶備註", 'remarks', 'TEXT'),
+    ("顏色", 'color', 'TEXT'),
+    ("工單單號", 'work_order_no', 'TEXT PRIMARY KEY'),
+    ("產品類別", 'category', 'TEXT'),
+    ("訂單單號", 'sales_order_no', 'TEXT'),
+    ("NO", 'no', 'TEXT'),
+    ("品名", 'name', 'TEXT'),
+    ("總長", 'length', 'INTEGER'),
+]
+_ORDER_KEYS = [key for key, _, _ in ORDER_COLUMNS]
+_ORDER_FIELDS = [column for _, column, _ in ORDER_COLUMNS]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS orders (
+    {', '.join(f'{column} {sql_type}' for _, column, sql_type in ORDER_COLUMNS)},
+    source TEXT,
+    source_sha256 TEXT,
+    revised_at TEXT NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS materials (
+    work_order_no TEXT NOT NULL REFERENCES orders(work_order_no) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    category TEXT NOT NULL,
+    need REAL NOT NULL,
+    received REAL NOT NULL,
+    PRIMARY KEY (work_order_no, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    sha256 TEXT PRIMARY KEY,
+    name TEXT,
+    orders INTEGER NOT NULL,
+    revised_at TEXT NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_sales_order_no ON orders (sales_order_no);
+CREATE INDEX IF NOT EXISTS orders_online_date ON orders (online_date);
+CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer, online_date);
+CREATE INDEX IF NOT EXISTS materials_code ON materials (code, work_order_no, category, need, received);
+"""
+
+# 版本時間不比現有資料舊時才取代（舊版報表晚匯入也不會蓋掉新版）
+_UPSERT_ORDER = f"""
+INSERT INTO orders ({', '.join(_ORDER_FIELDS)}, source, source_sha256, revised_at, stored_at)
+VALUES ({', '.join('?' * (len(_ORDER_FIELDS) + 4))})
+ON CONFLICT (work_order_no) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in _ORDER_FIELDS if column != 'work_order_no')},
+    source = excluded.source, source_sha256 = excluded.source_sha256,
+    revised_at = excluded.revised_at, stored_at = excluded.stored_at
+WHERE excluded.revised_at >= orders.revised_at
+"""
+
+# 查詢條件：參數名稱 → SQL 條件（o 為 orders）
+ORDER_FILTERS = {
+    'work_order_no': "o.work_order_no = ?",
+    'sales_order_no': "o.sales_order_no = ?",
+    'customer': "o.customer = ?",
+    'date_from': "o.online_date >= ?",
+    'date_to': "o.online_date <= ?",
+    'material_code': "o.work_order_no IN (SELECT work_order_no FROM materials WHERE code = ?)",
+}
+
+
+class OrderStore:
+    """SQLite 訂單資料庫"""
+    
+    def __init__(self, path: str = DEFAULT_STORE_PATH, timeout: float = 30):
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.executescript(_SCHEMA)
+    
+    def upsert_orders(self, orders: Iterable[Mapping[str, Any]], source: Optional[str] = None,
+                      sha256: Optional[str] = None, revised_at: Optional[datetime] = None) -> int:
+        """寫入訂單與耗料（單一交易），回傳實際新增或取代的（不重複）訂單數
+        
+        revised_at 為報表版本時間（預設為現在）；資料庫中已有較新版本的工單不會被取代。
+        有 sha256 時一併記錄於 sources 表。
+        """
+        revised = (revised_at or datetime.now()).isoformat(timespec='seconds')
+        stored = datetime.now().isoformat(timespec='seconds')
+        # 同一次寫入中重複的工單以最後一筆為準（訂單列已被後者取代，耗料也只留後者）
+        written: Dict[str, List[Tuple[Any, ...]]] = {}
+        count = 0
+        with self._connect() as conn:
+            upsert = conn.execute
+            for order in orders:
+                count += 1
+                work_order_no = order.get("工單單號")
+                if not work_order_no:
+                    continue
+                values = [order.get(key) for key in _ORDER_KEYS] + [source, sha256, revised, stored]
+                if upsert(_UPSERT_ORDER, values).rowcount == 0:
+                    continue
+                materials = written[work_order_no] = []
+                for seq, material in enumerate(order.get("耗料", ())):
+                    code = material.get("代碼", "")
+                    materials.append((work_order_no, seq, code, material_category(code),
+                                      material.get("需求量", 0), material.get("已領量", 0)))
+            
+            # 取代的工單先刪除舊版耗料，再一次寫入所有耗料
+            conn.executemany("DELETE FROM materials WHERE work_order_no = ?", ((no,) for no in written))
+            conn.executemany("INSERT INTO materials VALUES (?, ?, ?, ?, ?, ?)",
+                             (row for rows in written.values() for row in rows))
+            if sha256:
+                conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                             (sha256, source, count, revised, stored))
+        return len(written)
+    
+    def has_source(self, sha256: str) -> bool:
+        """此PDF內容是否已匯入"""
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM sources WHERE sha256 = ?", (sha256,)).fetchone() is not None
+    
+    def query_orders(self, limit: Optional[int] = 100, offset: int = 0, **filters) -> List[Dict[str, Any]]:
+        """依條件查詢訂單（含耗料），依上線日與工單單號排序
+        
+        條件見 ORDER_FILTERS：work_order_no、sales_order_no、customer、
+        date_from / date_to（上線日，YYYY-MM-DD）、material_code。limit=None 不限筆數。
+        """
+        clauses, params = _conditions(filters)
+        selected = (f"SELECT o.work_order_no FROM orders o{_where(clauses)} "
+                    f"ORDER BY o.online_date, o.work_order_no LIMIT ? OFFSET ?")
+        params += [-1 if limit is None else limit, offset]
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(_ORDER_FIELDS)} FROM orders WHERE work_order_no IN ({selected}) "
+                f"ORDER BY online_date, work_order_no", params).fetchall()
+            materials: Dict[str, List[Dict[str, Any]]] = {}
+            for work_order_no, code, need, received in conn.execute(
+                    f"SELECT work_order_no, code, need, received FROM materials "
+                    f"WHERE work_order_no IN ({selected}) ORDER BY work_order_no, seq", params):
+                materials.setdefault(work_order_no, []).append({"代碼": code, "需求量": need, "已領量": received})
+        
+        orders = []
+        for row in rows:
+            order = dict(zip(_ORDER_KEYS, row))
+            order["耗料"] = materials.get(order["工單單號"], [])
+            orders.append(order)
+        return orders
+    
+    def material_demand(self, category: Optional[str] = None, limit: Optional[int] = None,
+                        **filters) -> List[Dict[str, Any]]:
+        """依條件彙總各材料的需求量，依總需求量由大到小
+        
+        條件同 query_orders（material_code 只彙總該材料），category 為材料類別（H系列、I系列、其他）。
+        """
+        code = filters.pop('material_code', None)
+        clauses, params = _conditions(filters)
+        
+        # 沒有訂單層級的條件時不必連結 orders，直接掃描材料代碼的涵蓋索引
+        tables = "materials m JOIN orders o ON o.work_order_no = m.work_order_no" if params else "materials m"
+        if code:
+            clauses.append("m.code = ?")
+            params.append(code)
+        if category:
+            clauses.append("m.category = ?")
+            params.append(category)
+        
+        sql = ("SELECT m.category, m.code, SUM(m.need), SUM(m.received), COUNT(*), "
+               f"COUNT(DISTINCT m.work_order_no) FROM {tables}{_where(clauses)} "
+               "GROUP BY m.code ORDER BY SUM(m.need) DESC, m.code LIMIT ?")
+        params.append(-1 if limit is None else limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{"材料類別": row[0], "材料代碼": row[1], "總需求量": row[2], "總已領量": row[3],
+                 "使用次數": row[4], "訂單數": row[5]} for row in rows]
+    
+    def stats(self) -> Dict[str, int]:
+        """資料庫內的訂單、耗料與已匯入PDF數"""
+        with self._connect() as conn:
+            return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ('orders', 'materials', 'sources')}
+    
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """開啟連線；區塊正常結束時提交、發生例外時復原"""
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            conn.execute('PRAGMA foreign_keys = ON')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def file_sha256(path: str) -> str:
+    """PDF 內容的 SHA-256（sources 表的鍵）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _conditions(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    """將查詢條件轉為 SQL 條件與參數（忽略空值）"""
+    unknown = set(filters) - set(ORDER_FILTERS)
+    if unknown:
+        raise ValueError(f"未知的查詢條件: {', '.join(sorted(unknown))}")
+    clauses, params = [], []
+    for name, clause in ORDER_FILTERS.items():
+        value = filters.get(name)
+        if value not in (None, ''):
+            clauses.append(clause)
+            params.append(value)
+    return clauses, params
+
+
+def _where(clauses: List[str]) -> str:
+    return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令列查詢：python -m final.pdf_extractor query [條件] [--demand]"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python -m final.pdf_extractor query',
+                                     description="查詢訂單資料庫（不重新抽取PDF）")
+    parser.add_argument('--db', default=os.environ.get('ORDER_STORE_PATH') or DEFAULT_STORE_PATH,
+                        help=f"資料庫路徑（預設 ORDER_STORE_PATH 或 {DEFAULT_STORE_PATH}）")
+    parser.add_argument('--work-order', dest='work_order_no', help="工單單號")
+    parser.add_argument('--sales-order', dest='sales_order_no', help="訂單單號")
+    parser.add_argument('--customer', help="客戶名稱")
+    parser.add_argument('--from', dest='date_from', metavar='YYYY-MM-DD', help="上線日起")
+    parser.add_argument('--to', dest='date_to', metavar='YYYY-MM-DD', help="上線日迄")
+    parser.add_argument('--code', dest='material_code', help="材料代碼")
+    parser.add_argument('--demand', action='store_true', help="改為輸出各材料需求量彙總")
+    parser.add_argument('--limit', type=int, default=100, help="最多筆數（0 不限，預設 100）")
+    parser.add_argument('--json', action='store_true', help="每行輸出一筆 JSON")
+    args = parser.parse_args(argv)
+    
+    if not os.path.exists(args.db):
+        parser.error(f"找不到資料庫: {args.db}（以 --store 執行抽取以建立）")
+    
+    store = OrderStore(args.db)
+    filters = {name: getattr(args, name) for name in ORDER_FILTERS}
+    limit = args.limit or None
+    started = time.perf_counter()
+    if args.demand:
+        rows = store.material_demand(limit=limit, **filters)
+    else:
+        rows = store.query_orders(limit=limit, **filters)
+    elapsed = time.perf_counter() - started
+    
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+    elif args.demand:
+        for row in rows:
+            print(f"{row['材料類別']:<4} {row['材料代碼']:<20} {row['總需求量']:>12.1f} "
+                  f"（{row['使用次數']} 次 / {row['訂單數']} 筆工單）")
+    else:
+        for order in rows:
+            print(f"{order['工單單號']} {order['上線日']} {order['客戶名稱']} {order['上階品名']} "
+                  f"{order['上階規格']}（{len(order['耗料'])}種材料）")
+    print(f"🔎 {len(rows)} 筆，查詢 {elapsed * 1000:.1f} ms", file=sys.stderr)
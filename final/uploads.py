@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可續傳的分段上傳 - 超過單一請求上限（MAX_CONTENT_LENGTH）的PDF分段上傳後再轉換
+
+流程:
+    create(filename, size)                              建立上傳，回傳 upload_id
+    write_chunk(upload_id, offset, stream, length, sha256)  在 offset 處附加一段並校驗 SHA-256
+    finalize(upload_id, submit, sha256=None)            確認完整後交給 submit 排入轉換工作，回傳工作編號
+
+分段邊讀邊寫入磁碟上的暫存檔（每次讀取 COPY_BUFFER 位元組），伺服器記憶體
+與檔案大小無關。狀態寫在 state.json（原子替換），同一分段的寫入以檔案鎖
+互斥，因此任何 gunicorn worker 都能接續同一個上傳；連線中斷後以 status()
+取得已接收的位移量，從該處繼續上傳即可，不必從頭開始。
+
+目錄結構:
+    <directory>/<upload_id>/data.part    已接收的內容
+    <directory>/<upload_id>/state.json   檔名、總大小、已接收位移、各分段的 SHA-256
+                                         與完成後的工作編號（job_id）
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+from final.cache import _FileLock
+
+COPY_BUFFER = 1024 * 1024
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(ValueError):
+    """分段內容或順序錯誤（offset 為伺服器目前已接收的位移量）"""
+    
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class OffsetMismatch(UploadError):
+    """分段的起始位移與已接收的位移量不符"""
+
+
+class ChecksumMismatch(UploadError):
+    """分段或完整檔案的 SHA-256 不符"""
+
+
+class UploadManager:
+    """分段上傳管理"""
+    
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 * 1024 * 1024,
+                 chunk_size: int = 8 * 1024 * 1024, ttl: float = 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+    
+    def create(self, filename: str, size: int) -> Dict[str, Any]:
+        """建立上傳並預先建立空的暫存檔，回傳狀態"""
+        if size <= 0:
+            raise ValueError("檔案大小必須大於 0")
+        if size > self.max_bytes:
+            raise ValueError(f"檔案過大（上限 {self.max_bytes} 位元組）")
+        self.cleanup()
+        
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.directory, upload_id))
+        open(self._path(upload_id, 'data.part'), 'wb').close()
+        state = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'chunks': [],
+            'created_at': time.time()
+        }
+        self._write_state(upload_id, state)
+        return state
+    
+    def status(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """讀取上傳狀態，不存在回傳 None"""
+        if not _UPLOAD_ID_RE.match(upload_id):
+            return None
+        try:
+            with open(self._path(upload_id, 'state.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def write_chunk(self, upload_id: str, offset: int, stream: BinaryIO, length: int,
+                    sha256: str) -> Optional[Dict[str, Any]]:
+        """從 stream 讀取 length 位元組寫在 offset 處，校驗通過才推進已接收的位移量
+        
+        重送已接收過的分段（相同位移與 SHA-256，例如回應在途中遺失）直接回傳目前
+        狀態；上傳不存在回傳 None。
+        """
+        if self.status(upload_id) is None:
+            return None
+        sha256 = sha256.lower()
+        
+        with _FileLock(self._path(upload_id, '.lock')):
+            state = self.status(upload_id)
+            if state is None:
+                return None
+            received = state['offset']
+            
+            if offset < received and any(chunk['offset'] == offset and chunk['size'] == length
+                                         and chunk['sha256'] == sha256 for chunk in state['chunks']):
+                return state
+            if offset != received:
+                raise OffsetMismatch(f"分段位移 {offset} 與已接收的位移 {received} 不符", received)
+            if length <= 0 or length > self.chunk_size:
+                raise UploadError(f"分段大小必須介於 1 與 {self.chunk_size} 位元組之間", received)
+            if offset + length > state['size']:
+                raise UploadError(f"分段超出宣告的檔案大小 {state['size']}", received)
+            
+            digest = hashlib.sha256()
+            written = 0
+            with open(self._path(upload_id, 'data.part'), 'r+b') as f:
+                f.seek(offset)
+                f.truncate()
+                while written < length:
+                    data = stream.read(min(COPY_BUFFER, length - written))
+                    if not data:
+                        break
+                    digest.update(data)
+                    f.write(data)
+                    written += len(data)
+                
+                # 內容不完整或校驗失敗時捨棄這一段，已接收的位移量不變
+                if written != length:
+                    f.truncate(offset)
+                    raise UploadError(f"分段不完整：收到 {written} / {length} 位元組", received)
+                if digest.hexdigest() != sha256:
+                    f.truncate(offset)
+                    raise ChecksumMismatch("分段 SHA-256 不符", received)
+            
+            state['offset'] = offset + length
+            state['chunks'].append({'offset': offset, 'size': length, 'sha256': sha256})
+            self._write_state(upload_id, state)
+            return state
+    
+    def finalize(self, upload_id: str, submit: Callable[[str, str], str],
+                 sha256: Optional[str] = None) -> Optional[str]:
+        """確認已接收完整（並校驗完整檔案的 SHA-256）後以 submit(暫存檔路徑, 檔名)
+        移走暫存檔並排入轉換，回傳 submit 傳回的工作編號；上傳不存在回傳 None
+        
+        submit 在上傳的檔案鎖內執行，同時到達的重複請求（例如逾時後重送）等待
+        鎖後取得同一個工作編號；之後重複呼叫也回傳該編號，直到上傳過期被清除。
+        submit 拋出例外時暫存檔保留原處，可再次呼叫。
+        """
+        if self.status(upload_id) is None:
+            return None
+        
+        with _FileLock(self._path(upload_id, '.lock')):
+            state = self.status(upload_id)
+            if state is None:
+                return None
+            if state.get('job_id'):  # 已由其他請求完成
+                return state['job_id']
+            path = self._path(upload_id, 'data.part')
+            if state['offset'] != state['size']:
+                raise OffsetMismatch(f"尚未上傳完成：已接收 {state['offset']} / {state['size']} 位元組",
+                                     state['offset'])
+            
+            if sha256:
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for data in iter(lambda: f.read(COPY_BUFFER), b''):
+                        digest.update(data)
+                if digest.hexdigest() != sha256.lower():
+                    raise ChecksumMismatch("完整檔案 SHA-256 不符", state['offset'])
+            
+            state['job_id'] = submit(path, state['filename'])
+            self._write_state(upload_id, state)
+            return state['job_id']
+    
+    def discard(self, upload_id: str) -> bool:
+        """刪除上傳及其暫存檔"""
+        if not _UPLOAD_ID_RE.match(upload_id):
+            return False
+        upload_dir = os.path.join(self.directory, upload_id)
+        if not os.path.isdir(upload_dir):
+            return False
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return True
+    
+    def cleanup(self):
+        """刪除超過保存時間仍未完成的上傳（以最後一次寫入狀態的時間計算）"""
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not _UPLOAD_ID_RE.match(entry.name):
+                    continue
+                try:
+                    # 狀態檔尚未寫入（剛建立或建立中斷）時以目錄時間計算
+                    state_path = os.path.join(entry.path, 'state.json')
+                    mtime = os.stat(state_path if os.path.exists(state_path) else entry.path).st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - mtime > self.ttl:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+    
+    def _path(self, upload_id: str, name: str) -> str:
+        return os.path.join(self.directory, upload_id, name)
+    
+    def _write_state(self, upload_id: str, state: Dict[str, Any]):
+        upload_dir = os.path.join(self.directory, upload_id)
+        fd, temp_path = tempfile.mkstemp(dir=upload_dir, prefix='.state-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, os.path.join(upload_dir, 'state.json'))
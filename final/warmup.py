@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+啟動預熱 - 預先匯入 pandas/openpyxl/pdfminer 等重量級模組並載入中文 CMap
+
+應用程式本身只匯入 Flask 等輕量模組，/health 可立即回應；抽取器相關的
+模組改由預熱載入。以 gunicorn --preload 啟動時在主程序同步執行一次，
+fork 出的 worker 以 copy-on-write 共用已載入的模組與 CMap（pdfminer 的
+CMap 快取為類別層級的字典），不必每個 worker 各自花數秒載入。
+
+各模組的匯入耗時與 CMap 載入耗時記錄在 WarmUp 物件中，供 /ready 回報。
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 依序匯入；後面的模組只計入尚未被前面模組載入的部分
+WARMUP_MODULES = (
+    'numpy',
+    'pandas',
+    'openpyxl',
+    'pdfminer.pdfinterp',
+    'pdfminer.layout',
+    'pdfplumber',
+    'final.pdf_extractor',
+    'final.batch',
+)
+
+# 工單報表使用的繁體中文 CMap（CID 字型編碼）與 CNS1 字元集的 Unicode 對照
+WARMUP_CMAPS = ('UniCNS-UCS2-H', 'UniCNS-UTF16-H', 'ETenms-B5-H', 'B5pc-H')
+WARMUP_UNICODE_MAPS = ('Adobe-CNS1',)
+
+# 狀態
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class WarmUp:
+    """預熱流程與結果（可在背景執行緒中執行，多次呼叫只執行一次）"""
+    
+    def __init__(self, modules: Iterable[str] = WARMUP_MODULES,
+                 cmaps: Iterable[str] = WARMUP_CMAPS,
+                 unicode_maps: Iterable[str] = WARMUP_UNICODE_MAPS):
+        self.modules = tuple(modules)
+        self.cmaps = tuple(cmaps)
+        self.unicode_maps = tuple(unicode_maps)
+        self.state = PENDING
+        self.seconds: Optional[float] = None
+        self.import_seconds: Dict[str, float] = {}
+        self.cmap_seconds: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+    
+    def run(self) -> bool:
+        """執行預熱（已執行過則直接回傳結果），成功時回傳 True"""
+        with self._lock:
+            if self.state != PENDING:
+                return self.ready
+            self.state = RUNNING
+        
+        started = time.perf_counter()
+        try:
+            for module in self.modules:
+                self.import_seconds[module] = _timed(importlib.import_module, module)
+            self._load_cmaps()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = FAILED
+            logger.exception("❌ 預熱失敗")
+        else:
+            self.state = READY
+        finally:
+            self.seconds = time.perf_counter() - started
+            self._done.set()
+        
+        if self.ready:
+            logger.info("🔥 預熱完成: %.2f 秒（匯入 %.2f 秒，CMap %.2f 秒）", self.seconds,
+                        sum(self.import_seconds.values()), sum(self.cmap_seconds.values()))
+        return self.ready
+    
+    def start(self) -> threading.Thread:
+        """在背景執行緒中預熱"""
+        thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+        thread.start()
+        return thread
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待預熱結束，回傳是否已就緒"""
+        self._done.wait(timeout)
+        return self.ready
+    
+    def _load_cmaps(self):
+        from pdfminer.cmapdb import CMapDB
+        
+        for name in self.cmaps:
+            try:
+                self.cmap_seconds[name] = _timed(CMapDB.get_cmap, name)
+            except CMapDB.CMapNotFound:
+                logger.warning("⚠️ 找不到 CMap: %s", name)
+        for collection in self.unicode_maps:
+            try:
+                self.cmap_seconds[collection] = _timed(CMapDB.get_unicode_map, collection)
+            except CMapDB.CMapNotFound:
+                logger.warning("⚠️ 找不到 Unicode 對照: %s", collection)
+    
+    def status(self) -> Dict[str, Any]:
+        """預熱狀態與各項耗時（秒）"""
+        return {
+            'state': self.state,
+            'seconds': _round(self.seconds),
+            'imports': {name: _round(seconds) for name, seconds in self.import_seconds.items()},
+            'cmaps': {name: _round(seconds) for name, seconds in self.cmap_seconds.items()},
+            'error': self.error
+        }
+
+
+def _timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def _round(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds, 4)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 設定（gunicorn 啟動時自動讀取目前目錄下的 gunicorn.conf.py）
+
+主程序先載入 app 並同步完成預熱（匯入 pandas/openpyxl/pdfminer、載入中文 CMap），
+之後 fork 出的 worker 以 copy-on-write 共用，worker 重啟時不必重新載入。
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# CPU 密集的轉換（同步、非同步工作與批次）交給每個 worker 的共用轉換程序池（CONVERT_WORKERS 個子程序），
+# 請求與工作執行緒只等待結果，因此 gthread worker 有多個執行緒。
+# 預設只用 1 個 worker：程序池與等待佇列是每個 worker 各一份，多個 worker 時子程序數會乘上
+# worker 數而超過CPU核心數，且各自的佇列互不相通，某個 worker 已滿時另一個仍在接收，
+# 429 就不再反映整體負載。轉換的平行度由 CONVERT_WORKERS 決定，不需要增加 worker。
+# 程序池的子程序由 forkserver 產生（見 final.pool），不會從這些執行緒仍在執行的 worker fork，
+# 避免 fork 當下被其他執行緒持有的鎖讓子程序卡住。
+# 執行緒數多於程序池與佇列的容量，佇列已滿時由應用回傳 429，
+# 而不是在 gunicorn 的連線佇列中看不見地排隊
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+_pool_capacity = (int(os.environ.get('CONVERT_WORKERS', os.cpu_count() or 1))
+                  + int(os.environ.get('CONVERT_QUEUE_SIZE', 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', _pool_capacity + 4))
+
+preload_app = True
+os.environ.setdefault('WARMUP', 'sync')